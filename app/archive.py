@@ -0,0 +1,150 @@
+"""
+Sales archiving for POS System
+Moves sales (with their items and returns) and stock movements older than a
+cutoff out of the hot tables, into the *_archive tables or nowhere at all
+(purge). Works the same on SQLite and PostgreSQL.
+
+Rows go in small batches that each commit on their own, so a checkout never
+waits behind one long delete and an interrupted run just resumes where it
+stopped the next time.
+
+    python -m app.archive --older-than-days 365
+    python -m app.archive --before 2024-01-01 --purge
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, literal, select
+
+from app import models, partitions, transactions
+from app.database import engine
+
+
+# Rows moved per transaction
+ARCHIVE_BATCH_SIZE = 500
+# Pause between batches so other writers (and SQLite's single writer lock) get a turn
+ARCHIVE_BATCH_PAUSE = 0.05
+# Default retention for scheduled runs
+ARCHIVE_AFTER_DAYS = int(os.getenv('SALES_ARCHIVE_AFTER_DAYS', 365))
+
+sales = models.Sale.__table__
+sale_items = models.SaleItem.__table__
+sale_returns = models.SaleReturn.__table__
+stock_movements = models.StockMovement.__table__
+idempotency_keys = models.IdempotencyKey.__table__
+
+ARCHIVES = {
+    'sales': models.sales_archive,
+    'sale_items': models.sale_items_archive,
+    'sale_returns': models.sale_returns_archive,
+    'stock_movements': models.stock_movements_archive,
+}
+
+
+def _move(db, table, where, purge, archived_at):
+    """Copy matching rows to the table's archive (unless purging), then delete them"""
+    if not purge:
+        columns = [column.name for column in table.columns]
+        db.execute(ARCHIVES[table.name].insert().from_select(
+            columns + ['archived_at'],
+            select(*table.columns, literal(archived_at, DateTime)).where(where)
+        ))
+    return db.execute(table.delete().where(where)).rowcount
+
+
+def _sales_batch(db, before, batch_size, purge):
+    """One batch of the oldest sales before the cutoff, children first"""
+    ids = [row.id for row in db.execute(
+        select(sales.c.id).where(sales.c.created_at < before).order_by(sales.c.id).limit(batch_size)
+    )]
+    if not ids:
+        return {}
+
+    archived_at = datetime.now()
+    counts = {
+        'sale_items': _move(db, sale_items, sale_items.c.sale_id.in_(ids), purge, archived_at),
+        'sale_returns': _move(db, sale_returns, sale_returns.c.sale_id.in_(ids), purge, archived_at),
+    }
+    # Replay records long past their TTL; nothing to keep
+    db.execute(idempotency_keys.delete().where(idempotency_keys.c.sale_id.in_(ids)))
+    counts['sales'] = _move(db, sales, sales.c.id.in_(ids), purge, archived_at)
+    return counts
+
+
+def _movements_batch(db, before, batch_size, purge):
+    ids = [row.id for row in db.execute(
+        select(stock_movements.c.id).where(stock_movements.c.created_at < before)
+        .order_by(stock_movements.c.id).limit(batch_size)
+    )]
+    if not ids:
+        return {}
+    return {'stock_movements': _move(db, stock_movements, stock_movements.c.id.in_(ids),
+                                     purge, datetime.now())}
+
+
+def archive_sales(before, purge=False, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move sales and stock movements created before a cutoff out of the hot tables
+
+    Product stock levels are kept as a running total on products, so taking
+    old movements out doesn't change them. When purging on PostgreSQL, whole
+    monthly partitions before the cutoff are truncated first (app.partitions).
+
+    Args:
+        before: datetime cutoff; rows created earlier are moved
+        purge: delete the rows instead of copying them to the archive tables
+
+    Returns:
+        dict: rows moved per table, batches run, and the cutoff and mode used
+    """
+    totals = {'sales': 0, 'sale_items': 0, 'sale_returns': 0, 'stock_movements': 0}
+    batches = 0
+
+    if purge:
+        for table, count in partitions.truncate_partitions_before(engine, before).items():
+            totals[table] += count
+
+    for batch in (_sales_batch, _movements_batch):
+        while True:
+            counts = transactions.run_in_transaction(
+                lambda db: batch(db, before, batch_size, purge), 'archive_sales')
+            if not counts:
+                break
+            batches += 1
+            for table, count in counts.items():
+                totals[table] += count
+            time.sleep(ARCHIVE_BATCH_PAUSE)
+
+    print(f"🗄️ {'Purged' if purge else 'Archived'} {totals['sales']} sale(s) and "
+          f"{totals['stock_movements']} stock movement(s) from before {before:%Y-%m-%d %H:%M} "
+          f"in {batches} batch(es)")
+    return {
+        **totals,
+        'batches': batches,
+        'before': before.isoformat(),
+        'mode': 'purge' if purge else 'archive'
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m app.archive',
+                                     description='Archive or purge old sales and stock movements')
+    cutoff = parser.add_mutually_exclusive_group()
+    cutoff.add_argument('--before', type=datetime.fromisoformat, help='cutoff date, e.g. 2024-01-01')
+    cutoff.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f'cutoff as an age in days (default {ARCHIVE_AFTER_DAYS})')
+    parser.add_argument('--purge', action='store_true', help='delete instead of archiving')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    before = args.before or datetime.now() - timedelta(days=args.older_than_days)
+    archive_sales(before, purge=args.purge, batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
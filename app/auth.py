@@ -1,15 +1,29 @@
+from collections import namedtuple
 from datetime import datetime, timedelta
 from typing import Optional
+import base64
 import hashlib
+import hmac
+import json
+import os
 import secrets
+import threading
+import time
+from sqlalchemy import event
 from app.database import SessionLocal
 import app.models as models
-import app.schemas as schemas
 
-# Secret key for token
-SECRET_KEY = "pos-system-secret-key-change-in-production"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+
+# Derived from the app's signing key by set_secret_key (sessions.init_app)
+_TOKEN_KEY = None
+
+# Seconds a token's user is served from memory before users is read again.
+# Changes made through this worker clear the cache at once; other workers
+# pick them up within this window.
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 1024
 
 
 # Simple password hashing (for development only - use bcrypt in production)
@@ -23,33 +37,89 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return get_password_hash(plain_password) == hashed_password
 
 
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def set_secret_key(key: str):
+    """Derive the token key from the app's signing key, the one sessions use"""
+    global _TOKEN_KEY
+    # Tokens get their own key, so one can't be passed off as a session cookie or vice versa
+    _TOKEN_KEY = hmac.new(key.encode(), b"pos-api-token", hashlib.sha256).digest()
+
+
+def _token_key() -> bytes:
+    if _TOKEN_KEY is None:
+        raise RuntimeError("No token key: sessions.init_app(app) or the API startup must run first")
+    return _TOKEN_KEY
+
+
+def _sign(signing_input: str) -> str:
+    return _b64encode(hmac.new(_token_key(), signing_input.encode(), hashlib.sha256).digest())
+
+
+_TOKEN_HEADER = _b64encode(json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode())
+
+
+def password_fingerprint(hashed_password: str) -> str:
+    """Keyed digest of the stored hash; tokens carry it so a password change revokes them"""
+    return hmac.new(_token_key(), (hashed_password or "").encode(), hashlib.sha256).hexdigest()[:16]
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """HS256 JWT with iat and exp (epoch seconds) added to data"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    now = int(time.time())
+    lifetime = expires_delta or timedelta(minutes=15)
+    to_encode.update({"iat": now, "exp": now + int(lifetime.total_seconds())})
 
-    # Simple JWT token (for development)
-    import json
-    import base64
-    import hmac
+    payload_b64 = _b64encode(json.dumps(to_encode, separators=(",", ":")).encode())
+    signing_input = f"{_TOKEN_HEADER}.{payload_b64}"
+    return f"{signing_input}.{_sign(signing_input)}"
 
-    header = json.dumps({"alg": "HS256", "typ": "JWT"})
-    payload = json.dumps(to_encode)
 
-    header_b64 = base64.urlsafe_b64encode(header.encode()).decode().rstrip("=")
-    payload_b64 = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+def create_user_token(user, expires_delta: Optional[timedelta] = None):
+    """Token for a user (till device or integration), valid ACCESS_TOKEN_EXPIRE_MINUTES by default"""
+    return create_access_token(
+        {"sub": user.username, "pwd": password_fingerprint(user.hashed_password)},
+        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
 
-    signature = hmac.new(
-        SECRET_KEY.encode(),
-        f"{header_b64}.{payload_b64}".encode(),
-        hashlib.sha256
-    ).digest()
-    signature_b64 = base64.urlsafe_b64encode(signature).decode().rstrip("=")
 
-    return f"{header_b64}.{payload_b64}.{signature_b64}"
+def decode_access_token(token: str) -> Optional[dict]:
+    """The payload of a token signed by us that hasn't expired, else None"""
+    try:
+        header_b64, payload_b64, signature = token.split(".")
+    except (AttributeError, ValueError):
+        return None
+
+    if not hmac.compare_digest(signature, _sign(f"{header_b64}.{payload_b64}")):
+        return None
+    try:
+        if json.loads(_b64decode(header_b64)).get("alg") != ALGORITHM:
+            return None
+        payload = json.loads(_b64decode(payload_b64))
+    except ValueError:
+        return None
+
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return None
+    return payload
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """The token from an "Authorization: Bearer <token>" header value"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
 
 
 def authenticate_user(db, username: str, password: str):
@@ -61,27 +131,72 @@ def authenticate_user(db, username: str, password: str):
     return user
 
 
-def get_current_user(token: str):
-    try:
-        import base64
-        import json
+# Token users
+# What a request authenticated by token knows about its user. A plain tuple,
+# so it can be shared between requests and threads without a database session.
+TokenUser = namedtuple("TokenUser", "id username role full_name is_active")
 
-        parts = token.split(".")
-        if len(parts) != 3:
-            return None
+_user_cache = {}
+_user_cache_lock = threading.Lock()
 
-        payload_b64 = parts[1]
-        # Add padding if needed
-        payload_b64 += "=" * (4 - len(payload_b64) % 4)
-        payload = json.loads(base64.urlsafe_b64decode(payload_b64).decode())
 
-        username = payload.get("sub")
-        if not username:
-            return None
+def _load_token_user(username: str):
+    """(TokenUser, password fingerprint) or None, through the TTL cache"""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(username)
+    if cached is not None and cached[0] > now:
+        return cached[1]
 
-        db = SessionLocal()
-        user = db.query(models.User).filter(models.User.username == username).first()
+    db = SessionLocal()
+    try:
+        row = db.query(
+            models.User.id, models.User.username, models.User.role, models.User.full_name,
+            models.User.is_active, models.User.hashed_password
+        ).filter(models.User.username == username).first()
+    finally:
         db.close()
-        return user
-    except:
-        return None
\ No newline at end of file
+
+    entry = None
+    if row is not None:
+        entry = (TokenUser(*row[:5]), password_fingerprint(row.hashed_password))
+
+    with _user_cache_lock:
+        if len(_user_cache) >= USER_CACHE_SIZE:
+            _user_cache.clear()
+        _user_cache[username] = (now + USER_CACHE_TTL, entry)
+    return entry
+
+
+def invalidate_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # Role, password or active flag may have changed; users are few, so drop them all
+    invalidate_user_cache()
+
+
+def get_current_user(token: str):
+    """
+    The TokenUser for a valid bearer token, or None
+
+    Signature and expiry are checked in-process and the user comes from a
+    short-lived cache, so a warm call doesn't touch the database. Tokens of
+    deactivated users, or issued before the user's last password change,
+    are refused.
+    """
+    payload = decode_access_token(token)
+    if payload is None or not payload.get("sub"):
+        return None
+
+    entry = _load_token_user(payload["sub"])
+    if entry is None:
+        return None
+    user, fingerprint = entry
+    if user.is_active is False or not hmac.compare_digest(str(payload.get("pwd", "")), fingerprint):
+        return None
+    return user
\ No newline at end of file
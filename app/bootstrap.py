@@ -0,0 +1,89 @@
+"""
+Database bootstrap for POS System
+One-time setup run before the web workers start: schema migrations
+(app.migrations), then default users on an empty database:
+
+    python -m app.bootstrap
+
+Kept out of web_server's import so worker boot never touches the database.
+"""
+
+import sys
+
+from app import models
+
+
+def setup_database():
+    """
+    Bring the schema up to date through app.migrations, then create the
+    default users if there are none
+
+    Returns:
+        bool: True if this was the first-time setup
+    """
+    try:
+        from app.database import SessionLocal
+        from app.auth import get_password_hash
+        from app import migrations, partitions
+
+        migrations.upgrade()
+        partitions.ensure_partitions()
+
+        db = SessionLocal()
+        try:
+            if db.query(models.User.id).first() is not None:
+                print("✅ Database ready")
+                return False  # Already set up
+
+            default_users = [
+                ("admin", "admin123", "admin", "System Administrator"),
+                ("cashier", "cashier123", "cashier", "Cashier User"),
+                ("inventory", "inventory123", "inventory", "Inventory Manager")
+            ]
+
+            for username, password, role, full_name in default_users:
+                user = models.User(
+                    username=username,
+                    email=f"{username}@pos.com",
+                    hashed_password=get_password_hash(password),
+                    role=role,
+                    full_name=full_name,
+                    is_active=True
+                )
+                db.add(user)
+                print(f"✅ Created user: {username}")
+
+            db.commit()
+        finally:
+            db.close()
+
+        print("🎉 First-time setup complete!")
+        print("🔑 Default credentials:")
+        print("   • admin / admin123")
+        print("   • cashier / cashier123")
+        print("   • inventory / inventory123")
+        print("⚠️ Change passwords immediately after login!")
+
+        return True  # First time setup
+
+    except Exception as e:
+        print(f"❌ Database setup error: {e}")
+        return False
+
+
+def main():
+    """Deploy step entry point; exits non-zero if any migration is still pending"""
+    from app import migrations
+
+    print("🚀 Preparing database...")
+    setup_database()
+
+    pending = [version for version, _, applied_at in migrations.status() if applied_at is None]
+    if pending:
+        print(f"❌ Migrations not applied: {', '.join(pending)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Conditional GET for POS System JSON APIs
+Answers If-None-Match with 304 from a cheap version lookup, before the
+endpoint runs its main query or builds any JSON
+"""
+
+import hashlib
+import threading
+from functools import wraps
+
+from flask import request, make_response
+
+from app.database import SessionLocal
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(endpoint, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(endpoint, {'requests': 0, 'not_modified': 0, 'full': 0, 'uncached': 0})
+        counts['requests'] += 1
+        counts[outcome] += 1
+
+
+def get_stats():
+    """Per-endpoint request counts and 304 hit rate"""
+    with _stats_lock:
+        stats = {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+
+    for counts in stats.values():
+        counts['hit_rate'] = round(counts['not_modified'] / counts['requests'], 4) if counts['requests'] else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def conditional(version, allowed=None):
+    """
+    Add ETag / If-None-Match handling to a GET endpoint
+
+    Args:
+        version: Callable (db, **view_args) returning a value that changes
+                 whenever the endpoint's response would. It must be much
+                 cheaper than the endpoint itself - a max/count or a primary
+                 key lookup.
+        allowed: Optional callable; when it returns False the view runs
+                 untouched so it can send its own 401/403
+
+    The ETag is weak because the same data may go out with different
+    encodings. A matching request gets an empty 304 and the view never runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint
+            if allowed is not None and not allowed():
+                return view(*args, **kwargs)
+
+            db = SessionLocal()
+            try:
+                current = version(db, **kwargs)
+            finally:
+                db.close()
+
+            # Query string is part of the tag so filtered views don't share one
+            tag = hashlib.sha1(repr((request.full_path, current)).encode('utf-8')).hexdigest()[:24]
+
+            if request.if_none_match.contains_weak(tag):
+                _record(endpoint, 'not_modified')
+                response = make_response('', 304)
+                response.set_etag(tag, weak=True)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(tag, weak=True)
+                response.headers.setdefault('Cache-Control', 'private, no-cache')
+                _record(endpoint, 'full')
+            else:
+                _record(endpoint, 'uncached')
+            return response
+
+        return wrapper
+    return decorator
@@ -1,20 +1,26 @@
 ﻿from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, func
-from typing import List, Optional
-from datetime import datetime, date
+from typing import TYPE_CHECKING, List, Optional
+from datetime import datetime, date, timedelta
+import base64
+import json
 
-from app import models, schemas
+from app import models
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, func
 from typing import List, Optional
 from datetime import datetime, date
 
-from app import models, schemas
 from app import models  # absolute import
 
+if TYPE_CHECKING:
+    # pydantic is slow to import and crud only needs schemas for type hints
+    from app import schemas
+
 # In crud.py
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
+from sqlalchemy import and_, bindparam, case, cast, insert, literal, select, type_coerce, Numeric, String
 # from barcode_utils import barcode_generator  # Commented out for now
 
 
@@ -24,55 +30,13 @@ def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
 
-# app/crud.py - Update this function
-def get_products(db, skip: int = 0, limit: int = 100):
-    """Get products with schema error handling"""
-    try:
-        # Try normal query
-        return db.query(models.Product).filter(
-            models.Product.is_active == True
-        ).offset(skip).limit(limit).all()
-    except Exception as e:
-        # Schema error - use fallback
-        print(f"⚠️ Schema error in get_products, using fallback: {e}")
-        try:
-            # Try without is_active filter
-            return db.query(models.Product).offset(skip).limit(limit).all()
-        except Exception:
-            # Ultimate fallback - raw SQL
-            result = db.execute(
-                "SELECT id, name, description, price, stock_quantity, category, sku FROM products LIMIT :limit OFFSET :skip",
-                {"limit": limit, "skip": skip}
-            )
-            # Convert to Product-like objects
-            products = []
-            for row in result:
-                product = models.Product()
-                product.id = row[0]
-                product.name = row[1]
-                product.description = row[2]
-                product.price = row[3]
-                product.stock_quantity = row[4]
-                product.category = row[5]
-                product.sku = row[6]
-                products.append(product)
-            return products
-
-def get_product_by_barcode(db, barcode: str):
-    """Get product by barcode"""
-    try:
-        return db.query(models.Product).filter(
-            models.Product.barcode == barcode,
-            models.Product.is_active == True
-        ).first()
-    except Exception:
-        # Fallback if is_active doesn't exist
-        return db.query(models.Product).filter(
-            models.Product.barcode == barcode
-        ).first()
+def get_products(db: Session, skip: int = 0, limit: int = 100):
+    return db.query(models.Product).filter(
+        models.Product.is_active == True
+    ).offset(skip).limit(limit).all()
 
 
-def create_product(db: Session, product: schemas.ProductCreate):
+def create_product(db: Session, product: "schemas.ProductCreate"):
     # Check if SKU already exists
     existing = db.query(models.Product).filter(models.Product.sku == product.sku).first()
     if existing:
@@ -92,7 +56,7 @@ def create_product(db: Session, product: schemas.ProductCreate):
     return db_product
 
 
-def update_product(db: Session, product_id: int, product_update: schemas.ProductUpdate):
+def update_product(db: Session, product_id: int, product_update: "schemas.ProductUpdate"):
     db_product = get_product(db, product_id)
     if not db_product:
         return None
@@ -130,8 +94,110 @@ def search_products(db: Session, query: str):
     ).filter(models.Product.is_active == True).all()
 
 
+# Concurrent product changes
+# Edits compare-and-swap on Product.version; stock moves are atomic
+# increments, which commute, so they never conflict with each other.
+class VersionConflict(Exception):
+    """The row changed between being read and being written; current holds its state now"""
+
+    def __init__(self, current):
+        super().__init__("This product was changed by someone else since it was loaded")
+        self.current = current
+
+
+def get_product_state(db: Session, product_id: int):
+    """What a client needs to redo a rejected edit: the product's fields and version"""
+    product = db.query(models.Product).populate_existing().filter(models.Product.id == product_id).first()
+    if product is None:
+        return None
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'barcode': product.barcode,
+        'price': float(product.price or 0),
+        'cost_price': float(product.cost_price or 0),
+        'category': product.category,
+        'description': product.description,
+        'stock_quantity': product.stock_quantity,
+        'reorder_level': product.reorder_level,
+        'location': product.location,
+        'supplier_name': product.supplier_name,
+        'supplier_code': product.supplier_code,
+        'image_url': product.image_url,
+        'version': product.version
+    }
+
+
+def _stock_out(items):
+    """{product_id: -quantity} for sale lines"""
+    deltas = {}
+    for item in items:
+        deltas[item['product_id']] = deltas.get(item['product_id'], 0) - item['quantity']
+    return deltas
+
+
+def increment_stock(db: Session, deltas: dict, floor_zero: bool = False):
+    """
+    Add {product_id: change} to stock_quantity as stock = stock + change,
+    one executemany for all products; the caller commits
+
+    floor_zero clamps at 0 for goods that have already left the shop.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    products = models.Product.__table__
+    new_stock = func.coalesce(products.c.stock_quantity, 0) + bindparam("delta")
+    if floor_zero:
+        new_stock = case((new_stock > 0, new_stock), else_=0)
+    db.execute(
+        products.update().where(products.c.id == bindparam("product")).values(stock_quantity=new_stock),
+        [{"product": product_id, "delta": delta} for product_id, delta in deltas.items()]
+    )
+
+
+def adjust_product_stock(db: Session, product_id: int, quantity: int, movement_type: str = "adjustment",
+                         reference: Optional[str] = None, created_by: str = "system", notes: Optional[str] = None):
+    """
+    Move stock by quantity with a single conditional UPDATE and record the movement
+
+    Flushes but doesn't commit, so the caller can run it through
+    transactions.run_in_transaction and retry it on a lock conflict.
+
+    Raises:
+        ValueError: the change would take stock below zero
+    Returns:
+        dict: name, new stock and version, or None if the product doesn't exist
+    """
+    products = models.Product.__table__
+    new_stock = func.coalesce(products.c.stock_quantity, 0) + quantity
+    updated = db.execute(
+        products.update().where(products.c.id == product_id, new_stock >= 0).values(stock_quantity=new_stock)
+    ).rowcount
+
+    if not updated:
+        if db.query(models.Product.id).filter(models.Product.id == product_id).first() is None:
+            return None
+        raise ValueError("Stock cannot go below zero")
+
+    db.add(models.StockMovement(
+        product_id=product_id,
+        quantity=quantity,
+        movement_type=movement_type,
+        reference=reference,
+        notes=notes,
+        created_at=datetime.now(),
+        created_by=created_by
+    ))
+    row = db.query(models.Product.name, models.Product.stock_quantity, models.Product.version).filter(
+        models.Product.id == product_id
+    ).one()
+    return {'product_name': row.name, 'new_stock': row.stock_quantity, 'version': row.version}
+
+
 # Customer CRUD
-def create_customer(db: Session, customer: schemas.CustomerCreate):
+def create_customer(db: Session, customer: "schemas.CustomerCreate"):
     db_customer = models.Customer(
         name=customer.name,
         phone=customer.phone,
@@ -183,13 +249,26 @@ def get_sale(db: Session, sale_id: int):
         .first()
 
 
+def created_between(column, start, end):
+    """
+    start <= column < end, on a created_at column
+
+    Plain comparisons with constants, never a function of the column, so
+    PostgreSQL only reads the monthly partitions in the range.
+    """
+    return and_(column >= start, column < end)
+
+
+def day_range(day: date):
+    """(midnight, next midnight) for a date"""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
 def get_sales_by_date(db: Session, sale_date: date):
     """Get sales for a specific date"""
-    start_date = datetime.combine(sale_date, datetime.min.time())
-    end_date = datetime.combine(sale_date, datetime.max.time())
-
     return db.query(models.Sale) \
-        .filter(models.Sale.created_at.between(start_date, end_date)) \
+        .filter(created_between(models.Sale.created_at, *day_range(sale_date))) \
         .options(joinedload(models.Sale.customer)) \
         .order_by(models.Sale.created_at.desc()) \
         .all()
@@ -227,7 +306,8 @@ def create_sale(db: Session, sale_data: dict, items_data: List[dict]):
         change_given=sale_data.get('change_given', 0),
         payment_method=sale_data.get('payment_method', 'cash'),
         payment_status='completed',
-        user_id=sale_data.get('user_id', 1)  # Default to admin user
+        user_id=sale_data.get('user_id', 1),  # Default to admin user
+        created_at=datetime.now()
     )
 
     db.add(db_sale)
@@ -241,14 +321,12 @@ def create_sale(db: Session, sale_data: dict, items_data: List[dict]):
             product_name=item.get('product_name', 'Product'),
             quantity=item['quantity'],
             unit_price=item['unit_price'],
-            subtotal=item['subtotal']
+            subtotal=item['subtotal'],
+            created_at=db_sale.created_at
         )
         db.add(sale_item)
 
-        # Update product stock
-        product = get_product(db, item['product_id'])
-        if product:
-            product.stock_quantity -= item['quantity']
+    increment_stock(db, _stock_out(items_data))
 
     db.commit()
     db.refresh(db_sale)
@@ -263,18 +341,27 @@ def get_sale_by_receipt_number(db: Session, receipt_number: str):
         .first()
 
 
+def get_takings(db: Session, start: datetime, end: datetime):
+    """Takings net of returns and voids for sales made in [start, end)"""
+    net_amount = models.Sale.total_amount - func.coalesce(models.Sale.refunded_amount, 0)
+    return db.query(func.coalesce(func.sum(net_amount), 0)) \
+        .filter(created_between(models.Sale.created_at, start, end)) \
+        .scalar()
+
+
 def get_sales_summary(db: Session):
     """Get sales summary (total sales, today's sales, etc.)"""
-    today = date.today()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
+    today = created_between(models.Sale.created_at, *day_range(date.today()))
+
+    # Takings net of returns and voids
+    net_amount = models.Sale.total_amount - func.coalesce(models.Sale.refunded_amount, 0)
 
     # Total sales
-    total_sales_result = db.query(func.sum(models.Sale.total_amount)).scalar() or 0
+    total_sales_result = db.query(func.sum(net_amount)).scalar() or 0
 
     # Today's sales
-    today_sales_result = db.query(func.sum(models.Sale.total_amount)) \
-                             .filter(models.Sale.created_at.between(start_of_day, end_of_day)) \
+    today_sales_result = db.query(func.sum(net_amount)) \
+                             .filter(today) \
                              .scalar() or 0
 
     # Total transactions
@@ -282,7 +369,7 @@ def get_sales_summary(db: Session):
 
     # Today's transactions
     today_transactions = db.query(func.count(models.Sale.id)) \
-                             .filter(models.Sale.created_at.between(start_of_day, end_of_day)) \
+                             .filter(today) \
                              .scalar() or 0
 
     # Average sale
@@ -297,53 +384,37 @@ def get_sales_summary(db: Session):
     }
 
 
-def void_sale(db: Session, sale_id: int, void_reason: str = None):
-    """Void a sale (mark as cancelled)"""
-    sale = get_sale(db, sale_id)
-    if not sale:
-        return None
-
-    # Check if sale is already voided
-    if sale.payment_status == 'voided':
-        return sale
+def void_sale(db: Session, sale_id: int, void_reason: str = None, created_by: str = "system"):
+    """Void a sale: everything not yet returned goes back to stock and is refunded"""
+    return return_sale_items(db, sale_id, lines=None, reason=void_reason, created_by=created_by)
 
-    # Update sale status
-    sale.payment_status = 'voided'
-    sale.voided_at = datetime.now()
-    sale.void_reason = void_reason
 
-    # Restore product stock
-    for item in sale.items:
-        product = get_product(db, item.product_id)
-        if product:
-            product.stock_quantity += item.quantity
-
-    db.commit()
-    db.refresh(sale)
-    return sale
+# Inventory CRUD
+def create_stock_movement(db: Session, movement: "schemas.StockMovementCreate"):
+    from app import transactions
 
+    def record(db):
+        # Update product stock
+        product = get_product(db, movement.product_id)
+        if not product:
+            raise ValueError(f"Product {movement.product_id} not found")
+
+        # Update stock quantity
+        increment_stock(db, {movement.product_id: movement.quantity})
+
+        # Create movement record
+        db_movement = models.StockMovement(
+            product_id=movement.product_id,
+            quantity=movement.quantity,
+            movement_type=movement.movement_type,
+            reference=movement.reference,
+            notes=movement.notes,
+            created_by=movement.created_by
+        )
+        db.add(db_movement)
+        return db_movement
 
-# Inventory CRUD
-def create_stock_movement(db: Session, movement: schemas.StockMovementCreate):
-    # Update product stock
-    product = get_product(db, movement.product_id)
-    if not product:
-        raise ValueError(f"Product {movement.product_id} not found")
-
-    # Update stock quantity
-    product.stock_quantity += movement.quantity
-
-    # Create movement record
-    db_movement = models.StockMovement(
-        product_id=movement.product_id,
-        quantity=movement.quantity,
-        movement_type=movement.movement_type,
-        reference=movement.reference,
-        notes=movement.notes,
-        created_by=movement.created_by
-    )
-    db.add(db_movement)
-    db.commit()
+    db_movement = transactions.run_in_transaction(record, 'create_stock_movement', db=db)
     db.refresh(db_movement)
     return db_movement
 
@@ -356,42 +427,177 @@ def get_stock_movements(db: Session, product_id: Optional[int] = None, skip: int
     return query.order_by(models.StockMovement.created_at.desc()).offset(skip).limit(limit).all()
 
 
-def get_low_stock_products(db: Session):
-    return db.query(models.Product).filter(
+def get_low_stock_products(db: Session, limit: Optional[int] = None):
+    query = db.query(models.Product).filter(
         models.Product.stock_quantity <= models.Product.reorder_level,
         models.Product.is_active == True
-    ).all()
+    ).order_by(models.Product.stock_quantity, models.Product.name)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
 
-def get_inventory_report(db: Session):
-    products = db.query(models.Product).filter(models.Product.is_active == True).all()
+INVENTORY_STATUSES = ("OK", "LOW", "OUT")
+INVENTORY_PAGE_SIZE = 50
 
-    report = []
-    for product in products:
-        # Get latest movement
-        latest_movement = db.query(models.StockMovement).filter(
-            models.StockMovement.product_id == product.id
-        ).order_by(models.StockMovement.created_at.desc()).first()
 
-        # Determine status
-        if product.stock_quantity <= 0:
-            status = "OUT"
-        elif product.stock_quantity <= product.reorder_level:
-            status = "LOW"
-        else:
-            status = "OK"
+def _inventory_columns():
+    """Status and stock value computed in SQL so the report can filter and sort on them"""
+    product = models.Product
+    status = case(
+        (product.stock_quantity <= 0, literal("OUT")),
+        (product.stock_quantity <= product.reorder_level, literal("LOW")),
+        else_=literal("OK")
+    )
+    total_value = product.stock_quantity * product.price
+    return status, total_value
+
+
+def _inventory_query(db: Session, search=None, category=None, status=None):
+    product = models.Product
+    status_column, value_column = _inventory_columns()
+
+    # Latest movement per product in one grouped pass instead of a query per row
+    last_movement = db.query(
+        models.StockMovement.product_id.label("product_id"),
+        func.max(models.StockMovement.created_at).label("last_movement")
+    ).group_by(models.StockMovement.product_id).subquery()
+
+    query = db.query(
+        product.id,
+        product.name,
+        product.sku,
+        product.category,
+        product.price,
+        product.cost_price,
+        product.stock_quantity,
+        product.reorder_level,
+        value_column.label("total_value"),
+        status_column.label("status"),
+        last_movement.c.last_movement
+    ).outerjoin(
+        last_movement, last_movement.c.product_id == product.id
+    ).filter(product.is_active == True)
+
+    if search:
+        pattern = f"%{search.strip()}%"
+        query = query.filter(or_(
+            product.name.ilike(pattern),
+            product.sku.ilike(pattern),
+            product.barcode.ilike(pattern)
+        ))
+    if category:
+        query = query.filter(product.category == category)
+    if status in INVENTORY_STATUSES:
+        query = query.filter(status_column == status)
+
+    return query, last_movement
+
+
+def _inventory_sort(sort, last_movement):
+    product = models.Product
+    status_column, value_column = _inventory_columns()
+    return {
+        "name": product.name,
+        "sku": product.sku,
+        "category": product.category,
+        "stock": product.stock_quantity,
+        "reorder_level": product.reorder_level,
+        "price": product.price,
+        "cost": product.cost_price,
+        "value": value_column,
+        "status": status_column,
+        "last_movement": last_movement.c.last_movement
+    }.get(sort, product.name)
+
+
+def _inventory_row(row):
+    return {
+        "product_id": row.id,
+        "product_name": row.name,
+        "sku": row.sku,
+        "category": row.category,
+        "price": row.price or 0,
+        "cost_price": row.cost_price or 0,
+        "current_stock": row.stock_quantity,
+        "reorder_level": row.reorder_level,
+        "total_value": row.total_value or 0,
+        "status": row.status,
+        "last_movement": row.last_movement
+    }
 
-        report.append({
-            "product_id": product.id,
-            "product_name": product.name,
-            "current_stock": product.stock_quantity,
-            "reorder_level": product.reorder_level,
-            "total_value": product.stock_quantity * product.price,
-            "status": status,
-            "last_movement": latest_movement.created_at if latest_movement else None
-        })
 
-    return report
+def get_inventory_report(db: Session, search=None, category=None, status=None,
+                         sort="name", direction="asc", page=None, per_page=INVENTORY_PAGE_SIZE):
+    """
+    Inventory report rows with every display field from a single query
+
+    Args:
+        search: Matches name, SKU or barcode
+        category: Exact category
+        status: OK, LOW or OUT
+        sort: name, sku, category, stock, reorder_level, price, cost, value,
+              status or last_movement
+        direction: asc or desc
+        page: 1-based page number, or None for every row
+
+    Returns:
+        list: Report rows, or a dict with items/total/page/per_page/pages when paginated
+    """
+    query, last_movement = _inventory_query(db, search, category, status)
+
+    order = _inventory_sort(sort, last_movement)
+    order = order.desc() if direction == "desc" else order.asc()
+    query = query.order_by(order, models.Product.id)
+
+    if page is None:
+        return [_inventory_row(row) for row in query.all()]
+
+    per_page = max(1, min(int(per_page), 500))
+    total = query.order_by(None).count()
+    pages = max(1, -(-total // per_page))
+    page = min(max(1, int(page)), pages)
+    rows = query.offset((page - 1) * per_page).limit(per_page).all()
+
+    return {
+        "items": [_inventory_row(row) for row in rows],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": pages
+    }
+
+
+def get_inventory_summary(db: Session):
+    """Product count, stock value, at-or-below-reorder and out-of-stock counts in one query"""
+    status, total_value = _inventory_columns()
+    row = db.query(
+        func.count(models.Product.id),
+        func.coalesce(func.sum(total_value), 0),
+        func.coalesce(func.sum(case(
+            (models.Product.stock_quantity <= models.Product.reorder_level, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((status == "OUT", 1), else_=0)), 0)
+    ).filter(models.Product.is_active == True).one()
+
+    return {
+        "total_products": row[0],
+        "total_value": float(row[1] or 0),
+        "low_stock": int(row[2] or 0),
+        "out_of_stock": int(row[3] or 0)
+    }
+
+
+def count_active_products(db: Session):
+    return db.query(func.count(models.Product.id)).filter(models.Product.is_active == True).scalar()
+
+
+def get_product_categories(db: Session):
+    """Distinct categories of active products"""
+    rows = db.query(models.Product.category).filter(
+        models.Product.is_active == True,
+        models.Product.category.isnot(None)
+    ).distinct().order_by(models.Product.category).all()
+    return [row[0] for row in rows]
 
 
 def update_stock_level(db: Session, product_id: int, new_min_level: int):
@@ -406,7 +612,7 @@ def update_stock_level(db: Session, product_id: int, new_min_level: int):
 
 
 # User CRUD
-def create_user(db: Session, user: schemas.UserCreate):
+def create_user(db: Session, user: "schemas.UserCreate"):
     from app.auth import get_password_hash
 
     hashed_password = get_password_hash(user.password)
@@ -475,7 +681,8 @@ def create_sale_with_items(db: Session, sale_data: dict, cart_items: List[dict])
         amount_paid=amount_paid,
         change_given=change_given,
         payment_method=sale_data.get('payment_method', 'cash'),
-        status='completed'
+        status='completed',
+        created_at=datetime.now()
     )
 
     db.add(sale)
@@ -488,14 +695,12 @@ def create_sale_with_items(db: Session, sale_data: dict, cart_items: List[dict])
             product_id=item['product_id'],
             quantity=item['quantity'],
             unit_price=item['price'],
-            subtotal=item['subtotal']
+            subtotal=item['subtotal'],
+            created_at=sale.created_at
         )
         db.add(sale_item)
 
-        # Update product stock
-        product = get_product(db, item['product_id'])
-        if product:
-            product.stock_quantity -= item['quantity']
+    increment_stock(db, _stock_out(cart_items))
 
     db.commit()
     db.refresh(sale)
@@ -580,74 +785,1078 @@ def get_product_by_barcode(db: Session, barcode: str):
         models.Product.barcode == barcode
     ).first()
 
-# In app/crud.py
 
-def get_customers(db, skip: int = 0, limit: int = 100):
-    """Get customers with schema error handling"""
+# Label printing
+def get_label_products(db: Session, product_ids: Optional[List[int]] = None, reference: Optional[str] = None):
+    """Label fields for products by ID, or for every product received under a stock movement reference"""
+    columns = [
+        models.Product.id,
+        models.Product.name,
+        models.Product.price,
+        models.Product.sku,
+        models.Product.barcode
+    ]
+
+    if reference:
+        return db.query(*columns, func.sum(models.StockMovement.quantity).label('quantity')) \
+            .join(models.StockMovement, models.StockMovement.product_id == models.Product.id) \
+            .filter(models.StockMovement.reference == reference, models.StockMovement.quantity > 0) \
+            .group_by(*columns) \
+            .order_by(models.Product.name) \
+            .all()
+
+    return db.query(*columns, literal(1).label('quantity')) \
+        .filter(models.Product.id.in_(product_ids or [])) \
+        .order_by(models.Product.name) \
+        .all()
+
+
+def get_product_barcode_values(db: Session):
+    """(id, sku, barcode) for every product, in one query - used to find orphaned barcode images"""
+    return db.query(models.Product.id, models.Product.sku, models.Product.barcode).all()
+
+
+# Read-only projections
+# List and lookup endpoints select just the columns they emit. Rows come back
+# as plain tuples: no Product instances, identity map or change tracking.
+def _product_list_columns():
+    product = models.Product
+    return (
+        product.id,
+        product.name,
+        product.price,
+        product.stock_quantity,
+        product.category,
+        product.sku,
+        product.description,
+        product.barcode
+    )
+
+
+def _product_list_item(row):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "price": float(row.price or 0),
+        "stock_quantity": row.stock_quantity,
+        "category": row.category,
+        "sku": row.sku,
+        "description": row.description,
+        "barcode": row.barcode
+    }
+
+
+def get_product_list(db: Session, skip: int = 0, limit: Optional[int] = 100):
+    """Active products as /api/products dicts, in id order (limit=None for all)"""
+    q = db.query(*_product_list_columns()).filter(
+        models.Product.is_active == True
+    ).order_by(models.Product.id).offset(skip)
+    if limit is not None:
+        q = q.limit(limit)
+    return [_product_list_item(row) for row in q]
+
+
+def _product_lookup_columns():
+    product = models.Product
+    return _product_list_columns() + (product.cost_price, product.reorder_level)
+
+
+def get_product_lookup(db: Session, code: str):
+    """
+    Product dict for a scanned code: exact barcode first, then a partial
+    barcode, SKU or name match. None if nothing matches.
+    """
+    product = models.Product
+    q = db.query(*_product_lookup_columns())
+    row = q.filter(product.barcode == code).first()
+    if row is None:
+        row = q.filter(or_(
+            product.barcode.ilike(f"%{code}%"),
+            product.sku.ilike(f"%{code}%"),
+            product.name.ilike(f"%{code}%")
+        )).first()
+    if row is None:
+        return None
+
+    item = _product_list_item(row)
+    item["cost_price"] = float(row.cost_price) if row.cost_price else None
+    item["reorder_level"] = row.reorder_level
+    return item
+
+
+def _cart_columns():
+    product = models.Product
+    return (product.id, product.name, product.price, product.sku, product.barcode, product.stock_quantity)
+
+
+def get_cart_product(db: Session, product_id: int):
+    """(id, name, price, sku, barcode, stock_quantity) row for the cart, or None"""
+    return db.query(*_cart_columns()).filter(models.Product.id == product_id).first()
+
+
+def find_cart_product(db: Session, code: str):
+    """Cart row for a scanned code: exact barcode, else a partial name or SKU match"""
+    product = models.Product
+    q = db.query(*_cart_columns())
+    row = q.filter(product.barcode == code).first()
+    if row is None:
+        row = q.filter(or_(
+            product.name.ilike(f"%{code}%"),
+            product.sku.ilike(f"%{code}%")
+        )).first()
+    return row
+
+
+# POS catalog
+CATALOG_PAGE_SIZE = 60
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for a keyset position"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError on a malformed token"""
     try:
-        return db.query(models.Customer).offset(skip).limit(limit).all()
-    except Exception as e:
-        print(f"⚠️ Schema error in get_customers: {e}")
-        # Try with explicit column selection
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        return json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _catalog_columns():
+    product = models.Product
+    return (
+        product.id,
+        product.name,
+        product.price,
+        product.sku,
+        product.barcode,
+        product.category,
+        product.stock_quantity,
+        product.image_url
+    )
+
+
+def _catalog_item(row):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "price": float(row.price or 0),
+        "sku": row.sku,
+        "barcode": row.barcode,
+        "category": row.category,
+        "stock_quantity": row.stock_quantity,
+        "image_url": row.image_url
+    }
+
+
+def _name_prefix(db: Session, term):
+    """Case-insensitive prefix match on products.name, served by ix_products_lower_name"""
+    prefix = term.lower()
+    lowered = func.lower(models.Product.name)
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    condition = lowered.like(f"{escaped}%", escape="\\")
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite only uses an expression index for comparisons, not LIKE
+        condition = and_(lowered >= prefix, lowered < prefix[:-1] + chr(ord(prefix[-1]) + 1), condition)
+    return condition
+
+
+def get_catalog_page(db: Session, category=None, query=None, cursor=None, limit=CATALOG_PAGE_SIZE):
+    """
+    One page of active products for the POS grid, ordered by name
+
+    Uses keyset pagination on (name, id) so deep pages cost the same as the
+    first one. A search matches names starting with the term (any case) and
+    exact SKUs and barcodes, each through its own index.
+
+    Returns:
+        dict: products (list of dicts) and next_cursor (None on the last page)
+    """
+    product = models.Product
+    limit = max(1, min(int(limit), 200))
+
+    q = db.query(*_catalog_columns()).filter(product.is_active == True)
+
+    if category and category != "all":
+        q = q.filter(product.category == category)
+    term = (query or "").strip()
+    if term:
+        q = q.filter(or_(
+            _name_prefix(db, term),
+            product.sku == term,
+            product.barcode == term
+        ))
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position, list) or len(position) != 2:
+            raise ValueError("Invalid cursor")
+        last_name, last_id = position
+        q = q.filter(or_(
+            product.name > last_name,
+            and_(product.name == last_name, product.id > last_id)
+        ))
+
+    rows = q.order_by(product.name, product.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "products": [_catalog_item(row) for row in rows],
+        "next_cursor": encode_cursor([rows[-1].name, rows[-1].id]) if has_more else None
+    }
+
+
+# Catalog delta sync
+CHANGES_PAGE_SIZE = 500
+# Rows touched this recently are held back until the next sync, so a
+# transaction that commits late with a slightly older timestamp isn't skipped
+CHANGES_SETTLE_SECONDS = 2
+
+
+def _watermark_text(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def get_product_changes(db: Session, since=None, limit=CHANGES_PAGE_SIZE):
+    """
+    Products inserted, updated or deactivated after a sync token
+
+    Walks products in (updated_at, id) order from the position encoded in
+    the token, so a sync costs O(changes) rather than O(catalog). With no
+    token it returns the whole catalog, page by page.
+
+    Returns:
+        dict: changed (catalog items), deleted (product ids), next (token to
+              send next time) and has_more (call again straight away)
+    """
+    product = models.Product
+    limit = max(1, min(int(limit), 2000))
+
+    # SQLite stores DATETIME as text and a bound datetime always carries
+    # microseconds, so rows written by CURRENT_TIMESTAMP would never compare
+    # equal to the watermark. Comparing the stored text keeps ties exact.
+    text_timestamps = db.get_bind().dialect.name == "sqlite"
+    watermark = type_coerce(product.updated_at, String) if text_timestamps else product.updated_at
+
+    q = db.query(*_catalog_columns(), product.is_active, watermark.label("watermark"))
+
+    if since:
+        position = decode_cursor(since)
+        if not isinstance(position, list) or len(position) != 2:
+            raise ValueError("Invalid sync token")
         try:
-            return db.query(
-                models.Customer.id,
-                models.Customer.name,
-                models.Customer.phone,
-                models.Customer.email
-            ).offset(skip).limit(limit).all()
-        except Exception:
-            # Ultimate fallback - raw SQL
-            result = db.execute(
-                "SELECT id, name, phone, email FROM customers LIMIT :limit OFFSET :skip",
-                {"limit": limit, "skip": skip}
-            )
-            customers = []
-            for row in result:
-                customer = models.Customer()
-                customer.id = row[0]
-                customer.name = row[1]
-                customer.phone = row[2]
-                customer.email = row[3]
-                customers.append(customer)
-            return customers
-
-def get_products(db, skip: int = 0, limit: int = 100):
-    """Get products with schema error handling"""
+            last_id = int(position[1])
+            last_updated = str(position[0]) if text_timestamps else datetime.fromisoformat(position[0])
+        except (TypeError, ValueError):
+            raise ValueError("Invalid sync token")
+        q = q.filter(or_(
+            watermark > last_updated,
+            and_(watermark == last_updated, product.id > last_id)
+        ))
+    else:
+        # A full sync only needs products that still exist on the till side
+        q = q.filter(product.is_active == True)
+
+    db_now = db.query(func.now()).scalar()
+    if isinstance(db_now, datetime):
+        q = q.filter(product.updated_at <= db_now.replace(tzinfo=None) - timedelta(seconds=CHANGES_SETTLE_SECONDS))
+
+    rows = q.filter(product.updated_at.isnot(None)).order_by(watermark, product.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changed, deleted = [], []
+    for row in rows:
+        if row.is_active is False:
+            deleted.append(row.id)
+        else:
+            changed.append(_catalog_item(row))
+
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "next": encode_cursor([_watermark_text(rows[-1].watermark), rows[-1].id]) if rows else since,
+        "has_more": has_more
+    }
+
+
+# Response versions (cheap stand-ins for "has this data changed?")
+def get_products_version(db: Session):
+    """
+    (sum of versions, row count, highest id) over products
+
+    Every product write bumps its version, which unlike updated_at (whole
+    seconds on SQLite) changes even for two edits in the same second. The
+    count and highest id catch deletes and inserts.
+    """
+    total, count, highest = db.query(
+        func.coalesce(func.sum(models.Product.version), 0),
+        func.count(models.Product.id),
+        func.max(models.Product.id)
+    ).one()
+    return int(total), count, highest
+
+
+def get_sale_items_version(db: Session):
+    """
+    (highest sale item id, highest return id) - sale items are only ever
+    inserted, and returned quantities only change alongside a new return
+    """
+    return (
+        db.query(func.max(models.SaleItem.id)).scalar(),
+        db.query(func.max(models.SaleReturn.id)).scalar()
+    )
+
+
+def get_sale_version(db: Session, sale_id: int):
+    """The sale's mutable columns by primary key, or None if it doesn't exist"""
+    row = db.query(
+        models.Sale.id,
+        models.Sale.total_amount,
+        models.Sale.discount_amount,
+        models.Sale.payment_status,
+        models.Sale.notes,
+        models.Sale.refunded_amount,
+        func.count(models.SaleItem.id)
+    ).outerjoin(models.SaleItem, models.SaleItem.sale_id == models.Sale.id).filter(
+        models.Sale.id == sale_id
+    ).group_by(models.Sale.id).first()
+    return tuple(row) if row else None
+
+
+# Voids and returns
+def _return_number():
+    import uuid
+    return f"RET-{datetime.now():%Y%m%d}-{uuid.uuid4().hex[:8].upper()}"
+
+
+def _returned_lines(items, lines):
+    """
+    {sale_item_id: quantity} for the requested lines
+
+    A line names a sale_item_id, or a product_id that is spread over that
+    product's lines on the sale. Raises ValueError when a quantity isn't a
+    positive whole number or more is asked for than is left to return.
+    """
+    remaining = {item.id: item.quantity - (item.returned_quantity or 0) for item in items}
+    wanted = {}
+
+    for line in lines:
+        try:
+            quantity = int(line.get("quantity", 0))
+        except (TypeError, ValueError):
+            raise ValueError("Quantity must be a whole number")
+        if quantity < 1:
+            raise ValueError("Quantity must be positive")
+
+        if line.get("sale_item_id") is not None:
+            candidates = [item.id for item in items if item.id == int(line["sale_item_id"])]
+            label = f"sale item {line['sale_item_id']}"
+        elif line.get("product_id") is not None:
+            candidates = [item.id for item in items if item.product_id == int(line["product_id"])]
+            label = f"product {line['product_id']}"
+        else:
+            raise ValueError("Each line needs a sale_item_id or product_id")
+
+        if not candidates:
+            raise ValueError(f"{label.capitalize()} is not on this sale")
+
+        available = sum(remaining[item_id] - wanted.get(item_id, 0) for item_id in candidates)
+        if quantity > available:
+            raise ValueError(f"Only {available} of {label} left to return")
+
+        for item_id in candidates:
+            take = min(quantity, remaining[item_id] - wanted.get(item_id, 0))
+            if take > 0:
+                wanted[item_id] = wanted.get(item_id, 0) + take
+                quantity -= take
+
+    return wanted
+
+
+def return_sale_items(db: Session, sale_id: int, lines=None, reason=None, created_by="system"):
+    """
+    Take goods back on a sale - some lines (a return) or all of them (a void)
+
+    Args:
+        lines: [{"sale_item_id" or "product_id": ..., "quantity": n}], or
+               None to void the sale, returning everything still on it
+
+    Whatever the sale's size this is one transaction: a row lock on the sale,
+    one UPDATE for product stock and one for sale_items.returned_quantity
+    (each a CASE over ids), bulk-inserted reversing stock movements, a
+    sale_returns row and the sale's refund rollup.
+
+    The refund is the returned goods' share of the sale total, so tax and
+    discount are refunded in proportion; the last return refunds exactly
+    what is left.
+
+    Returns:
+        dict describing the return, or None if the sale doesn't exist
+
+    Raises:
+        ValueError: the sale is already voided, or the lines are invalid
+    """
+    sale = db.query(models.Sale).filter(models.Sale.id == sale_id).with_for_update().first()
+    if not sale:
+        return None
+    if sale.payment_status == "voided":
+        raise ValueError("Sale is already voided")
+
+    items = db.query(
+        models.SaleItem.id,
+        models.SaleItem.product_id,
+        models.SaleItem.quantity,
+        models.SaleItem.returned_quantity,
+        models.SaleItem.unit_price,
+        models.SaleItem.subtotal
+    ).filter(models.SaleItem.sale_id == sale_id).all()
+
+    void = lines is None
+    if void:
+        wanted = {item.id: item.quantity - (item.returned_quantity or 0) for item in items}
+        wanted = {item_id: quantity for item_id, quantity in wanted.items() if quantity > 0}
+    else:
+        wanted = _returned_lines(items, lines)
+
+    if not wanted:
+        raise ValueError("Nothing left to return on this sale")
+
+    by_id = {item.id: item for item in items}
+    fully_returned = all(
+        (item.returned_quantity or 0) + wanted.get(item.id, 0) >= item.quantity for item in items
+    )
+
+    already_refunded = sale.refunded_amount or 0
+    if fully_returned:
+        refund = round(sale.total_amount - already_refunded, 2)
+    else:
+        goods = sum(item.subtotal for item in items)
+        returned_goods = sum(by_id[item_id].unit_price * quantity for item_id, quantity in wanted.items())
+        refund = round(returned_goods * sale.total_amount / goods, 2) if goods else 0.0
+
+    stock_back = {}
+    for item_id, quantity in wanted.items():
+        product_id = by_id[item_id].product_id
+        if product_id is not None:
+            stock_back[product_id] = stock_back.get(product_id, 0) + quantity
+
+    if stock_back:
+        products = models.Product.__table__
+        db.execute(
+            products.update()
+            .where(products.c.id.in_(list(stock_back)))
+            .values(stock_quantity=func.coalesce(products.c.stock_quantity, 0) + case(stock_back, value=products.c.id))
+        )
+    if wanted:
+        sale_items = models.SaleItem.__table__
+        db.execute(
+            sale_items.update()
+            .where(sale_items.c.id.in_(list(wanted)))
+            .values(returned_quantity=func.coalesce(sale_items.c.returned_quantity, 0) + case(wanted, value=sale_items.c.id))
+        )
+
+    kind = "void" if void else "return"
+    number = _return_number()
+    receipt = sale.receipt_number or f"REC-{sale.id:06d}"
+    note = f"{kind.capitalize()} of {receipt}" + (f": {reason}" if reason else "")
+    db.bulk_insert_mappings(models.StockMovement, [
+        {
+            "product_id": by_id[item_id].product_id,
+            "quantity": quantity,
+            "movement_type": kind,
+            "reference": number,
+            "notes": note[:500],
+            "created_by": created_by
+        }
+        for item_id, quantity in wanted.items()
+    ])
+
+    db.add(models.SaleReturn(
+        sale_id=sale.id,
+        return_number=number,
+        kind=kind,
+        reason=reason,
+        refund_amount=refund,
+        quantity=sum(wanted.values()),
+        created_by=created_by
+    ))
+
+    sale.refunded_amount = round(already_refunded + refund, 2)
+    if void:
+        sale.payment_status = "voided"
+        sale.voided_at = datetime.now()
+        sale.void_reason = reason
+    else:
+        sale.payment_status = "returned" if fully_returned else "partially_returned"
+
+    db.commit()
+
+    return {
+        "sale_id": sale.id,
+        "return_number": number,
+        "kind": kind,
+        "refund_amount": refund,
+        "refunded_amount": sale.refunded_amount,
+        "payment_status": sale.payment_status,
+        "items": [
+            {"sale_item_id": item_id, "product_id": by_id[item_id].product_id, "quantity": quantity}
+            for item_id, quantity in wanted.items()
+        ]
+    }
+
+
+# Stock reservations
+# How long a cart holds stock after its last change
+STOCK_RESERVATION_TTL = timedelta(minutes=15)
+
+
+def _reserved_subquery(now, exclude_holder=None):
+    """Correlated SUM of live holds on products.id, optionally leaving one cart out"""
+    reservations = models.StockReservation
+    conditions = [
+        reservations.product_id == models.Product.id,
+        reservations.expires_at > now
+    ]
+    if exclude_holder is not None:
+        conditions.append(reservations.holder != exclude_holder)
+    return select(func.coalesce(func.sum(reservations.quantity), 0)).where(
+        and_(*conditions)
+    ).correlate(models.Product).scalar_subquery()
+
+
+def get_available_stock(db: Session, product_ids, exclude_holder=None):
+    """
+    {product_id: (stock_quantity, reserved)} with reserved counting only
+    unexpired holds, one indexed aggregate per product
+    """
+    if not product_ids:
+        return {}
+    reserved = _reserved_subquery(datetime.now(), exclude_holder)
+    rows = db.query(models.Product.id, models.Product.stock_quantity, reserved).filter(
+        models.Product.id.in_(list(product_ids))
+    ).all()
+    return {product_id: (stock or 0, held or 0) for product_id, stock, held in rows}
+
+
+def _lock_products(db: Session, product_ids):
+    # Serializes holds on the same products (PostgreSQL; a no-op on SQLite,
+    # where the write that follows takes the database lock instead)
+    db.query(models.Product.id).filter(
+        models.Product.id.in_(list(product_ids))
+    ).order_by(models.Product.id).with_for_update().all()
+
+
+def _shortage_message(name, stock, reserved):
+    if reserved:
+        return f"Only {max(0, stock - reserved)} of {name} available ({reserved} held in other carts)"
+    return f"Only {max(0, stock)} of {name} in stock"
+
+
+def reserve_stock(db: Session, holder: str, product_id: int, quantity: int, name=None):
+    """
+    Set the number of units a cart holds of a product (0 releases the hold)
+
+    The hold is written first and checked afterwards, under a lock on the
+    product row, so two carts racing for the last unit can't both get it.
+    Every other hold of the cart is refreshed at the same time, keeping a
+    cart that is still being worked on alive.
+
+    Raises:
+        ValueError: the product can't cover quantity; nothing is changed
+    Returns:
+        int: units the cart could hold in total
+    """
+    reservations = models.StockReservation.__table__
+    now = datetime.now()
+    try:
+        _lock_products(db, [product_id])
+
+        mine = and_(reservations.c.holder == holder, reservations.c.product_id == product_id)
+        if quantity <= 0:
+            db.execute(reservations.delete().where(mine))
+        elif not db.execute(reservations.update().where(mine).values(
+                quantity=quantity, updated_at=now)).rowcount:
+            db.execute(reservations.insert().values(
+                product_id=product_id, holder=holder, quantity=quantity,
+                expires_at=now + STOCK_RESERVATION_TTL, created_at=now, updated_at=now))
+
+        stock, reserved = get_available_stock(db, [product_id], exclude_holder=holder).get(
+            product_id, (0, 0))
+        available = stock - reserved
+        if quantity > 0 and quantity > available:
+            raise ValueError(_shortage_message(name or f"product {product_id}", stock, reserved))
+
+        db.execute(reservations.update().where(reservations.c.holder == holder).values(
+            expires_at=now + STOCK_RESERVATION_TTL))
+        db.commit()
+        return max(0, available)
+    except Exception:
+        db.rollback()
+        raise
+
+
+def release_stock(db: Session, holder: str, product_ids=None):
+    """Drop a cart's holds, on all products or just these; returns how many went"""
+    query = db.query(models.StockReservation).filter(models.StockReservation.holder == holder)
+    if product_ids is not None:
+        query = query.filter(models.StockReservation.product_id.in_(list(product_ids)))
+    removed = query.delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def take_reserved_stock(db: Session, holder: str, quantities, names=None):
+    """
+    Check a checkout against stock held by other carts and drop this cart's
+    holds, as part of the caller's sale transaction (no commit)
+
+    Raises:
+        ValueError: some product can't cover its quantity
+    """
+    names = names or {}
+    _lock_products(db, quantities)
+    db.query(models.StockReservation).filter(
+        models.StockReservation.holder == holder
+    ).delete(synchronize_session=False)
+
+    availability = get_available_stock(db, quantities)
+    for product_id, quantity in quantities.items():
+        stock, reserved = availability.get(product_id, (0, 0))
+        if quantity > stock - reserved:
+            raise ValueError(_shortage_message(
+                names.get(product_id, f"product {product_id}"), stock, reserved))
+
+
+def expire_stock_reservations(db: Session):
+    """Delete holds of abandoned carts; returns how many went"""
+    removed = db.query(models.StockReservation).filter(
+        models.StockReservation.expires_at <= datetime.now()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+# Idempotent requests
+# How long a client may retry with the same Idempotency-Key and get the
+# original response back
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+def request_fingerprint(data):
+    """sha256 of a JSON request body, independent of key order"""
+    import hashlib
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_idempotency_key(db: Session, user_id: int, key: str):
+    """The recorded request for this user's key, unless it has expired"""
+    return db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.created_at >= datetime.now() - IDEMPOTENCY_KEY_TTL
+    ).first()
+
+
+def claim_idempotency_key(db: Session, user_id: int, key: str, endpoint: str, request_hash: str):
+    """
+    Insert the key at the start of the caller's transaction
+
+    The unique (user_id, key) index makes a concurrent request with the same
+    key wait for this transaction and then fail with IntegrityError, so only
+    one of them ever does the work. The caller fills in the response and
+    commits it together with the sale. Expired keys for this user are
+    cleared on the way in.
+    """
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.created_at < datetime.now() - IDEMPOTENCY_KEY_TTL
+    ).delete(synchronize_session=False)
+
+    record = models.IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        created_at=datetime.now()
+    )
+    db.add(record)
+    db.flush()
+    return record
+
+
+# Offline sale ingestion
+SALE_SYNC_BATCH = 100
+
+
+def _parse_client_time(value):
+    """ISO timestamp from a till (usually UTC) as a naive local datetime"""
+    if not value:
+        return datetime.now()
     try:
-        return db.query(models.Product).filter(
-            models.Product.is_active == True
-        ).offset(skip).limit(limit).all()
-    except Exception as e:
-        print(f"⚠️ Schema error in get_products: {e}")
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.now()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return min(parsed, datetime.now())
+
+
+def _parse_sale_items(sale, catalog_prices):
+    """
+    (product_id, quantity, unit_price, list_price) per item, priced from the
+    catalog; the till's price is only taken for items marked price_override
+    """
+    items = sale.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("Sale has no items")
+
+    parsed = []
+    for item in items:
         try:
-            # Try without is_active filter
-            return db.query(models.Product).offset(skip).limit(limit).all()
-        except Exception:
-            # Fallback to basic columns
+            product_id = int(item["product_id"])
+            quantity = int(item["quantity"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each item needs product_id and quantity")
+        if product_id not in catalog_prices:
+            raise ValueError(f"Unknown product {product_id}")
+        list_price = round(float(catalog_prices[product_id] or 0), 2)
+        price = list_price
+        if item.get("price_override"):
             try:
-                return db.query(
-                    models.Product.id,
-                    models.Product.name,
-                    models.Product.price,
-                    models.Product.stock_quantity,
-                    models.Product.category,
-                    models.Product.sku
-                ).offset(skip).limit(limit).all()
-            except Exception:
-                # Raw SQL fallback
-                result = db.execute(
-                    "SELECT id, name, price, stock_quantity, category, sku FROM products LIMIT :limit OFFSET :skip",
-                    {"limit": limit, "skip": skip}
-                )
-                products = []
-                for row in result:
-                    product = models.Product()
-                    product.id = row[0]
-                    product.name = row[1]
-                    product.price = row[2]
-                    product.stock_quantity = row[3]
-                    product.category = row[4]
-                    product.sku = row[5]
-                    products.append(product)
-                return products
\ No newline at end of file
+                price = round(float(item["price"]), 2)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Price override for product {product_id} has no price")
+        if quantity <= 0 or price < 0:
+            raise ValueError(f"Invalid quantity or price for product {product_id}")
+        parsed.append((product_id, quantity, price, list_price))
+    return parsed
+
+
+def _parse_customer_id(sale, known_customers):
+    value = sale.get("customer_id")
+    if value in (None, ""):
+        return None
+    try:
+        customer_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid customer_id {value!r}")
+    if customer_id not in known_customers:
+        raise ValueError(f"Unknown customer {customer_id}")
+    return customer_id
+
+
+def ingest_sales(db: Session, sales, user_id, created_by="system", tax_rate=0.075, holder=None):
+    """
+    Record sales completed on POS clients, possibly while offline
+
+    Each sale carries a receipt_number generated by the till, which is the
+    idempotency key: a sale whose receipt number is already recorded is
+    reported as a duplicate and not applied again, so a till can resend a
+    batch safely after a dropped connection. Lines are priced from the
+    catalog unless an item is marked price_override, in which case the
+    till's price is kept next to the catalog one (list_price), and totals
+    are recomputed from them. A sale naming an unknown product or customer
+    is rejected on its own. Stock is decremented once per product
+    for the whole batch, and the holds the till (holder) placed on the
+    products it sold are dropped with it.
+
+    Returns:
+        list: One result per sale with receipt_number, status
+              (created, duplicate or rejected), sale_id and message
+    """
+    sales = [sale for sale in sales if isinstance(sale, dict)]
+    numbers = [str(sale.get("receipt_number") or "").strip() for sale in sales]
+
+    recorded = dict(db.query(models.Sale.receipt_number, models.Sale.id).filter(
+        models.Sale.receipt_number.in_([n for n in numbers if n])
+    ).all()) if any(numbers) else {}
+
+    product_ids = set()
+    customer_ids = set()
+    for sale in sales:
+        for item in sale.get("items") or []:
+            try:
+                product_ids.add(int(item.get("product_id")))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        try:
+            customer_ids.add(int(sale.get("customer_id")))
+        except (TypeError, ValueError):
+            pass
+    catalog_prices = dict(
+        db.query(models.Product.id, models.Product.price).filter(models.Product.id.in_(product_ids)).all()
+    ) if product_ids else {}
+    known_customers = {
+        row[0] for row in db.query(models.Customer.id).filter(models.Customer.id.in_(customer_ids)).all()
+    } if customer_ids else set()
+
+    results = []
+    created = []
+    stock_out = {}
+
+    for sale, number in zip(sales, numbers):
+        result = {"receipt_number": number, "status": "rejected", "sale_id": None, "message": None}
+        results.append(result)
+
+        if not number or len(number) > 100:
+            result["message"] = "Missing or invalid receipt_number"
+            continue
+        if number in recorded:
+            result.update(status="duplicate", sale_id=recorded[number])
+            continue
+
+        try:
+            items = _parse_sale_items(sale, catalog_prices)
+            customer_id = _parse_customer_id(sale, known_customers)
+            discount = max(0.0, float(sale.get("discount_amount") or 0))
+            subtotal = sum(quantity * price for _, quantity, price, _ in items)
+            tax = subtotal * tax_rate
+            total = max(0.0, subtotal + tax - discount)
+            amount_paid = float(sale.get("amount_paid", total))
+        except (TypeError, ValueError) as e:
+            result["message"] = str(e)
+            continue
+
+        if amount_paid + 0.005 < total:
+            result["message"] = f"Insufficient payment. Total: ₦{total:,.2f}"
+            continue
+
+        db_sale = models.Sale(
+            receipt_number=number,
+            total_amount=total,
+            tax_amount=tax,
+            discount_amount=discount,
+            amount_paid=amount_paid,
+            change_amount=max(0.0, amount_paid - total),
+            payment_method=sale.get("payment_method") or "cash",
+            payment_status="completed",
+            customer_id=customer_id,
+            user_id=user_id,
+            created_at=_parse_client_time(sale.get("created_at"))
+        )
+        db.add(db_sale)
+        created.append((db_sale, items, result))
+        # Block a second copy of the same sale within this batch
+        recorded[number] = None
+
+        for product_id, quantity, _, _ in items:
+            stock_out[product_id] = stock_out.get(product_id, 0) + quantity
+
+    if not created:
+        return results
+
+    db.flush()
+
+    sale_items = []
+    movements = []
+    for db_sale, items, result in created:
+        result.update(status="created", sale_id=db_sale.id)
+        recorded[db_sale.receipt_number] = db_sale.id
+        for product_id, quantity, price, list_price in items:
+            sale_items.append({
+                "sale_id": db_sale.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": price,
+                "list_price": list_price,
+                "subtotal": quantity * price,
+                "created_at": db_sale.created_at
+            })
+            movements.append({
+                "product_id": product_id,
+                "quantity": -quantity,
+                "movement_type": "sale",
+                "reference": db_sale.receipt_number,
+                "notes": "POS sale sync",
+                "created_by": created_by
+            })
+
+    # Later copies of a sale created in this batch point at the new sale
+    for result in results:
+        if result["status"] == "duplicate" and result["sale_id"] is None:
+            result["sale_id"] = recorded.get(result["receipt_number"])
+
+    db.bulk_insert_mappings(models.SaleItem, sale_items)
+    db.bulk_insert_mappings(models.StockMovement, movements)
+
+    # The goods have already left the shop, so stock floors at zero like /sales/complete
+    increment_stock(db, {product_id: -quantity for product_id, quantity in stock_out.items()},
+                    floor_zero=True)
+    if holder:
+        db.query(models.StockReservation).filter(
+            models.StockReservation.holder == holder,
+            models.StockReservation.product_id.in_(list(stock_out))
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return results
+
+
+# Bulk product updates
+BULK_SKU_CHUNK = 500
+
+
+def _bulk_update_conditions(filters: dict):
+    """Build the WHERE clause for a bulk update from category/supplier/SKU filters"""
+    conditions = [models.Product.is_active == True]
+
+    if filters.get('category'):
+        conditions.append(models.Product.category == filters['category'])
+    if filters.get('supplier'):
+        conditions.append(models.Product.supplier_name == filters['supplier'])
+    if filters.get('skus'):
+        conditions.append(models.Product.sku.in_(filters['skus']))
+
+    # Refuse to touch the whole catalog unless explicitly asked to
+    if len(conditions) == 1 and not filters.get('all'):
+        raise ValueError("A category, supplier or SKU filter is required (or set 'all' to update every product)")
+
+    return conditions
+
+
+def bulk_update_products(db: Session, filters: dict, price_mode: Optional[str] = None,
+                         price_change: Optional[float] = None, stock_quantity: Optional[int] = None,
+                         created_by: str = "system", reference: Optional[str] = None):
+    """Apply a price change and/or stock set to every matching product in one UPDATE"""
+    if price_mode is None and stock_quantity is None:
+        raise ValueError("Nothing to update: provide a price change or a stock quantity")
+
+    conditions = _bulk_update_conditions(filters)
+    reference = reference or f"BULK-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    values = {}
+
+    if price_mode is not None:
+        if price_change is None:
+            raise ValueError("price_change is required when price_mode is set")
+        if price_mode == 'percent':
+            new_price = models.Product.price * (1 + price_change / 100.0)
+        elif price_mode == 'absolute':
+            new_price = models.Product.price + price_change
+        else:
+            raise ValueError(f"Unknown price_mode '{price_mode}' (use 'percent' or 'absolute')")
+
+        new_price = func.round(cast(new_price, Numeric(12, 2)), 2)
+        values[models.Product.price] = case((new_price < 0, 0), else_=new_price)
+
+    movements_created = 0
+    if stock_quantity is not None:
+        if stock_quantity < 0:
+            raise ValueError("Stock quantity cannot be negative")
+
+        # Record the difference for every product whose stock actually changes,
+        # reading the old level in the same statement that writes the movement
+        current_stock = func.coalesce(models.Product.stock_quantity, 0)
+        movement_rows = select(
+            models.Product.id,
+            literal(stock_quantity) - current_stock,
+            literal('bulk_set'),
+            literal(reference),
+            literal(f"Bulk stock set to {stock_quantity}"),
+            func.now(),
+            literal(created_by)
+        ).where(*conditions, current_stock != stock_quantity)
+
+        result = db.execute(
+            insert(models.StockMovement).from_select(
+                ['product_id', 'quantity', 'movement_type', 'reference', 'notes', 'created_at', 'created_by'],
+                movement_rows
+            )
+        )
+        movements_created = result.rowcount
+        values[models.Product.stock_quantity] = stock_quantity
+
+    updated = db.query(models.Product).filter(*conditions).update(values, synchronize_session=False)
+    db.commit()
+
+    return {
+        'matched': updated,
+        'price_updated': updated if price_mode is not None else 0,
+        'stock_updated': movements_created,
+        'movements_created': movements_created,
+        'reference': reference
+    }
+
+
+def bulk_set_products_by_sku(db: Session, rows: List[dict], created_by: str = "system",
+                             reference: Optional[str] = None):
+    """
+    Set price and/or stock per SKU from uploaded rows using batched executemany updates
+
+    Raises:
+        StaleDataError: a product changed between being read and written; nothing is saved
+    """
+    reference = reference or f"BULK-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    rows_by_sku = {row['sku']: row for row in rows if row.get('sku')}
+    skus = list(rows_by_sku)
+
+    # One lookup per chunk instead of one per product
+    current = {}
+    for start in range(0, len(skus), BULK_SKU_CHUNK):
+        chunk = skus[start:start + BULK_SKU_CHUNK]
+        for product_id, sku, stock, version in db.query(
+                models.Product.id, models.Product.sku, models.Product.stock_quantity, models.Product.version
+        ).filter(models.Product.sku.in_(chunk)).all():
+            current[sku] = (product_id, stock or 0, version)
+
+    now = datetime.now()
+    product_updates = []
+    movements = []
+    price_updated = 0
+
+    for sku, row in rows_by_sku.items():
+        if sku not in current:
+            continue
+        product_id, old_stock, version = current[sku]
+        # updated_at comes from the column's onupdate, on the database clock like every other write
+        update = {'id': product_id}
+        movement = None
+
+        if row.get('price') is not None:
+            if row['price'] < 0:
+                raise ValueError(f"Price for SKU {sku} cannot be negative")
+            update['price'] = round(row['price'], 2)
+            price_updated += 1
+
+        new_stock = row.get('stock_quantity')
+        if new_stock is not None:
+            if new_stock < 0:
+                raise ValueError(f"Stock quantity for SKU {sku} cannot be negative")
+            update['stock_quantity'] = new_stock
+            if new_stock != old_stock:
+                movement = {
+                    'product_id': product_id,
+                    'quantity': new_stock - old_stock,
+                    'movement_type': 'bulk_set',
+                    'reference': reference,
+                    'notes': f"Bulk stock set to {new_stock}",
+                    'created_at': now,
+                    'created_by': created_by
+                }
+
+        # Anything besides the id to write; a movement only goes with its update
+        if len(update) > 1:
+            # Compare-and-swap on version: a product changed since it was read
+            # (say, stock sold) raises StaleDataError rather than being overwritten
+            update['version'] = version
+            product_updates.append(update)
+            if movement:
+                movements.append(movement)
+
+    db.bulk_update_mappings(models.Product, product_updates)
+    db.bulk_insert_mappings(models.StockMovement, movements)
+    db.commit()
+
+    return {
+        'matched': len(current),
+        'not_found': [sku for sku in skus if sku not in current],
+        'price_updated': price_updated,
+        'stock_updated': len(movements),
+        'movements_created': len(movements),
+        'reference': reference
+    }
@@ -0,0 +1,302 @@
+"""
+Sales history export for POS System
+Line-level sales (sale_items joined with their sale and product) written to
+Parquet, one directory per sale date, so analytics read compressed columnar
+files instead of querying the till database:
+
+    <SALES_EXPORT_DIR>/date=2026-10-19/part-000000012345.parquet
+
+Each run appends only the lines added since the last one (tracked by
+sale_items.id in _state.json); a late offline sale lands as another file in
+its own date's directory. Ids are handed out before their transaction
+commits, so a run notes the highest id, waits EXPORT_SETTLE_SECONDS for
+transactions still holding lower ids to finish, and only then reads up to
+it; nothing committed late below the watermark is skipped. Run it nightly, while the tills are quiet:
+
+    python -m app.exports
+
+Needs pyarrow (optional; pip install pyarrow). Read the files back with
+read_sales() / daily_totals(), or with any Parquet reader using hive
+partitioning on "date". returned_quantity is as of the line's export.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import models
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPORT_DIR = os.getenv('SALES_EXPORT_DIR') or os.path.join(ROOT, 'instance', 'exports', 'sales')
+# Rows fetched from the database and written to Parquet at a time
+EXPORT_BATCH_SIZE = 10000
+# Longer than any sale transaction runs, so every id below the watermark has committed (or rolled back)
+EXPORT_SETTLE_SECONDS = int(os.getenv('SALES_EXPORT_SETTLE_SECONDS', 30))
+# Low-cardinality text columns, stored as dictionary indexes
+CATEGORICAL_COLUMNS = ('payment_method', 'payment_status', 'sku', 'product_name', 'category')
+STATE_FILE = '_state.json'
+# Hive's name for a partition whose value is missing (sales without a date)
+NO_DATE = '__HIVE_DEFAULT_PARTITION__'
+
+sales = models.Sale.__table__
+sale_items = models.SaleItem.__table__
+products = models.Product.__table__
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def schema():
+    pa = _pyarrow()
+    categorical = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('sale_item_id', pa.int64()),
+        ('sale_id', pa.int64()),
+        ('receipt_number', pa.string()),
+        ('sold_at', pa.timestamp('us')),
+        ('user_id', pa.int64()),
+        ('customer_id', pa.int64()),
+        ('payment_method', categorical),
+        ('payment_status', categorical),
+        ('product_id', pa.int64()),
+        ('sku', categorical),
+        ('product_name', categorical),
+        ('category', categorical),
+        ('quantity', pa.int64()),
+        ('returned_quantity', pa.int64()),
+        ('unit_price', pa.float64()),
+        ('subtotal', pa.float64()),
+    ])
+
+
+def _lines(after, upto):
+    """Sale lines with after < id <= upto, by sale time so each date's rows come together"""
+    return select(
+        sale_items.c.id.label('sale_item_id'),
+        sale_items.c.sale_id,
+        sales.c.receipt_number,
+        sales.c.created_at.label('sold_at'),
+        sales.c.user_id,
+        sales.c.customer_id,
+        sales.c.payment_method,
+        sales.c.payment_status,
+        sale_items.c.product_id,
+        products.c.sku,
+        products.c.name.label('product_name'),
+        products.c.category,
+        sale_items.c.quantity,
+        func.coalesce(sale_items.c.returned_quantity, 0).label('returned_quantity'),
+        sale_items.c.unit_price,
+        sale_items.c.subtotal
+    ).select_from(
+        sale_items.join(sales, sales.c.id == sale_items.c.sale_id)
+        .outerjoin(products, products.c.id == sale_items.c.product_id)
+    ).where(
+        sale_items.c.id > after, sale_items.c.id <= upto
+    ).order_by(sales.c.created_at, sale_items.c.id)
+
+
+def load_state(export_dir=None):
+    path = os.path.join(export_dir or EXPORT_DIR, STATE_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'last_sale_item_id': 0, 'last_run_at': None, 'rows': 0}
+
+
+def _save_state(export_dir, state):
+    path = os.path.join(export_dir, STATE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _day(sold_at):
+    return sold_at.date().isoformat() if sold_at else NO_DATE
+
+
+class _DayWriter:
+    """One Parquet file in one date directory, moved into place only once complete"""
+
+    def __init__(self, export_dir, day, name, schema):
+        pq = _pyarrow().parquet
+        directory = os.path.join(export_dir, f'date={day}')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, name)
+        # Dot files are skipped by dataset readers until the rename
+        self.tmp = os.path.join(directory, f".{name}.tmp")
+        self.writer = pq.ParquetWriter(self.tmp, schema, compression='zstd',
+                                       use_dictionary=list(CATEGORICAL_COLUMNS))
+
+    def write(self, table):
+        self.writer.write_table(table)
+
+    def close(self, keep=True):
+        self.writer.close()
+        if keep:
+            os.replace(self.tmp, self.path)
+        else:
+            os.unlink(self.tmp)
+
+
+def export_sales(export_dir=None, batch_size=EXPORT_BATCH_SIZE, settle=None):
+    """
+    Append sale lines recorded since the last run to the Parquet export
+
+    Rows stream from the database in batches, so memory stays flat however
+    much history there is. Files are named after the run's starting id, so
+    a run that failed part-way is simply redone, overwriting its files.
+    The run waits `settle` seconds (EXPORT_SETTLE_SECONDS) between noting
+    the highest id and reading up to it.
+
+    Returns:
+        dict: rows and files written, the sale_items id range and dates covered
+    """
+    from app.database import engine
+
+    pa = _pyarrow()
+    export_dir = export_dir or EXPORT_DIR
+    os.makedirs(export_dir, exist_ok=True)
+
+    state = load_state(export_dir)
+    after = state['last_sale_item_id']
+    table_schema = schema()
+    name = f"part-{after + 1:012d}.parquet"
+    rows, days = 0, []
+
+    settle = EXPORT_SETTLE_SECONDS if settle is None else settle
+    with engine.connect() as connection:
+        upto = connection.execute(select(func.max(sale_items.c.id))).scalar() or 0
+    if upto > after and settle > 0:
+        print(f"⏳ Waiting {settle}s for sales still being recorded below id {upto}")
+        time.sleep(settle)
+
+    with engine.connect() as connection:
+        if upto > after:
+            result = connection.execution_options(stream_results=True).execute(_lines(after, upto))
+            writer = None
+            try:
+                for chunk in result.partitions(batch_size):
+                    for day, group in itertools.groupby(chunk, key=lambda row: _day(row.sold_at)):
+                        if writer is None or day != days[-1]:
+                            if writer is not None:
+                                writer.close()
+                            writer = _DayWriter(export_dir, day, name, table_schema)
+                            days.append(day)
+                        batch = [dict(row._mapping) for row in group]
+                        writer.write(pa.Table.from_pylist(batch, schema=table_schema))
+                        rows += len(batch)
+            except Exception:
+                if writer is not None:
+                    writer.close(keep=False)
+                raise
+            if writer is not None:
+                writer.close()
+
+    if upto > after:
+        _save_state(export_dir, {
+            'last_sale_item_id': upto,
+            'last_run_at': datetime.now().isoformat(),
+            'rows': state.get('rows', 0) + rows
+        })
+
+    print(f"📤 Exported {rows} sale line(s) into {len(days)} date(s) under {export_dir}")
+    return {
+        'rows': rows,
+        'files': len(days),
+        'dates': [days[0], days[-1]] if days else [],
+        'sale_item_ids': [after + 1, upto] if upto > after else [],
+    }
+
+
+def dataset(export_dir=None):
+    """The export as a pyarrow dataset with a "date" column from the directory names"""
+    pa = _pyarrow()
+    return pa.dataset.dataset(
+        export_dir or EXPORT_DIR, format='parquet',
+        partitioning=pa.dataset.partitioning(pa.schema([('date', pa.date32())]), flavor='hive')
+    )
+
+
+def read_sales(start=None, end=None, columns=None, export_dir=None):
+    """
+    Exported sale lines dated start <= date < end (either may be None)
+
+    Only the matching date directories are opened, and only the requested
+    columns are decoded.
+
+    Returns:
+        pyarrow.Table
+    """
+    pa = _pyarrow()
+    export_dir = export_dir or EXPORT_DIR
+    if not os.path.isdir(export_dir):
+        table = schema().append(pa.field('date', pa.date32())).empty_table()
+        return table.select(columns) if columns else table
+
+    field = pa.dataset.field('date')
+    condition = None
+    for part in (field >= start if start else None, field < end if end else None):
+        if part is not None:
+            condition = part if condition is None else condition & part
+    return dataset(export_dir).to_table(columns=columns, filter=condition)
+
+
+def daily_totals(start=None, end=None, export_dir=None):
+    """
+    [{date, sales, lines, quantity, returned_quantity, gross_revenue}] per
+    day, from the export; gross_revenue is before returns and refunds
+    """
+    table = read_sales(start, end, export_dir=export_dir,
+                       columns=['date', 'sale_id', 'quantity', 'returned_quantity', 'subtotal'])
+    totals = table.group_by('date').aggregate([
+        ('sale_id', 'count_distinct'),
+        ('sale_id', 'count'),
+        ('quantity', 'sum'),
+        ('returned_quantity', 'sum'),
+        ('subtotal', 'sum'),
+    ]).sort_by('date')
+    return [
+        {
+            'date': row['date'].isoformat() if row['date'] else None,
+            'sales': row['sale_id_count_distinct'],
+            'lines': row['sale_id_count'],
+            'quantity': row['quantity_sum'],
+            'returned_quantity': row['returned_quantity_sum'],
+            'gross_revenue': round(row['subtotal_sum'] or 0, 2)
+        }
+        for row in totals.to_pylist()
+    ]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m app.exports',
+                                     description='Append new sale lines to the Parquet export')
+    parser.add_argument('--dir', default=EXPORT_DIR, help=f'export directory (default {EXPORT_DIR})')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument('--settle', type=int, default=EXPORT_SETTLE_SECONDS,
+                        help=f'seconds to let in-flight sales commit (default {EXPORT_SETTLE_SECONDS})')
+    args = parser.parse_args(argv)
+
+    export_sales(args.dir, batch_size=args.batch_size, settle=args.settle)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
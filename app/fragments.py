@@ -0,0 +1,82 @@
+"""
+Template caching for POS System
+On-disk Jinja bytecode so workers skip recompiling templates, and an
+in-process cache of rendered page fragments keyed by data version
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+
+# Distinct fragment names kept per worker; each holds only its latest version
+FRAGMENT_CACHE_SIZE = 128
+
+_fragments = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def fragment(name, *version, caller):
+    """
+    Jinja call block that renders its body once per data version
+
+        {% call fragment('dashboard:top_products', sales_version) %}
+            ...
+        {% endcall %}
+
+    The body is only rendered (and any lazy loader inside it only called)
+    when the version differs from the cached one. A fragment must not show
+    anything that varies per user or request beyond what is in its name
+    and version.
+    """
+    with _lock:
+        cached = _fragments.get(name)
+        if cached is not None and cached[0] == version:
+            _fragments.move_to_end(name)
+            _stats['hits'] += 1
+            return cached[1]
+        _stats['misses'] += 1
+
+    html = Markup(caller())
+
+    with _lock:
+        _fragments[name] = (version, html)
+        _fragments.move_to_end(name)
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return html
+
+
+def get_stats():
+    """Fragment cache hits, misses and hit rate for this worker"""
+    with _lock:
+        stats = dict(_stats, fragments=len(_fragments))
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+
+def clear():
+    with _lock:
+        _fragments.clear()
+        _stats.update(hits=0, misses=0)
+
+
+def init_app(app):
+    """
+    Bytecode cache and the fragment() helper on a Flask app's Jinja env
+
+    Compiled templates go to JINJA_CACHE_DIR, or a per-user directory under
+    the system temp dir when it isn't set.
+    """
+    cache_dir = os.getenv('JINJA_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.globals['fragment'] = fragment
+    print(f"📄 Template bytecode cache: {app.jinja_env.bytecode_cache.directory}")
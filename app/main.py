@@ -1,12 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Form
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
+import os
 
-from app import crud, schemas
+from app import auth, crud, schemas
 from app.database import get_db, SessionLocal
 
 # Create FastAPI app
@@ -15,6 +16,17 @@ app = FastAPI(title="POS System", version="2.0.0")
 # Mount templates
 templates = Jinja2Templates(directory="templates")
 
+# The Flask app's instance folder (web_server.py sits in the project root)
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance")
+
+
+@app.on_event("startup")
+def load_token_key():
+    """Sign API tokens with the Flask app's key, so a token from either app works in both"""
+    from app import sessions
+
+    auth.set_secret_key(sessions.load_secret_key(INSTANCE_PATH))
+
 
 # API endpoints (keep existing)
 @app.get("/")
@@ -100,6 +112,15 @@ def sales_page(request: Request, db: Session = Depends(get_db)):
     })
 
 
+def current_user(authorization: Optional[str] = Header(None)):
+    """Bearer-token user for API writes; verified in-process, no database hit when cached"""
+    user = auth.get_current_user(auth.bearer_token(authorization) or "")
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
 # API endpoints (for AJAX calls)
 @app.get("/api/products/", response_model=List[schemas.Product])
 def api_read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -107,7 +128,8 @@ def api_read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get
 
 
 @app.post("/api/products/", response_model=schemas.Product)
-def api_create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
+def api_create_product(product: schemas.ProductCreate, db: Session = Depends(get_db),
+                       user: auth.TokenUser = Depends(current_user)):
     try:
         return crud.create_product(db=db, product=product)
     except ValueError as e:
@@ -123,7 +145,8 @@ def api_read_product(product_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/api/sales/", response_model=schemas.Sale)
-def api_create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
+def api_create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db),
+                    user: auth.TokenUser = Depends(current_user)):
     try:
         return crud.create_sale(db=db, sale=sale)
     except ValueError as e:
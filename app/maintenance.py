@@ -0,0 +1,132 @@
+"""
+Background maintenance jobs for POS System
+Runs housekeeping work on a daemon thread so it never blocks a request
+"""
+
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from app.database import SessionLocal
+from app import crud
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_periodic = set()
+
+
+def get_job(name):
+    """Status of the latest run of a job, or None if it never ran"""
+    with _jobs_lock:
+        job = _jobs.get(name)
+        return dict(job) if job else None
+
+
+def start_job(name, func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on a background thread
+
+    Only one run per job name is allowed at a time; starting a job that is
+    already running returns the running job's status.
+
+    Returns:
+        tuple: (job status dict, True if a new run was started)
+    """
+    with _jobs_lock:
+        job = _jobs.get(name)
+        if job and job['status'] == 'running':
+            return dict(job), False
+
+        job = {
+            'name': name,
+            'status': 'running',
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        _jobs[name] = job
+
+    def run():
+        try:
+            result = func(*args, **kwargs)
+            status, error = 'completed', None
+        except Exception as e:
+            traceback.print_exc()
+            result, status, error = None, 'failed', str(e)
+
+        with _jobs_lock:
+            job.update({
+                'status': status,
+                'finished_at': datetime.now().isoformat(),
+                'result': result,
+                'error': error
+            })
+        print(f"🧹 Job {name} {status}: {result if result is not None else error}")
+
+    threading.Thread(target=run, name=f"job-{name}", daemon=True).start()
+    return dict(job), True
+
+
+def start_periodic(name, interval, func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) every interval seconds on a daemon thread
+
+    Started at most once per process, so it is safe to call from request
+    handlers; errors are logged and the schedule carries on.
+
+    Returns:
+        bool: True if this call started the schedule
+    """
+    with _jobs_lock:
+        if name in _periodic:
+            return False
+        _periodic.add(name)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                traceback.print_exc()
+
+    threading.Thread(target=loop, name=f"every-{name}", daemon=True).start()
+    return True
+
+
+def expire_stock_reservations():
+    """Delete stock holds of abandoned carts"""
+    db = SessionLocal()
+    try:
+        removed = crud.expire_stock_reservations(db)
+    finally:
+        db.close()
+    if removed:
+        print(f"🧹 Released {removed} expired stock reservation(s)")
+    return removed
+
+
+def ensure_partitions():
+    """Add upcoming monthly partitions (PostgreSQL)"""
+    from app import partitions
+
+    return partitions.ensure_partitions()
+
+
+def cleanup_orphaned_barcodes(batch_size=200):
+    """Delete barcode images that no product uses any more"""
+    from barcode_utils import barcode_generator, BarcodeGenerator
+
+    db = SessionLocal()
+    try:
+        live = [
+            BarcodeGenerator.barcode_value_for(barcode, sku, product_id)
+            for product_id, sku, barcode in crud.get_product_barcode_values(db)
+        ]
+    finally:
+        db.close()
+
+    return barcode_generator.remove_orphaned_images(live, batch_size=batch_size)
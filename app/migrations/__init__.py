@@ -0,0 +1,204 @@
+"""
+Versioned schema migrations for POS System
+
+Each module in this package named vNNNN_<name>.py is one migration:
+
+    DESCRIPTION = "Add foo to products"
+    TRANSACTIONAL = True          # optional, default True
+
+    def upgrade(ctx):
+        ctx.add_column("products", "foo", "VARCHAR(50)")
+
+Applied versions are recorded in schema_migrations, so each runs once per
+database, in order, at deploy time (python -m app.migrations, or through
+python -m app.bootstrap). Helpers on the context are idempotent, which lets
+the same history run against a fresh database, where the baseline creates
+every table from the models, and against older deployments whose schema was
+patched by hand.
+
+Migrations with TRANSACTIONAL = False run in autocommit mode; on PostgreSQL
+their indexes are built CONCURRENTLY so writes to the table are not blocked.
+"""
+
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+
+from app.database import Base, engine as default_engine
+
+
+VERSION_TABLE = "schema_migrations"
+# pg_advisory_lock key so two deploys never migrate at the same time
+LOCK_KEY = 47102024
+
+_MODULE_NAME = re.compile(r"^v(\d{4})_\w+$")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    VERSION_TABLE, _metadata,
+    Column("version", String(32), primary_key=True),
+    Column("description", String(255)),
+    Column("applied_at", DateTime)
+)
+
+
+class MigrationContext:
+    """What a migration's upgrade() gets: the connection plus idempotent DDL helpers"""
+
+    def __init__(self, connection, transactional=True):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.transactional = transactional
+
+    def execute(self, sql, params=None):
+        return self.connection.execute(text(sql), params or {})
+
+    def table_names(self):
+        return inspect(self.connection).get_table_names()
+
+    def has_table(self, table):
+        return table in self.table_names()
+
+    def column_names(self, table):
+        return {column["name"] for column in inspect(self.connection).get_columns(table)}
+
+    def create_tables(self, *names):
+        """Create model tables that don't exist yet - the named ones, or all of them"""
+        tables = [Base.metadata.tables[name] for name in names] if names else None
+        Base.metadata.create_all(bind=self.connection, tables=tables, checkfirst=True)
+
+    def add_column(self, table, column, ddl):
+        """ALTER TABLE ... ADD COLUMN unless the table already has it"""
+        if not self.has_table(table) or column in self.column_names(table):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        print(f"   ➕ {table}.{column}")
+        return True
+
+    def _covering_index(self, table, columns):
+        inspector = inspect(self.connection)
+        existing = inspector.get_indexes(table) + inspector.get_unique_constraints(table)
+        for index in existing:
+            if list(index["column_names"]) == list(columns):
+                # SQLite reports inline UNIQUE constraints without a name
+                return index["name"] or f"unique({', '.join(columns)})"
+        return None
+
+    def create_index(self, name, table, columns, unique=False):
+        """
+        Create an index unless one with this name, or on exactly these
+        columns, already exists. Concurrent on PostgreSQL outside a transaction.
+        """
+        if not self.has_table(table):
+            return False
+        existing = self._covering_index(table, columns)
+        if existing:
+            if existing != name:
+                print(f"   ✔️  {table}({', '.join(columns)}) already indexed by {existing}")
+            return False
+
+        concurrently = self.dialect == "postgresql" and not self.transactional
+        if concurrently:
+            # A failed concurrent build leaves an INVALID index behind; clear it first
+            invalid = self.execute(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid", {"name": name}
+            ).first()
+            if invalid:
+                self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+        self.execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+            f"IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        )
+        print(f"   ➕ index {name}{' (concurrently)' if concurrently else ''}")
+        return True
+
+
+def discover():
+    """All migration modules in version order as (version, module)"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(info.name)
+        if match:
+            found.append((match.group(1), importlib.import_module(f"{__name__}.{info.name}")))
+    found.sort(key=lambda item: item[0])
+
+    versions = [version for version, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return found
+
+
+def applied_versions(connection):
+    _metadata.create_all(bind=connection, checkfirst=True)
+    return {row.version: row.applied_at for row in connection.execute(select(schema_migrations))}
+
+
+def _run(engine, version, module):
+    transactional = getattr(module, "TRANSACTIONAL", True)
+    description = getattr(module, "DESCRIPTION", module.__name__)
+    print(f"🔄 Migration {version}: {description}")
+
+    if transactional:
+        with engine.begin() as conn:
+            module.upgrade(MigrationContext(conn, transactional=True))
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.now()))
+    else:
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            module.upgrade(MigrationContext(conn, transactional=False))
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.now()))
+
+
+def upgrade(engine=None, target=None):
+    """
+    Apply pending migrations up to and including target (default: all)
+
+    Returns:
+        list: versions applied by this call
+    """
+    engine = engine or default_engine
+    lock = None
+    if engine.dialect.name == "postgresql":
+        lock = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+
+    try:
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+
+        applied = []
+        for version, module in discover():
+            if version in done:
+                continue
+            if target is not None and version > target:
+                break
+            _run(engine, version, module)
+            applied.append(version)
+
+        if applied:
+            print(f"✅ Applied {len(applied)} migration(s): {', '.join(applied)}")
+        else:
+            print("✅ Schema is up to date")
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+            lock.close()
+
+
+def status(engine=None):
+    """[(version, description, applied_at or None)] for every known migration"""
+    engine = engine or default_engine
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [
+        (version, getattr(module, "DESCRIPTION", module.__name__), done.get(version))
+        for version, module in discover()
+    ]
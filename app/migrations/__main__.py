@@ -0,0 +1,32 @@
+"""
+python -m app.migrations [upgrade [VERSION] | status]
+"""
+
+import sys
+
+from app import migrations
+
+
+def main(argv):
+    command = argv[0] if argv else "upgrade"
+
+    if command == "upgrade":
+        migrations.upgrade(target=argv[1] if len(argv) > 1 else None)
+        return 0
+
+    if command == "status":
+        pending = 0
+        for version, description, applied_at in migrations.status():
+            if applied_at:
+                print(f"✅ {version}  {description}  ({applied_at:%Y-%m-%d %H:%M})")
+            else:
+                pending += 1
+                print(f"⏳ {version}  {description}  (pending)")
+        return 1 if pending else 0
+
+    print(__doc__.strip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,9 @@
+"""Baseline: create any table declared in app.models that doesn't exist"""
+
+from app import models  # noqa: F401 - registers every table on Base.metadata
+
+DESCRIPTION = "Create tables from the models"
+
+
+def upgrade(ctx):
+    ctx.create_tables()
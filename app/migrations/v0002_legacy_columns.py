@@ -0,0 +1,33 @@
+"""
+Columns older deployments were missing, previously patched in by
+migrate_database.py and fix_db.py, plus backfills for rows that predate them
+"""
+
+DESCRIPTION = "Add product and customer columns missing from older databases"
+
+PRODUCT_COLUMNS = [
+    ("cost_price", "FLOAT DEFAULT 0"),
+    ("barcode", "VARCHAR(100)"),
+    ("reorder_level", "INTEGER DEFAULT 10"),
+    ("location", "VARCHAR(100)"),
+    ("supplier_name", "VARCHAR(255)"),
+    ("supplier_code", "VARCHAR(100)"),
+    ("image_url", "VARCHAR(500)"),
+    ("created_at", "TIMESTAMP"),
+    ("updated_at", "TIMESTAMP"),
+    ("is_active", "BOOLEAN DEFAULT TRUE"),
+]
+
+
+def upgrade(ctx):
+    for column, ddl in PRODUCT_COLUMNS:
+        ctx.add_column("products", column, ddl)
+    ctx.add_column("customers", "address", "TEXT")
+
+    # Queries filter on is_active and walk updated_at; NULLs would hide rows
+    ctx.execute("UPDATE products SET is_active = TRUE WHERE is_active IS NULL")
+    ctx.execute("UPDATE products SET reorder_level = 10 WHERE reorder_level IS NULL")
+    ctx.execute(
+        "UPDATE products SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+        "WHERE updated_at IS NULL"
+    )
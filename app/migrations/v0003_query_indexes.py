@@ -0,0 +1,25 @@
+"""
+Indexes behind the catalog, delta sync, inventory report and sale lookups
+
+Non-transactional so PostgreSQL builds them CONCURRENTLY without blocking
+checkout writes. Indexes already declared on the models are skipped.
+"""
+
+DESCRIPTION = "Add indexes for catalog, sync, inventory and sales queries"
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_products_active_name", "products", ["is_active", "name", "id"]),
+    ("ix_products_updated_at", "products", ["updated_at", "id"]),
+    ("ix_products_barcode", "products", ["barcode"]),
+    ("ix_products_sku", "products", ["sku"]),
+    ("ix_sales_created_at", "sales", ["created_at"]),
+    ("ix_sale_items_sale_id", "sale_items", ["sale_id"]),
+    ("ix_sale_items_product_id", "sale_items", ["product_id"]),
+    ("ix_stock_movements_product_created", "stock_movements", ["product_id", "created_at"]),
+]
+
+
+def upgrade(ctx):
+    for name, table, columns in INDEXES:
+        ctx.create_index(name, table, columns)
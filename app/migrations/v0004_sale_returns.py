@@ -0,0 +1,16 @@
+"""Voids and partial returns: refund rollups on sales and a sale_returns log"""
+
+from app import models  # noqa: F401 - registers sale_returns on Base.metadata
+
+DESCRIPTION = "Add void/return columns and the sale_returns table"
+
+
+def upgrade(ctx):
+    ctx.add_column("sales", "voided_at", "TIMESTAMP")
+    ctx.add_column("sales", "void_reason", "TEXT")
+    ctx.add_column("sales", "refunded_amount", "FLOAT DEFAULT 0")
+    ctx.add_column("sale_items", "returned_quantity", "INTEGER DEFAULT 0")
+    ctx.create_tables("sale_returns")
+
+    ctx.execute("UPDATE sales SET refunded_amount = 0 WHERE refunded_amount IS NULL")
+    ctx.execute("UPDATE sale_items SET returned_quantity = 0 WHERE returned_quantity IS NULL")
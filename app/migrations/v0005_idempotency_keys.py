@@ -0,0 +1,9 @@
+"""Idempotency keys for checkout retries"""
+
+from app import models  # noqa: F401 - registers idempotency_keys on Base.metadata
+
+DESCRIPTION = "Add the idempotency_keys table"
+
+
+def upgrade(ctx):
+    ctx.create_tables("idempotency_keys")
@@ -0,0 +1,9 @@
+"""Server-side sessions"""
+
+from app import models  # noqa: F401 - registers user_sessions on Base.metadata
+
+DESCRIPTION = "Add the user_sessions table"
+
+
+def upgrade(ctx):
+    ctx.create_tables("user_sessions")
@@ -0,0 +1,9 @@
+"""Stock held by open carts"""
+
+from app import models  # noqa: F401 - registers stock_reservations on Base.metadata
+
+DESCRIPTION = "Add the stock_reservations table"
+
+
+def upgrade(ctx):
+    ctx.create_tables("stock_reservations")
@@ -0,0 +1,7 @@
+"""Optimistic concurrency on products"""
+
+DESCRIPTION = "Add products.version"
+
+
+def upgrade(ctx):
+    ctx.add_column("products", "version", "INTEGER NOT NULL DEFAULT 1")
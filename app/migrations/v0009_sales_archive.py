@@ -0,0 +1,10 @@
+"""Archive tables for sales, items, returns and stock movements past their retention"""
+
+from app import models  # noqa: F401 - registers the *_archive tables on Base.metadata
+
+DESCRIPTION = "Add sales and stock movement archive tables"
+
+
+def upgrade(ctx):
+    ctx.create_tables("sales_archive", "sale_items_archive", "sale_returns_archive",
+                      "stock_movements_archive")
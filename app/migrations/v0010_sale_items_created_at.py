@@ -0,0 +1,32 @@
+"""
+sale_items.created_at, copied from the sale, so items can be partitioned by month
+
+Non-transactional: the backfill runs in id windows that each commit on their
+own, so it never holds row locks on the whole table.
+"""
+
+DESCRIPTION = "Add created_at to sale_items"
+TRANSACTIONAL = False
+
+BACKFILL_BATCH = 5000
+
+
+def upgrade(ctx):
+    # On PostgreSQL, rows a still-running old release inserts get a date too
+    ddl = "TIMESTAMP DEFAULT now()" if ctx.dialect == "postgresql" else "DATETIME"
+    ctx.add_column("sale_items", "created_at", ddl)
+    ctx.add_column("sale_items_archive", "created_at", ddl.split()[0])
+
+    for table in ("sale_items", "sale_items_archive"):
+        low, high = ctx.execute(f"SELECT MIN(id), MAX(id) FROM {table}").first()
+        if low is None:
+            continue
+        sales = "sales" if table == "sale_items" else "sales_archive"
+        for start in range(low, high + 1, BACKFILL_BATCH):
+            ctx.execute(
+                f"UPDATE {table} SET created_at = "
+                f"(SELECT s.created_at FROM {sales} s WHERE s.id = {table}.sale_id) "
+                f"WHERE id >= :start AND id < :end",
+                {"start": start, "end": start + BACKFILL_BATCH}
+            )
+        print(f"   ✔️  {table}.created_at backfilled")
@@ -0,0 +1,25 @@
+"""
+Partition sales, sale_items and stock_movements by month (PostgreSQL only)
+
+Rows already recorded stay in <table>_legacy, attached as the DEFAULT
+partition; new months get their own partitions from next month on. See
+app.partitions.convert_table for how the swap avoids long locks.
+"""
+
+from datetime import date
+
+from app import models  # noqa: F401 - sale_items.created_at must be on Base.metadata
+from app import partitions
+
+DESCRIPTION = "Partition sales, sale_items and stock_movements by month"
+TRANSACTIONAL = False
+
+
+def upgrade(ctx):
+    if ctx.dialect != "postgresql":
+        return
+    # Everything up to the end of this month stays in the legacy partitions
+    boundary = partitions.add_months(date.today(), 1)
+    # sales first: its conversion drops the foreign keys sale_items points at it with
+    for table in partitions.PARTITIONED_TABLES:
+        partitions.convert_table(ctx.connection.engine, table, boundary)
@@ -0,0 +1,8 @@
+"""The catalog price of each sale line, so price overrides show up against it"""
+
+DESCRIPTION = "Add list_price to sale_items"
+
+
+def upgrade(ctx):
+    for table in ("sale_items", "sale_items_archive"):
+        ctx.add_column(table, "list_price", "FLOAT")
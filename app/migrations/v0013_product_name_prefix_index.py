@@ -0,0 +1,14 @@
+"""
+Index on lower(name) for the catalog's case-insensitive prefix search
+
+text_pattern_ops lets PostgreSQL use it for LIKE 'term%' whatever the
+database collation; SQLite uses it for the matching range comparison.
+"""
+
+DESCRIPTION = "Add lower(name) index for product search"
+TRANSACTIONAL = False
+
+
+def upgrade(ctx):
+    expression = "lower(name) text_pattern_ops" if ctx.dialect == "postgresql" else "lower(name)"
+    ctx.create_index("ix_products_lower_name", "products", [expression])
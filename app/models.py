@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Index, Table, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base  # or db if using Flask-SQLAlchemy
@@ -27,11 +27,24 @@ class Product(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # Bumped by every change. ORM flushes compare-and-swap on it (version_id_col
+    # below); Core UPDATEs such as stock increments bump it through onupdate.
+    version = Column(Integer, nullable=False, default=1, server_default="1",
+                     onupdate=literal_column("version + 1"))
 
     # Relationships
     sale_items = relationship("SaleItem", back_populates="product")
     cart_items = relationship("CartItem", back_populates="product")
 
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        # Serves the POS catalog: active products in name order, paged by (name, id)
+        Index("ix_products_active_name", "is_active", "name", "id"),
+        # Serves delta sync: products changed after an (updated_at, id) watermark
+        Index("ix_products_updated_at", "updated_at", "id"),
+    )
+
 
 # APPROACH 2: If using Flask-SQLAlchemy (db.Model)
 # from app.database import db  # Make sure you import db
@@ -72,10 +85,29 @@ class Sale(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=func.now())
     notes = Column(Text, nullable=True)
+    voided_at = Column(DateTime, nullable=True)
+    void_reason = Column(Text, nullable=True)
+    # Running total of money given back through returns and voids
+    refunded_amount = Column(Float, default=0)
 
     customer = relationship("Customer", back_populates="sales")
     items = relationship("SaleItem", back_populates="sale")
     user = relationship("User")
+    returns = relationship("SaleReturn", back_populates="sale")
+
+    @property
+    def voidable(self):
+        return self.payment_status not in ("voided", "returned")
+
+    @property
+    def net_amount(self):
+        """Takings after returns"""
+        return (self.total_amount or 0) - (self.refunded_amount or 0)
+
+    __table_args__ = (
+        # Daily totals and date-range reports
+        Index("ix_sales_created_at", "created_at"),
+    )
 
 
 class SaleItem(Base):
@@ -86,11 +118,110 @@ class SaleItem(Base):
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
+    # Catalog price when sold; differs from unit_price where the till overrode it
+    list_price = Column(Float)
     subtotal = Column(Float, nullable=False)
+    returned_quantity = Column(Integer, default=0)
+    # The sale's created_at, so items partition by month alongside their sale
+    created_at = Column(DateTime, default=func.now())
 
     sale = relationship("Sale", back_populates="items")
     product = relationship("Product", back_populates="sale_items")
 
+    __table_args__ = (
+        # Foreign keys aren't indexed automatically on PostgreSQL
+        Index("ix_sale_items_sale_id", "sale_id"),
+        Index("ix_sale_items_product_id", "product_id"),
+    )
+
+
+class SaleReturn(Base):
+    """One void or (partial) return against a sale; line detail is in stock_movements"""
+    __tablename__ = "sale_returns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    return_number = Column(String(100), unique=True, index=True)
+    kind = Column(String(20), default="return")  # "return" or "void"
+    reason = Column(Text, nullable=True)
+    refund_amount = Column(Float, default=0)
+    quantity = Column(Integer, default=0)
+    created_by = Column(String(100), default="system")
+    created_at = Column(DateTime, default=func.now())
+
+    sale = relationship("Sale", back_populates="returns")
+
+    __table_args__ = (
+        Index("ix_sale_returns_sale_id", "sale_id"),
+    )
+
+
+class IdempotencyKey(Base):
+    """
+    A client-supplied Idempotency-Key and the response it got, so a retried
+    checkout replays the original result instead of selling twice
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(100), nullable=False)
+    endpoint = Column(String(100), nullable=False)
+    # sha256 of the request body; the same key with a different body is refused
+    request_hash = Column(String(64), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        # Keys are scoped to the user so one till can't replay another's receipt
+        Index("ux_idempotency_keys_user_key", "user_id", "key", unique=True),
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+
+class UserSession(Base):
+    """Server-side session data (SESSION_STORE=database), keyed by a hash of the cookie's id"""
+    __tablename__ = "user_sessions"
+
+    id = Column(String(64), primary_key=True)
+    data = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        # Expiry sweeps
+        Index("ix_user_sessions_expires_at", "expires_at"),
+    )
+
+
+class StockReservation(Base):
+    """
+    Units held for an open cart, so two tills can't both sell the last one
+
+    available = stock_quantity - SUM(quantity) of unexpired rows. A hold
+    lapses at expires_at if the cart is abandoned; expired rows are ignored
+    and swept in the background.
+    """
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    # The cart holding the units (session cart id)
+    holder = Column(String(64), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ux_stock_reservations_holder_product", "holder", "product_id", unique=True),
+        # Covers the reserved-quantity sum per product without touching the table
+        Index("ix_stock_reservations_product_expires", "product_id", "expires_at", "quantity"),
+        Index("ix_stock_reservations_expires_at", "expires_at"),
+    )
+
 
 class StockMovement(Base):
     __tablename__ = "stock_movements"
@@ -106,6 +237,30 @@ class StockMovement(Base):
 
     product = relationship("Product")
 
+    __table_args__ = (
+        # Last movement per product in the inventory report
+        Index("ix_stock_movements_product_created", "product_id", "created_at"),
+    )
+
+
+def _archive_table(model, *indexes):
+    """
+    <table>_archive: the model's columns as plain values (no foreign keys,
+    defaults or unique constraints), plus when each row was archived
+    """
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+               for column in model.__table__.columns]
+    return Table(f"{model.__tablename__}_archive", Base.metadata, *columns,
+                 Column("archived_at", DateTime), *indexes)
+
+
+# Old sales and stock movements moved out of the hot tables by app.archive
+sales_archive = _archive_table(Sale, Index("ix_sales_archive_created_at", "created_at"))
+sale_items_archive = _archive_table(SaleItem, Index("ix_sale_items_archive_sale_id", "sale_id"))
+sale_returns_archive = _archive_table(SaleReturn, Index("ix_sale_returns_archive_sale_id", "sale_id"))
+stock_movements_archive = _archive_table(
+    StockMovement, Index("ix_stock_movements_archive_product_created", "product_id", "created_at"))
+
 
 class User(Base):
     __tablename__ = "users"
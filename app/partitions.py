@@ -0,0 +1,297 @@
+"""
+Monthly partitions for POS System
+On PostgreSQL, sales, sale_items and stock_movements are range-partitioned
+by created_at, one partition per month (sales_p202611, ...), so queries with
+a date range only read the months they ask for and old months can be
+emptied whole. On SQLite everything here is a no-op.
+
+Rows from before the conversion stay where they were, in <table>_legacy,
+attached as the DEFAULT partition. A CHECK constraint on it says it holds
+nothing from the conversion month on, which lets PostgreSQL add months
+without scanning it. The same CHECK means every month from then on must
+keep a partition of its own: a purged month is truncated rather than
+dropped, so a late offline sale dated in it still has somewhere to go.
+
+Each month gets the model's indexes and foreign keys. Indexes added to these
+tables later must be created per partition, since CREATE INDEX CONCURRENTLY
+doesn't work on a partitioned table.
+"""
+
+import os
+import re
+import time
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app import models
+
+
+PARTITIONED_TABLES = ('sales', 'sale_items', 'stock_movements')
+# Months created ahead of the current one, so a missed maintenance run never matters
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+# pg_advisory_xact_lock key so two workers never add the same month
+LOCK_KEY = 47102025
+# Adding or removing a partition briefly locks the parent; give up rather
+# than queue checkouts behind a long-running report, and try again later
+LOCK_TIMEOUT = '2s'
+SWAP_ATTEMPTS = 5
+
+_PARTITION_NAME = re.compile(r'^(\w+)_p(\d{4})(\d{2})$')
+
+
+def add_months(month, months):
+    """First day of the month `months` after the one `month` falls in"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(connection, table):
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {'table': table}).first() is not None
+
+
+def monthly_partitions(connection, table):
+    """{month: partition name} for a partitioned table, not counting the legacy one"""
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {'table': table})
+    found = {}
+    for (name,) in rows:
+        match = _PARTITION_NAME.match(name)
+        if match and match.group(1) == table:
+            found[date(int(match.group(2)), int(match.group(3)), 1)] = name
+    return found
+
+
+def partition_ddl(table_name, month):
+    """CREATE statements for one month: the partition with its keys, then its indexes"""
+    table = models.Base.metadata.tables[table_name]
+    name = partition_name(table_name, month)
+
+    constraints = ['PRIMARY KEY (id)']
+    for fk in sorted(table.foreign_keys, key=lambda fk: fk.parent.name):
+        # A partitioned table has no unique key on id alone to point at
+        if fk.column.table.name not in PARTITIONED_TABLES:
+            constraints.append(
+                f"FOREIGN KEY ({fk.parent.name}) REFERENCES {fk.column.table.name} ({fk.column.name})")
+
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} ({', '.join(constraints)}) "
+        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    ]
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        columns = [column.name for column in index.columns]
+        if columns == ['id']:
+            continue  # the primary key
+        statements.append(
+            f"CREATE {'UNIQUE ' if index.unique else ''}INDEX IF NOT EXISTS "
+            f"{name}_{'_'.join(columns)}_idx ON {name} ({', '.join(columns)})")
+    return statements
+
+
+def _locked(connection):
+    """Per-transaction settings for partition DDL"""
+    connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': LOCK_KEY})
+
+
+def _create_months(connection, table, months):
+    for month in months:
+        for statement in partition_ddl(table, month):
+            connection.execute(text(statement))
+        print(f"   ➕ partition {partition_name(table, month)}")
+
+
+def ensure_partitions(engine=None, months_ahead=None, today=None):
+    """
+    Create the months after each table's latest partition, up to
+    months_ahead past the current one (PARTITION_MONTHS_AHEAD by default)
+
+    A partition that can't get its lock in time is left for the next run.
+
+    Returns:
+        list: names of the partitions created
+    """
+    from app.database import engine as default_engine
+
+    engine = engine or default_engine
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    last = add_months(month_start(today or date.today()), months_ahead)
+    created = []
+
+    for table in PARTITIONED_TABLES:
+        with engine.connect() as connection:
+            if not is_partitioned(connection, table):
+                continue
+            existing = monthly_partitions(connection, table)
+        if not existing:
+            continue
+
+        month = add_months(max(existing), 1)
+        while month <= last:
+            try:
+                with engine.begin() as connection:
+                    _locked(connection)
+                    _create_months(connection, table, [month])
+            except DBAPIError as e:
+                print(f"⚠️ Couldn't add {partition_name(table, month)} yet: {e.orig}")
+                break
+            created.append(partition_name(table, month))
+            month = add_months(month, 1)
+
+    return created
+
+
+def _swap(engine, table, legacy, boundary, months_ahead):
+    """Rename the table to legacy and put a partitioned table with its name in front of it"""
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with engine.begin() as connection:
+                _locked(connection)
+                connection.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+
+                referencing = connection.execute(text(
+                    "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+                    "WHERE contype = 'f' AND confrelid = CAST(:table AS regclass)"
+                ), {'table': table}).all()
+                for name, owner in referencing:
+                    connection.execute(text(f'ALTER TABLE {owner} DROP CONSTRAINT "{name}"'))
+
+                sequence = connection.execute(text(
+                    "SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+
+                connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+                connection.execute(text(
+                    f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) "
+                    f"PARTITION BY RANGE (created_at)"))
+                connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {legacy} DEFAULT"))
+                if sequence:
+                    # Dropping the legacy partition some day mustn't take the id sequence with it
+                    connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+                _create_months(connection, table,
+                               [add_months(boundary, n) for n in range(months_ahead + 1)])
+            return
+        except DBAPIError as e:
+            if getattr(e.orig, 'pgcode', None) != '55P03' or attempt == SWAP_ATTEMPTS:
+                raise
+            print(f"   ⏳ {table} is busy, retrying the swap ({attempt}/{SWAP_ATTEMPTS})")
+            time.sleep(attempt)
+
+
+def convert_table(engine, table, boundary, months_ahead=None):
+    """
+    Turn a plain table into one partitioned by month, without copying rows
+
+    Its rows stay put: the table is renamed to <table>_legacy and attached
+    as the DEFAULT partition, and months from `boundary` on get their own
+    partitions. The CHECK that proves the legacy table holds nothing from
+    `boundary` on is validated first, outside the swap, so the only
+    exclusive lock is the brief one for the swap itself. Foreign keys that
+    point at the table are dropped, since a partitioned table can't be
+    referenced by id alone.
+
+    Safe to run again after a failure part-way through.
+    """
+    legacy = f"{table}_legacy"
+    check = f"{table}_legacy_range"
+    months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        if is_partitioned(connection, table):
+            return False
+
+        try:
+            # Re-added every run: one left by an earlier attempt may have an older boundary
+            connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+            connection.execute(text(
+                f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}, ADD CONSTRAINT {check} "
+                f"CHECK (created_at IS NULL OR created_at < '{boundary}') NOT VALID"))
+            # Scans the table, but without blocking reads or writes
+            connection.execute(text("SET lock_timeout = 0"))
+            connection.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}"))
+            _swap(engine, table, legacy, boundary, months_ahead)
+        except DBAPIError:
+            # Left behind, the CHECK would refuse next month's rows
+            connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}"))
+            raise
+
+    print(f"   ✔️  {table} partitioned by month from {boundary:%Y-%m}; older rows in {legacy}")
+    return True
+
+
+def truncate_partitions_before(engine, before):
+    """
+    Empty every monthly partition that ends on or before `before`, oldest
+    month first; a month that can't get its locks in time ends the run
+
+    Each month's partitions go in one transaction, children before sales,
+    so a failure leaves the whole month in place rather than sale items
+    and stock movements without their sale.
+
+    The partitions themselves stay. Rows for a month without one would
+    fall through to the legacy partition, whose CHECK refuses them.
+
+    Returns:
+        dict: rows removed per table
+    """
+    if engine.dialect.name != 'postgresql':
+        return {}
+
+    months = {}
+    with engine.connect() as connection:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(connection, table):
+                continue
+            for month, name in monthly_partitions(connection, table).items():
+                if datetime.combine(add_months(month, 1), datetime.min.time()) <= before:
+                    months.setdefault(month, {})[table] = name
+
+    removed = {}
+    for month in sorted(months):
+        partitions = months[month]
+        counts = {}
+        try:
+            with engine.begin() as connection:
+                _locked(connection)
+                for table in reversed(PARTITIONED_TABLES):
+                    name = partitions.get(table)
+                    if name is None:
+                        continue
+                    rows = connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                    if not rows:
+                        continue
+                    if table == 'sales':
+                        # Returns aren't partitioned; take the purged sales' returns with them
+                        counts['sale_returns'] = connection.execute(text(
+                            f"DELETE FROM sale_returns WHERE sale_id IN (SELECT id FROM {name})")).rowcount
+                    # Locks only this month, not the parent table
+                    connection.execute(text(f"TRUNCATE {name}"))
+                    counts[table] = rows
+        except DBAPIError as e:
+            # This month and later ones are left for the batched delete
+            print(f"⚠️ Couldn't truncate partitions for {month:%Y-%m} yet: {e.orig}")
+            break
+        for table, rows in counts.items():
+            removed[table] = removed.get(table, 0) + rows
+        if counts:
+            print(f"🗑️ Truncated partitions for {month:%Y-%m} ({sum(counts.values())} rows)")
+
+    return removed
@@ -0,0 +1,132 @@
+"""
+Response layer for POS System
+Fast JSON encoding (orjson or msgspec when installed) and gzip/brotli
+compression negotiated on Accept-Encoding
+"""
+
+import gzip
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this gain little and cost a compressor call
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Quality 5 is the usual sweet spot for dynamic content; 11 is for static assets
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain'
+}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify() through orjson or msgspec, falling back to the stdlib encoder
+
+    Output matches Flask's own apart from non-ASCII text going out as UTF-8
+    instead of \\u escapes: keys sorted, non-string keys stringified, and
+    anything the fast encoder doesn't handle natively (dates, Decimal,
+    __html__ objects) goes through Flask's default hook. With orjson,
+    dates keep Flask's HTTP-date format; msgspec writes them as ISO 8601.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.encoder = None
+        if orjson is not None:
+            self.encoder = 'orjson'
+            options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            self._encode = lambda obj: orjson.dumps(obj, default=self.default, option=options)
+        elif msgspec is not None:
+            self.encoder = 'msgspec'
+            self._encode = msgspec.json.Encoder(enc_hook=self.default, order='sorted').encode
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if self.encoder is None or pretty:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._encode(obj)
+        except (TypeError, ValueError, OverflowError):
+            # e.g. integers beyond 64 bits - the stdlib encoder copes
+            return super().response(*args, **kwargs)
+
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def choose_encoding(accept_encodings):
+    """Best supported Content-Encoding for an Accept-Encoding header, or None"""
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = accept_encodings.best_match(candidates)
+    if best and accept_encodings[best] > 0:
+        return best
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response):
+    """after_request hook: compress text bodies the client can decode"""
+    if (response.status_code < 200 or response.status_code in (204, 304) or
+            response.direct_passthrough or response.is_streamed or
+            'Content-Encoding' in response.headers or
+            response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag names exact bytes, which have just changed
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def init_app(app):
+    """Install the fast JSON provider and response compression on a Flask app"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+    print(f"📦 JSON encoder: {app.json.encoder or 'stdlib'}, "
+          f"compression: {'br, gzip' if brotli is not None else 'gzip'}")
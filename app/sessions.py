@@ -0,0 +1,353 @@
+"""
+Sessions for POS System
+A signing key every worker agrees on, and an optional server-side session
+store so any worker, on any instance, can serve any logged-in user.
+
+SECRET_KEY          signing key for sessions and API tokens; set it whenever
+                    more than one instance runs.
+                    Without it a key is generated once into the instance
+                    folder and shared by every worker on this machine.
+SESSION_STORE       "cookie" (default): session data lives in the signed cookie.
+                    "database": the cookie only carries a session id and the
+                    data lives in the user_sessions table of the app database.
+SESSION_LIFETIME_HOURS  how long an idle server-side session is kept (default 12)
+
+Either way, a request with "Authorization: Bearer <token>" (see
+app.auth.create_user_token) is identified by its token instead of a cookie.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask.sessions import (
+    SecureCookieSessionInterface, SessionInterface, SessionMixin, session_json_serializer
+)
+from itsdangerous import BadSignature, Signer
+
+from app.database import SessionLocal
+from app import auth, models
+
+
+DEFAULT_LIFETIME_HOURS = 12
+# Seconds between sweeps of expired rows, per worker
+SWEEP_INTERVAL = 600
+# An unchanged session is only written back once this much of its lifetime is used up
+TOUCH_FRACTION = 0.25
+
+
+def load_secret_key(instance_path):
+    """
+    SECRET_KEY from the environment, else one persisted in the instance folder
+
+    The file is created atomically (write, then hard-link into place), so
+    workers booting at the same time all end up reading the same key.
+    """
+    key = os.getenv('SECRET_KEY')
+    if key:
+        return key
+
+    path = os.getenv('SECRET_KEY_FILE') or os.path.join(instance_path, 'secret_key')
+    try:
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp, path)
+        print(f"🔑 Generated a session key in {path} - set SECRET_KEY when running more than one instance")
+    except FileExistsError:
+        pass  # another worker won the race; use its key
+    finally:
+        os.unlink(tmp)
+
+    with open(path) as f:
+        return f.read().strip()
+
+
+class TokenSession(dict, SessionMixin):
+    """
+    The identity carried by a bearer token, for one request
+
+    Holds the same keys a login puts in the session, so routes check it
+    the same way. It is never saved and no cookie is set; an invalid or
+    expired token gives an empty, unauthenticated session.
+    """
+
+    modified = False
+    accessed = False
+
+    @classmethod
+    def from_request(cls, request):
+        """A TokenSession if the request carries a bearer token, else None"""
+        token = auth.bearer_token(request.headers.get('Authorization'))
+        if token is None:
+            return None
+        user = auth.get_current_user(token)
+        if user is None:
+            return cls()
+        return cls(user_id=user.id, username=user.username, role=user.role, full_name=user.full_name)
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Flask's signed cookie sessions, plus bearer tokens"""
+
+    def open_session(self, app, request):
+        session = TokenSession.from_request(request)
+        if session is not None:
+            return session
+        return super().open_session(app, request)
+
+    def save_session(self, app, session, response):
+        if isinstance(session, TokenSession):
+            return
+        super().save_session(app, session, response)
+
+
+class ServerSession(SessionMixin):
+    """
+    Session data kept in the database, loaded on first access
+
+    Requests that never touch the session (static files, health checks,
+    token-authenticated API calls) cost no session query at all.
+    """
+
+    def __init__(self, interface, sid=None):
+        self.interface = interface
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.accessed = True
+            self._data, self.expires_at = (
+                self.interface.load(self.sid) if self.sid else ({}, None))
+            if self.sid and self.expires_at is None:
+                # Expired or unknown id: start over with a fresh one
+                self.sid, self.new = None, True
+        return self._data
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def regenerate(self):
+        """Empty the session and give it a new id, dropping the old row"""
+        if self.sid:
+            self.interface.delete(self.sid)
+        self._data, self.expires_at = {}, None
+        self.sid, self.new = None, True
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"<ServerSession {self._data if self.loaded else '(not loaded)'}>"
+
+
+class DatabaseSessionInterface(SessionInterface):
+    """
+    Session ids in a signed cookie, data in the user_sessions table
+
+    Only a hash of the id is stored, so a copy of the table can't be used to
+    hijack sessions. Unchanged sessions are not rewritten on every request;
+    their expiry slides forward once a quarter of the lifetime has passed.
+    """
+
+    salt = 'pos-session'
+    # Flask's tagged JSON, so values round-trip exactly as with cookie sessions
+    serializer = session_json_serializer
+
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    @staticmethod
+    def _key(sid):
+        return hashlib.sha256(sid.encode()).hexdigest()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        session = TokenSession.from_request(request)
+        if session is not None:
+            return session
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        sid = None
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+        return ServerSession(self, sid)
+
+    def load(self, sid):
+        """(data, expires_at) for a live session id, else ({}, None)"""
+        db = SessionLocal()
+        try:
+            row = db.query(models.UserSession.data, models.UserSession.expires_at).filter(
+                models.UserSession.id == self._key(sid),
+                models.UserSession.expires_at > datetime.now()
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return {}, None
+        try:
+            return self.serializer.loads(row.data), row.expires_at
+        except ValueError:
+            return {}, None
+
+    def save_session(self, app, session, response):
+        if isinstance(session, TokenSession) or not session.loaded:
+            return
+
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        name = self.get_cookie_name(app)
+
+        if not session:
+            if session.sid:
+                self.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        response.vary.add('Cookie')
+
+        now = datetime.now()
+        stale = session.expires_at is None or \
+            session.expires_at - now < self.lifetime * (1 - TOUCH_FRACTION)
+        if not (session.new or session.modified or stale):
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store(session.sid, self.serializer.dumps(dict(session)), now + self.lifetime)
+        self.maybe_sweep()
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def store(self, sid, data, expires_at):
+        db = SessionLocal()
+        try:
+            key = self._key(sid)
+            updated = db.query(models.UserSession).filter(models.UserSession.id == key).update(
+                {'data': data, 'expires_at': expires_at, 'updated_at': datetime.now()},
+                synchronize_session=False
+            )
+            if not updated:
+                db.add(models.UserSession(id=key, data=data, expires_at=expires_at,
+                                          updated_at=datetime.now()))
+            db.commit()
+        finally:
+            db.close()
+
+    def delete(self, sid):
+        db = SessionLocal()
+        try:
+            db.query(models.UserSession).filter(
+                models.UserSession.id == self._key(sid)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def maybe_sweep(self):
+        """Delete expired sessions, at most once per SWEEP_INTERVAL in this worker"""
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            sweep()
+        finally:
+            self._sweep_lock.release()
+
+
+def sweep():
+    """Delete expired server-side sessions; returns how many went"""
+    db = SessionLocal()
+    try:
+        removed = db.query(models.UserSession).filter(
+            models.UserSession.expires_at <= datetime.now()
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if removed:
+        print(f"🧹 Removed {removed} expired session(s)")
+    return removed
+
+
+def regenerate(session):
+    """
+    Start a fresh session before putting a user's identity into it
+
+    With server-side sessions the id changes too, so an id planted in the
+    browser before login (session fixation) is worthless afterwards.
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+    else:
+        session.clear()
+
+
+def init_app(app):
+    """Stable secret key (for sessions and API tokens) and, with SESSION_STORE=database, server-side sessions"""
+    app.secret_key = load_secret_key(app.instance_path)
+    auth.set_secret_key(app.secret_key)
+
+    store = os.getenv('SESSION_STORE', 'cookie').lower()
+    if store == 'database':
+        hours = float(os.getenv('SESSION_LIFETIME_HOURS', DEFAULT_LIFETIME_HOURS))
+        app.session_interface = DatabaseSessionInterface(timedelta(hours=hours))
+    elif store == 'cookie':
+        app.session_interface = CookieSessionInterface()
+    else:
+        raise ValueError(f"SESSION_STORE must be 'cookie' or 'database', not {store!r}")
+    print(f"🔑 Sessions: {store}")
@@ -0,0 +1,136 @@
+"""
+Transaction retries for POS System
+Runs a unit of work in one transaction and replays it when the database
+aborts it for a lock conflict, so a deadlock or a busy SQLite file doesn't
+cost a customer their checkout
+"""
+
+import os
+import random
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError
+
+from app.database import SessionLocal
+
+
+# Attempts per transaction, including the first
+RETRY_ATTEMPTS = int(os.getenv('DB_RETRY_ATTEMPTS', 4))
+# Full-jitter exponential backoff: sleep up to BASE * 2^(retry - 1), capped
+RETRY_BASE_DELAY = 0.025
+RETRY_MAX_DELAY = 0.5
+# Retry budget per worker: every transaction earns RATIO of a retry, up to
+# BURST saved, so a lock storm can't multiply the load it is already under
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_BURST = 10
+
+# PostgreSQL SQLSTATEs that mean "nothing wrong with the transaction, run it again"
+RETRYABLE_SQLSTATES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+}
+RETRYABLE_MESSAGES = ('database is locked', 'database table is locked', 'deadlock detected')
+
+_stats = {}
+_lock = threading.Lock()
+_budget = float(RETRY_BUDGET_BURST)
+
+
+def is_retryable(error):
+    """True for errors where replaying the same transaction can succeed"""
+    if not isinstance(error, DBAPIError) or error.connection_invalidated:
+        return False
+    orig = error.orig
+    if getattr(orig, 'pgcode', None) in RETRYABLE_SQLSTATES:
+        return True
+    message = str(orig).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+
+def _record(name, **counts):
+    with _lock:
+        stats = _stats.setdefault(name, {
+            'calls': 0, 'retries': 0, 'retried_calls': 0, 'failed': 0, 'budget_exhausted': 0
+        })
+        for key, value in counts.items():
+            stats[key] += value
+
+
+def _earn_budget():
+    global _budget
+    with _lock:
+        _budget = min(float(RETRY_BUDGET_BURST), _budget + RETRY_BUDGET_RATIO)
+
+
+def _spend_budget():
+    global _budget
+    with _lock:
+        if _budget < 1:
+            return False
+        _budget -= 1
+        return True
+
+
+def backoff_delay(retry):
+    """Seconds to wait before the given retry (1 for the first)"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (retry - 1)))
+
+
+def run_in_transaction(work, name, db=None, attempts=None):
+    """
+    Call work(db) and commit; on a deadlock, serialization failure or locked
+    database, roll back and call it again after a jittered pause
+
+    work is replayed from the start, so it must do all its database reads
+    and writes through db and leave anything else (session cart, logging,
+    responses) to the caller once this returns. It may commit itself, but
+    only as its last step. Without db a session is opened and closed here;
+    a caller's session must have no other pending work, since a retry
+    rolls it back.
+
+    Returns:
+        whatever work returned, after a successful commit
+    """
+    attempts = attempts or RETRY_ATTEMPTS
+    own_session = db is None
+    _earn_budget()
+    _record(name, calls=1)
+
+    for attempt in range(1, attempts + 1):
+        if own_session:
+            db = SessionLocal()
+        try:
+            result = work(db)
+            db.commit()
+            if attempt > 1:
+                _record(name, retried_calls=1)
+            return result
+        except DBAPIError as e:
+            db.rollback()
+            if not is_retryable(e) or attempt == attempts:
+                _record(name, failed=1)
+                raise
+            if not _spend_budget():
+                _record(name, failed=1, budget_exhausted=1)
+                raise
+            _record(name, retries=1)
+            delay = backoff_delay(attempt)
+            print(f"🔁 {name}: {type(e.orig).__name__} on attempt {attempt}, retrying in {delay * 1000:.0f}ms")
+            time.sleep(delay)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+
+def get_stats():
+    """Retry counts per unit of work for this worker, and the budget left"""
+    with _lock:
+        stats = {name: dict(counts) for name, counts in _stats.items()}
+        budget = round(_budget, 2)
+    for counts in stats.values():
+        counts['retry_rate'] = round(counts['retries'] / counts['calls'], 4) if counts['calls'] else 0.0
+    return {'units': stats, 'retry_budget': budget}
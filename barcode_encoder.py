@@ -0,0 +1,242 @@
+"""
+Native Barcode Encoder for POS System
+Encodes Code128, EAN-13 and EAN-8 straight to module bit patterns and
+renders them as compact SVG or 1-bit PNG without python-barcode or PIL
+"""
+
+import struct
+import zlib
+
+
+# Code128 symbol widths (bar, space, bar, space, bar, space) for values 0-106
+CODE128_WIDTHS = [
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112'
+]
+
+CODE128_START_B = 104
+CODE128_START_C = 105
+CODE128_CODE_B = 100
+CODE128_CODE_C = 99
+CODE128_STOP = 106
+
+# EAN digit patterns (left odd parity, left even parity, right)
+EAN_L = ['0001101', '0011001', '0010011', '0111101', '0100011', '0110001', '0101111', '0111011', '0110111', '0001011']
+EAN_G = ['0100111', '0110011', '0011011', '0100001', '0011101', '0111001', '0000101', '0010001', '0001001', '0010111']
+EAN_R = ['1110010', '1100110', '1101100', '1000010', '1011100', '1001110', '1010000', '1000100', '1001000', '1110100']
+
+# Parity of the left-hand digits of EAN-13, selected by the first digit
+EAN13_PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL']
+
+EAN_GUARD = '101'
+EAN_CENTER = '01010'
+
+# Quiet zone on each side, in modules
+QUIET_ZONE = {'code128': 10, 'ean13': 9, 'ean8': 7}
+
+
+def _widths_to_bits(widths):
+    bits = []
+    for index, width in enumerate(widths):
+        bits.append(('1' if index % 2 == 0 else '0') * int(width))
+    return ''.join(bits)
+
+
+CODE128_BITS = [_widths_to_bits(widths) for widths in CODE128_WIDTHS]
+
+
+def ean_checksum(digits):
+    """EAN check digit: weights 3 and 1 alternate from the rightmost data digit"""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def encode_ean13(data):
+    """
+    Encode EAN-13 from 12 digits (extra digits are dropped, short input is zero padded)
+
+    Returns:
+        tuple: (full 13-digit code, module bit string)
+    """
+    if not data.isdigit():
+        raise ValueError("EAN-13 requires numeric data")
+
+    digits = data[:12].ljust(12, '0')
+    code = digits + ean_checksum(digits)
+    parity = EAN13_PARITY[int(code[0])]
+
+    left = ''.join((EAN_L if p == 'L' else EAN_G)[int(d)] for p, d in zip(parity, code[1:7]))
+    right = ''.join(EAN_R[int(d)] for d in code[7:])
+    return code, EAN_GUARD + left + EAN_CENTER + right + EAN_GUARD
+
+
+def encode_ean8(data):
+    """
+    Encode EAN-8 from 7 digits (extra digits are dropped, short input is zero padded)
+
+    Returns:
+        tuple: (full 8-digit code, module bit string)
+    """
+    if not data.isdigit():
+        raise ValueError("EAN-8 requires numeric data")
+
+    digits = data[:7].ljust(7, '0')
+    code = digits + ean_checksum(digits)
+
+    left = ''.join(EAN_L[int(d)] for d in code[:4])
+    right = ''.join(EAN_R[int(d)] for d in code[4:])
+    return code, EAN_GUARD + left + EAN_CENTER + right + EAN_GUARD
+
+
+def _digit_run(data, start):
+    end = start
+    while end < len(data) and data[end].isdigit():
+        end += 1
+    return end - start
+
+
+def encode_code128(data):
+    """
+    Encode Code128 using code set B, switching to code set C for runs of digits
+
+    Returns:
+        tuple: (data, module bit string)
+    """
+    if not data:
+        raise ValueError("Code128 requires data")
+    for char in data:
+        if not 32 <= ord(char) <= 126:
+            raise ValueError(f"Code128 cannot encode character {char!r}")
+
+    # Start in C when the data opens with 4+ digits, or is just a digit pair
+    run = _digit_run(data, 0)
+    code_set = 'C' if run >= 4 or run == len(data) == 2 else 'B'
+    values = [CODE128_START_C if code_set == 'C' else CODE128_START_B]
+
+    position = 0
+    while position < len(data):
+        if code_set == 'C':
+            if _digit_run(data, position) >= 2:
+                values.append(int(data[position:position + 2]))
+                position += 2
+                continue
+            values.append(CODE128_CODE_B)
+            code_set = 'B'
+
+        run = _digit_run(data, position)
+        at_end = position + run == len(data)
+        # Switching costs one symbol, so it only pays for 4+ digits at the end or 6+ in the middle
+        if run >= (4 if at_end else 6):
+            if run % 2 == 1:
+                values.append(ord(data[position]) - 32)
+                position += 1
+            values.append(CODE128_CODE_C)
+            code_set = 'C'
+            continue
+
+        values.append(ord(data[position]) - 32)
+        position += 1
+
+    checksum = values[0] + sum(value * weight for weight, value in enumerate(values[1:], start=1))
+    values.append(checksum % 103)
+    values.append(CODE128_STOP)
+
+    return data, ''.join(CODE128_BITS[value] for value in values)
+
+
+ENCODERS = {
+    'code128': encode_code128,
+    'ean13': encode_ean13,
+    'ean8': encode_ean8
+}
+
+
+def encode(data, barcode_type='code128'):
+    """Encode data as (human readable text, module bit string)"""
+    encoder = ENCODERS.get(barcode_type)
+    if encoder is None:
+        raise ValueError(f"Unsupported barcode type: {barcode_type}")
+    return encoder(data)
+
+
+def _bar_runs(bits):
+    """Yield (start, width) of every bar in a module bit string"""
+    start = None
+    for index, bit in enumerate(bits):
+        if bit == '1' and start is None:
+            start = index
+        elif bit == '0' and start is not None:
+            yield start, index - start
+            start = None
+    if start is not None:
+        yield start, len(bits) - start
+
+
+def render_svg(bits, text=None, barcode_type='code128', module_width=2, height=60, font_size=12):
+    """
+    Render a bit pattern as SVG with a single path for all bars
+
+    Returns:
+        bytes: SVG document
+    """
+    quiet = QUIET_ZONE.get(barcode_type, 10)
+    width = (len(bits) + 2 * quiet) * module_width
+    total_height = height + (font_size + 4 if text else 0)
+
+    path = ''.join(
+        f"M{(quiet + start) * module_width} 0h{run * module_width}v{height}h-{run * module_width}z"
+        for start, run in _bar_runs(bits)
+    )
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{total_height}" '
+        f'viewBox="0 0 {width} {total_height}">',
+        f'<rect width="100%" height="100%" fill="#fff"/>',
+        f'<path d="{path}" fill="#000"/>'
+    ]
+    if text:
+        escaped = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        parts.append(
+            f'<text x="{width / 2}" y="{total_height - 2}" font-family="monospace" '
+            f'font-size="{font_size}" text-anchor="middle">{escaped}</text>'
+        )
+    parts.append('</svg>')
+    return ''.join(parts).encode('utf-8')
+
+
+def _png_chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def render_png(bits, barcode_type='code128', module_width=2, height=60):
+    """
+    Render a bit pattern as a 1-bit grayscale PNG (bars only, no text)
+
+    Every scanline of a barcode is identical, so one packed row is built
+    and repeated for the full height.
+
+    Returns:
+        bytes: PNG image
+    """
+    quiet = '0' * QUIET_ZONE.get(barcode_type, 10)
+    modules = quiet + bits + quiet
+    # PNG grayscale 1-bit: 0 is black, so bars become 0 bits
+    pixels = ''.join(('0' if bit == '1' else '1') * module_width for bit in modules)
+    width = len(pixels)
+    pixels += '1' * (-width % 8)
+    row = b'\x00' + int(pixels, 2).to_bytes(len(pixels) // 8, 'big')
+
+    header = struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' +
+            _png_chunk(b'IHDR', header) +
+            _png_chunk(b'IDAT', zlib.compress(row * height, 9)) +
+            _png_chunk(b'IEND', b''))
@@ -4,11 +4,75 @@ Handles barcode generation, storage, and management
 """
 
 import os
-import barcode
-from barcode.writer import ImageWriter
-from PIL import Image
 import io
 import sys
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+import barcode_encoder
+
+
+# Bump when rendering options change so cached images (and ETags) are refreshed
+RENDER_VERSION = 2
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+# Symbologies the /barcodes endpoint will render (the built-in encoders)
+BARCODE_TYPES = tuple(barcode_encoder.ENCODERS)
+
+
+class BarcodeImageCache:
+    """Thread-safe LRU of rendered barcode images, bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries=2048, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._bytes += len(data)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
 
 
 class BarcodeGenerator:
@@ -22,8 +86,14 @@ class BarcodeGenerator:
         # Get the absolute path to the app directory
         app_dir = os.path.dirname(os.path.abspath(__file__))
         self.barcodes_dir = os.path.join(app_dir, barcodes_dir)
+        self.image_cache = BarcodeImageCache()
         self.ensure_directory()
 
+    @staticmethod
+    def clean_barcode(barcode_data):
+        """Barcode data reduced to the alphanumerics used in image filenames"""
+        return ''.join(c for c in str(barcode_data) if c.isalnum())
+
     def ensure_directory(self):
         """Create barcodes directory if it doesn't exist"""
         if not os.path.exists(self.barcodes_dir):
@@ -45,6 +115,10 @@ class BarcodeGenerator:
             str: Path to the generated barcode image
         """
         try:
+            # python-barcode and PIL are only needed for files written to disk
+            import barcode
+            from barcode.writer import ImageWriter
+
             # Validate barcode data
             if not barcode_data or not isinstance(barcode_data, str):
                 raise ValueError("Invalid barcode data")
@@ -74,7 +148,7 @@ class BarcodeGenerator:
             barcode_instance = barcode_class(barcode_data, writer=ImageWriter())
 
             # Clean barcode data for filename
-            clean_barcode = ''.join(c for c in barcode_data if c.isalnum())
+            clean_barcode = self.clean_barcode(barcode_data)
             if not clean_barcode:
                 clean_barcode = 'barcode'
 
@@ -157,18 +231,8 @@ class BarcodeGenerator:
             str: Path to barcode image or None
         """
         try:
-            # Use existing barcode if available
-            if product.barcode:
-                barcode_data = str(product.barcode)
-                print(f"Using existing barcode: {barcode_data}")
-            else:
-                # Generate from SKU or product ID
-                if product.sku:
-                    barcode_data = product.sku.replace('-', '').replace('_', '')
-                else:
-                    barcode_data = str(product.id).zfill(8)
-
-                print(f"Generated barcode from product: {barcode_data}")
+            # Use existing barcode if available, else derive from SKU or product ID
+            barcode_data = self.barcode_value_for(product.barcode, product.sku, product.id)
 
             # Ensure barcode is valid
             if not barcode_data or len(barcode_data) < 1:
@@ -176,14 +240,12 @@ class BarcodeGenerator:
                 return None
 
             # Choose barcode type based on content
-            if barcode_data.isdigit() and len(barcode_data) >= 12:
-                # Use EAN-13 for long numeric barcodes
+            barcode_type = self.choose_barcode_type(barcode_data)
+            if barcode_type == 'ean13':
                 return self.generate_ean13(barcode_data)
-            elif barcode_data.isdigit() and 8 <= len(barcode_data) < 12:
-                # Use EAN-8 for shorter numeric barcodes
+            elif barcode_type == 'ean8':
                 return self.generate_barcode_image(barcode_data, 'ean8')
             else:
-                # Use Code128 for alphanumeric or shorter codes
                 return self.generate_code128(barcode_data)
 
         except Exception as e:
@@ -192,12 +254,46 @@ class BarcodeGenerator:
             traceback.print_exc()
             return None
 
-    def get_barcode_url(self, product):
+    @staticmethod
+    def choose_barcode_type(barcode_data):
+        """Pick EAN-13, EAN-8 or Code128 based on the barcode content"""
+        if barcode_data.isdigit() and len(barcode_data) >= 12:
+            # Use EAN-13 for long numeric barcodes
+            return 'ean13'
+        elif barcode_data.isdigit() and 8 <= len(barcode_data) < 12:
+            # Use EAN-8 for shorter numeric barcodes
+            return 'ean8'
+        # Use Code128 for alphanumeric or shorter codes
+        return 'code128'
+
+    @classmethod
+    def image_barcode_for(cls, barcode_data):
+        """Cleaned barcode that generate_barcode_for_product names this data's image after"""
+        barcode_data = str(barcode_data)
+        if cls.choose_barcode_type(barcode_data) == 'ean13':
+            # generate_ean13 saves under the first 12 digits (checksum left off)
+            barcode_data = barcode_data[:12]
+        return cls.clean_barcode(barcode_data) or 'barcode'
+
+    @staticmethod
+    def barcode_value_for(barcode_value, sku=None, product_id=None):
+        """Barcode data for a product: its barcode, else its SKU, else its zero-padded ID"""
+        if barcode_value:
+            return str(barcode_value)
+        if sku:
+            return sku.replace('-', '').replace('_', '')
+        return str(product_id).zfill(8)
+
+    def get_barcode_url(self, product, image_format='png'):
         """
         Get barcode image URL for a product
 
+        The image is rendered on demand by the /barcodes endpoint, so no
+        file has to exist on disk.
+
         Args:
             product: Product object
+            image_format (str): 'png' or 'svg'
 
         Returns:
             str: URL to barcode image or None
@@ -205,34 +301,96 @@ class BarcodeGenerator:
         if not product or not product.barcode:
             return None
 
-        try:
-            # Check if barcode image exists
-            barcode_data = str(product.barcode)
-            clean_barcode = ''.join(c for c in barcode_data if c.isalnum())
+        return f"/barcodes/{quote(str(product.barcode), safe='')}.{image_format}"
 
-            # Check for existing barcode files
-            barcode_types = ['code128', 'ean13', 'ean8', 'upc']
-            for barcode_type in barcode_types:
-                filename = f"{clean_barcode}_{barcode_type}.png"
-                filepath = os.path.join(self.barcodes_dir, filename)
+    def barcode_etag(self, barcode_data, barcode_type, image_format):
+        """Stable ETag for a rendered barcode - the image depends only on these inputs"""
+        key = f"{RENDER_VERSION}:{barcode_type}:{image_format}:{barcode_data}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
-                if os.path.exists(filepath):
-                    # Convert to URL path (relative to static)
-                    relative_path = os.path.relpath(filepath, os.path.dirname(self.barcodes_dir))
-                    return f"/{relative_path.replace(os.sep, '/')}"
+    def render_barcode(self, barcode_data, barcode_type=None, image_format='png', options=None):
+        """
+        Render a barcode image in memory, using the LRU cache
 
-            # Generate barcode if it doesn't exist
-            barcode_path = self.generate_barcode_for_product(product)
-            if barcode_path:
-                # Convert to URL path
-                relative_path = os.path.relpath(barcode_path, os.path.dirname(self.barcodes_dir))
-                return f"/{relative_path.replace(os.sep, '/')}"
+        Args:
+            barcode_data (str): The data to encode
+            barcode_type (str): Barcode type, chosen from the data if None
+            image_format (str): 'png' or 'svg'
+            options (dict): python-barcode writer options; when given, the
+                python-barcode writer is used instead of the built-in encoder
 
-            return None
+        Returns:
+            bytes: Rendered image
+        """
+        if not barcode_data or not isinstance(barcode_data, str):
+            raise ValueError("Invalid barcode data")
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
 
-        except Exception as e:
-            print(f"Error getting barcode URL: {e}")
-            return None
+        barcode_type = barcode_type or self.choose_barcode_type(barcode_data)
+        key = (barcode_data, barcode_type, image_format, tuple(sorted((options or {}).items())))
+
+        data = self.image_cache.get(key)
+        if data is not None:
+            return data
+
+        if options is None and barcode_type in barcode_encoder.ENCODERS:
+            data = self._render_native(barcode_data, barcode_type, image_format)
+        else:
+            data = self._render_with_writer(barcode_data, barcode_type, image_format, options)
+
+        self.image_cache.put(key, data)
+        return data
+
+    def _render_native(self, barcode_data, barcode_type, image_format):
+        """Render Code128/EAN-13/EAN-8 with the built-in encoder (no PIL)"""
+        try:
+            text, bits = barcode_encoder.encode(barcode_data, barcode_type)
+        except ValueError:
+            # Data not valid for the requested symbology - fall back to Code128
+            barcode_type = 'code128'
+            text, bits = barcode_encoder.encode(barcode_data, barcode_type)
+
+        if image_format == 'svg':
+            return barcode_encoder.render_svg(bits, text, barcode_type)
+        return barcode_encoder.render_png(bits, barcode_type)
+
+    def _render_with_writer(self, barcode_data, barcode_type, image_format, options):
+        """Render through python-barcode's writers, for other symbologies or custom options"""
+        import barcode
+        from barcode.writer import ImageWriter, SVGWriter
+
+        if barcode_type == 'ean13' and barcode_data.isdigit():
+            # Same normalisation as generate_ean13: 12 digits, checksum added
+            encoded = barcode_data[:12].ljust(12, '0')
+        else:
+            encoded = barcode_data
+
+        writer = ImageWriter() if image_format == 'png' else SVGWriter()
+        writer_options = {
+            'module_width': 0.2,
+            'module_height': 15.0,
+            'quiet_zone': 6.5,
+            'font_size': 10,
+            'text_distance': 5.0,
+            'background': 'white',
+            'foreground': 'black',
+            'write_text': True
+        }
+        if image_format == 'png':
+            writer_options['format'] = 'PNG'
+        writer_options.update(options or {})
+
+        try:
+            barcode_class = barcode.get_barcode_class(barcode_type)
+            barcode_instance = barcode_class(encoded, writer=writer)
+        except (barcode.errors.BarcodeError, ValueError):
+            # Data not valid for the requested symbology - fall back to Code128
+            barcode_instance = barcode.get_barcode_class('code128')(barcode_data, writer=writer)
+
+        buffer = io.BytesIO()
+        barcode_instance.write(buffer, writer_options)
+        return buffer.getvalue()
 
     def delete_barcode_image(self, barcode_data):
         """
@@ -246,7 +404,7 @@ class BarcodeGenerator:
                 return
 
             # Clean barcode for filename
-            clean_barcode = ''.join(c for c in str(barcode_data) if c.isalnum())
+            clean_barcode = self.clean_barcode(barcode_data)
             if not clean_barcode:
                 return
 
@@ -287,33 +445,94 @@ class BarcodeGenerator:
             print(f"Error listing barcode files: {e}")
             return []
 
+    def build_file_index(self):
+        """
+        Scan the barcode directory for generated images
+
+        Returns:
+            dict: (clean barcode, barcode type) -> (path, size in bytes)
+        """
+        index = {}
+        with os.scandir(self.barcodes_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.png') or not entry.is_file():
+                    continue
+                # Filenames are <clean barcode>_<type>.png and the clean
+                # barcode is alphanumeric, so the last underscore splits them
+                clean_barcode, _, barcode_type = entry.name[:-4].rpartition('_')
+                if clean_barcode:
+                    index[(clean_barcode, barcode_type)] = (entry.path, entry.stat().st_size)
+        return index
+
+    def remove_orphaned_images(self, valid_barcodes, batch_size=200, pause=0.05):
+        """
+        Delete images whose cleaned barcode no longer belongs to any product
+
+        Other workers may have written images at any time, so the directory
+        is scanned on every run; deletes then run in batches with a short
+        pause so a large cleanup doesn't monopolise the disk.
+
+        Args:
+            valid_barcodes (iterable): Barcode values of existing products
+            batch_size (int): Files deleted per batch
+            pause (float): Seconds to sleep between batches
+
+        Returns:
+            dict: Report with scanned, deleted, reclaimed_bytes and errors
+        """
+        started = time.perf_counter()
+        valid = set()
+        for b in valid_barcodes:
+            if b:
+                valid.add(self.clean_barcode(b))
+                valid.add(self.image_barcode_for(b))
+        index = self.build_file_index()
+
+        orphans = [(key, path, size) for key, (path, size) in index.items() if key[0] not in valid]
+        deleted = 0
+        reclaimed = 0
+        errors = 0
+
+        for start in range(0, len(orphans), batch_size):
+            batch = orphans[start:start + batch_size]
+            for key, path, size in batch:
+                try:
+                    os.remove(path)
+                    deleted += 1
+                    reclaimed += size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    errors += 1
+                    print(f"Error deleting orphaned barcode {path}: {e}")
+
+            if pause and start + batch_size < len(orphans):
+                time.sleep(pause)
+
+        return {
+            'scanned': len(index),
+            'orphaned': len(orphans),
+            'deleted': deleted,
+            'reclaimed_bytes': reclaimed,
+            'errors': errors,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
     def cleanup_orphaned_barcodes(self, valid_barcodes):
         """
         Delete barcode images that don't correspond to existing products
 
         Args:
             valid_barcodes (list): List of valid barcode strings
+
+        Returns:
+            int: Number of files deleted
         """
         try:
-            valid_barcodes = set(str(b) for b in valid_barcodes)
-            barcode_files = self.list_barcode_files()
-            deleted_count = 0
-
-            for barcode_file in barcode_files:
-                filename = barcode_file['filename']
-                # Extract barcode from filename (format: barcode_type.png)
-                barcode_from_file = filename.split('_')[0]
-
-                if barcode_from_file not in valid_barcodes:
-                    try:
-                        os.remove(barcode_file['path'])
-                        deleted_count += 1
-                        print(f"Deleted orphaned barcode: {filename}")
-                    except Exception as e:
-                        print(f"Error deleting orphaned barcode {filename}: {e}")
-
-            print(f"Cleanup complete: Deleted {deleted_count} orphaned barcode files")
-            return deleted_count
+            report = self.remove_orphaned_images(valid_barcodes)
+            print(f"Cleanup complete: Deleted {report['deleted']} orphaned barcode files "
+                  f"({report['reclaimed_bytes']} bytes)")
+            return report['deleted']
 
         except Exception as e:
             print(f"Error in barcode cleanup: {e}")
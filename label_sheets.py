@@ -0,0 +1,219 @@
+"""
+Label Sheets for POS System
+Renders shelf labels (name, price, barcode) across a process pool and
+lays them out on printable PDF/PNG pages
+"""
+
+import io
+import os
+import math
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageDraw, ImageFont
+
+import barcode_encoder
+from app.helpers import format_naira
+from barcode_utils import BarcodeGenerator
+
+
+# A4 at 200 DPI, 3 x 8 labels per page
+LABEL_LAYOUT = {
+    'dpi': 200,
+    'page_width': 1654,
+    'page_height': 2339,
+    'columns': 3,
+    'rows': 8,
+    'margin': 50,
+    'gutter': 16,
+    'padding': 10
+}
+
+# Upper bound per request - a delivery rarely needs more
+MAX_LABELS = 2000
+
+# Below this many labels, starting the pool costs more than it saves
+POOL_THRESHOLD = 24
+LABEL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+FONT_CANDIDATES = [
+    'DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'arial.ttf'
+]
+
+_executor = None
+_fonts = {}
+
+
+def _get_font(size):
+    """Load a scalable font once per process"""
+    font = _fonts.get(size)
+    if font is not None:
+        return font
+
+    for candidate in FONT_CANDIDATES:
+        try:
+            font = ImageFont.truetype(candidate, size)
+            break
+        except OSError:
+            continue
+    else:
+        try:
+            font = ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow < 10.1 only has the fixed-size bitmap font
+            font = ImageFont.load_default()
+
+    _fonts[size] = font
+    return font
+
+
+def _fit_text(draw, text, font, max_width):
+    """Trim text until it fits the label width"""
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + '...', font=font) > max_width:
+        text = text[:-1]
+    return text + '...'
+
+
+def render_label(job):
+    """
+    Render one label cell (runs in a worker process)
+
+    Args:
+        job (tuple): (name, price_text, barcode_value, width, height)
+
+    Returns:
+        tuple: (width, height, 1-bit image bytes)
+    """
+    name, price_text, barcode_value, width, height = job
+    padding = LABEL_LAYOUT['padding']
+
+    label = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(label)
+    draw.rectangle((0, 0, width - 1, height - 1), outline=190)
+
+    name_font = _get_font(max(12, height // 10))
+    price_font = _get_font(max(14, height // 7))
+
+    draw.text((padding, padding), _fit_text(draw, name, name_font, width - 2 * padding),
+              font=name_font, fill=0)
+    top = padding + draw.textbbox((0, 0), 'Ag', font=name_font)[3] + 4
+    draw.text((padding, top), price_text, font=price_font, fill=0)
+    top += draw.textbbox((0, 0), price_text, font=price_font)[3] + 6
+
+    # Bars come straight from the native encoder at two pixels per module,
+    # which keeps them crisp at the sheet resolution
+    barcode_type = BarcodeGenerator.choose_barcode_type(barcode_value)
+    try:
+        text, bits = barcode_encoder.encode(barcode_value, barcode_type)
+    except ValueError:
+        barcode_type = 'code128'
+        text, bits = barcode_encoder.encode(barcode_value, barcode_type)
+
+    text_font = _get_font(max(10, height // 14))
+    text_height = draw.textbbox((0, 0), text, font=text_font)[3]
+    bar_height = max(20, height - top - padding - text_height - 4)
+    bars = barcode_encoder.render_png(bits, barcode_type, module_width=2, height=bar_height)
+
+    with Image.open(io.BytesIO(bars)) as barcode_image:
+        barcode_image = barcode_image.convert('L')
+        box_width = width - 2 * padding
+        if barcode_image.width > box_width:
+            barcode_image = barcode_image.resize((box_width, barcode_image.height), Image.NEAREST)
+        left = (width - barcode_image.width) // 2
+        label.paste(barcode_image, (left, top))
+
+    text_width = draw.textlength(text, font=text_font)
+    draw.text(((width - text_width) / 2, top + bar_height + 2), text, font=text_font, fill=0)
+
+    label = label.point(lambda v: 0 if v < 160 else 255, '1')
+    return width, height, label.tobytes()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=LABEL_WORKERS)
+    return _executor
+
+
+def render_labels(jobs):
+    """Yield rendered label cells in order, in parallel when there are enough of them"""
+    global _executor
+
+    if len(jobs) < POOL_THRESHOLD:
+        yield from map(render_label, jobs)
+        return
+
+    done = 0
+    try:
+        chunksize = max(1, len(jobs) // (LABEL_WORKERS * 4))
+        for result in _get_executor().map(render_label, jobs, chunksize=chunksize):
+            yield result
+            done += 1
+    except (BrokenProcessPool, OSError) as e:
+        # A dead worker shouldn't fail the print job - finish the rest here
+        print(f"Label pool unavailable, rendering inline: {e}")
+        _executor = None
+        yield from map(render_label, jobs[done:])
+
+
+def build_label_sheet(labels, image_format='pdf', page=1):
+    """
+    Lay labels out on A4 pages
+
+    Args:
+        labels (list): Dicts with name, price and barcode_value, one per printed label
+        image_format (str): 'pdf' (all pages) or 'png' (the requested page)
+        page (int): Page to return for PNG output
+
+    Returns:
+        tuple: (file object positioned at 0, total page count)
+    """
+    layout = LABEL_LAYOUT
+    columns, rows = layout['columns'], layout['rows']
+    per_page = columns * rows
+    cell_width = (layout['page_width'] - 2 * layout['margin'] - (columns - 1) * layout['gutter']) // columns
+    cell_height = (layout['page_height'] - 2 * layout['margin'] - (rows - 1) * layout['gutter']) // rows
+
+    total_pages = max(1, math.ceil(len(labels) / per_page))
+    if image_format == 'png':
+        page = min(max(1, page), total_pages)
+        labels = labels[(page - 1) * per_page:page * per_page]
+
+    jobs = [
+        (label['name'] or '', format_naira(label['price']), label['barcode_value'], cell_width, cell_height)
+        for label in labels
+    ]
+
+    pages = []
+    current = None
+    for index, (width, height, data) in enumerate(render_labels(jobs)):
+        slot = index % per_page
+        if slot == 0:
+            current = Image.new('1', (layout['page_width'], layout['page_height']), 1)
+            pages.append(current)
+        column, row = slot % columns, slot // columns
+        current.paste(
+            Image.frombytes('1', (width, height), data),
+            (layout['margin'] + column * (cell_width + layout['gutter']),
+             layout['margin'] + row * (cell_height + layout['gutter']))
+        )
+
+    if not pages:
+        pages.append(Image.new('1', (layout['page_width'], layout['page_height']), 1))
+
+    # Spill to disk for large sheets instead of holding the whole file in memory
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    if image_format == 'pdf':
+        pages[0].save(output, format='PDF', save_all=True, append_images=pages[1:],
+                      resolution=layout['dpi'])
+    else:
+        pages[0].save(output, format='PNG', dpi=(layout['dpi'], layout['dpi']))
+    output.seek(0)
+
+    return output, total_pages
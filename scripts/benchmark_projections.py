@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# scripts/benchmark_projections.py - Per-row cost of ORM entity loading vs column projections
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base
+
+
+def seed(engine, count):
+    """count active products in one executemany"""
+    categories = ['Beverages', 'Groceries', 'Household', 'Toiletries', 'Snacks']
+    rows = [
+        {
+            'name': f'Product {i} {categories[i % 5]} 500g',
+            'description': f'{categories[i % 5]} item number {i}',
+            'price': round(150 + (i * 37) % 9000 + 0.5, 2),
+            'cost_price': 100.0,
+            'stock_quantity': (i * 7) % 120,
+            'category': categories[i % 5],
+            'sku': f'SKU-{i:06d}',
+            'barcode': f'{6150000000000 + i}',
+            'reorder_level': 10,
+            'is_active': True
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product.__table__), rows)
+
+
+def entity_list(db):
+    """What /api/products did before: full Product objects, then pick 8 fields"""
+    return [
+        {
+            'id': p.id,
+            'name': p.name,
+            'price': float(p.price),
+            'stock_quantity': p.stock_quantity,
+            'category': p.category,
+            'sku': p.sku,
+            'description': p.description,
+            'barcode': p.barcode
+        }
+        for p in db.query(models.Product).filter(
+            models.Product.is_active == True
+        ).order_by(models.Product.id)
+    ]
+
+
+def projection_list(db):
+    return crud.get_product_list(db, limit=None)
+
+
+def measure(Session, func, rounds):
+    """Best wall time over rounds (fresh session each) and peak traced memory of one run"""
+    best = None
+    for _ in range(rounds):
+        db = Session()
+        try:
+            start = time.perf_counter()
+            result = func(db)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+
+    db = Session()
+    try:
+        tracemalloc.start()
+        func(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        db.close()
+    return result, best, peak
+
+
+def time_lookups(Session, func, ids):
+    """Mean time per lookup, one session per lookup like a request"""
+    start = time.perf_counter()
+    for product_id in ids:
+        db = Session()
+        try:
+            func(db, product_id)
+        finally:
+            db.close()
+    return (time.perf_counter() - start) / len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ORM entity loading against column projections')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        print(f"📦 Seeding {args.products} products...")
+        seed(engine, args.products)
+
+        entities, entity_s, entity_peak = measure(Session, entity_list, args.rounds)
+        projected, projection_s, projection_peak = measure(Session, projection_list, args.rounds)
+        assert entities == projected, "projection output differs from entity output"
+
+        rows = len(projected)
+        print(f"\n{'list (' + str(rows) + ' rows)':<28}{'total ms':>10}{'µs/row':>10}{'peak MB':>10}")
+        for name, seconds, peak in (('ORM entities', entity_s, entity_peak),
+                                    ('column projection', projection_s, projection_peak)):
+            print(f"{name:<28}{seconds * 1000:>10.1f}{seconds * 1e6 / rows:>10.2f}{peak / 1048576:>10.1f}")
+        print(f"{'speedup':<28}{entity_s / projection_s:>10.2f}x")
+
+        ids = [random.randint(1, args.products) for _ in range(args.lookups)]
+        entity_lookup = time_lookups(Session, crud.get_product, ids)
+        row_lookup = time_lookups(Session, crud.get_cart_product, ids)
+        print(f"\n{'cart lookup':<28}{'µs each':>10}")
+        print(f"{'crud.get_product':<28}{entity_lookup * 1e6:>10.1f}")
+        print(f"{'crud.get_cart_product':<28}{row_lookup * 1e6:>10.1f}")
+        print(f"{'speedup':<28}{entity_lookup / row_lookup:>10.2f}x")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
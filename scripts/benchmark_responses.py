@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# scripts/benchmark_responses.py - Bytes on the wire and JSON encode time, before and after the response layer
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from app import responses
+
+
+def products_payload(count):
+    """Same shape as /api/products"""
+    categories = ['Beverages', 'Groceries', 'Household', 'Toiletries', 'Snacks']
+    return [
+        {
+            'id': i,
+            'name': f'Product {i} {categories[i % 5]} 500g',
+            'price': round(150 + (i * 37) % 9000 + 0.5, 2),
+            'stock_quantity': (i * 7) % 120,
+            'category': categories[i % 5],
+            'sku': f'SKU-{i:06d}',
+            'description': f'{categories[i % 5]} item number {i}',
+            'barcode': f'{6150000000000 + i}'
+        }
+        for i in range(count)
+    ]
+
+
+def cart_payload(count):
+    """Same shape as /api/cart and the /api/cart/* responses"""
+    items = [
+        {
+            'product_id': i,
+            'name': f'Product {i} 500g',
+            'price': 250.0 + i,
+            'quantity': 1 + i % 3,
+            'subtotal': (250.0 + i) * (1 + i % 3),
+            'sku': f'SKU-{i:06d}',
+            'barcode': f'{6150000000000 + i}'
+        }
+        for i in range(count)
+    ]
+    return {
+        'success': True,
+        'cart_count': len(items),
+        'cart_total': sum(item['subtotal'] for item in items),
+        'cart_items': items
+    }
+
+
+def make_app(fast):
+    app = Flask(__name__)
+    if fast:
+        app.json = responses.FastJSONProvider(app)
+    return app
+
+
+def time_encode(app, payload, rounds):
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            body = jsonify(payload).get_data()
+        elapsed = (time.perf_counter() - start) / rounds
+    return body, elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON encoding and compression of API payloads')
+    parser.add_argument('--products', type=int, default=100, help='rows in the /api/products payload')
+    parser.add_argument('--catalog', type=int, default=5000, help='rows in the large catalog payload')
+    parser.add_argument('--cart', type=int, default=25, help='items in the cart payload')
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    before, after = make_app(False), make_app(True)
+    print(f"📦 Fast encoder: {after.json.encoder or 'none installed (stdlib)'}; "
+          f"brotli: {'yes' if responses.brotli else 'no'}")
+
+    cases = [
+        (f'/api/products ({args.products} rows)', products_payload(args.products)),
+        (f'catalog ({args.catalog} rows)', products_payload(args.catalog)),
+        (f'/api/cart ({args.cart} items)', cart_payload(args.cart))
+    ]
+
+    print(f"\n{'payload':<28}{'json ms':>10}{'fast ms':>10}{'raw B':>10}{'gzip B':>10}{'br B':>10}")
+    for name, payload in cases:
+        rounds = max(5, args.rounds // max(1, len(str(payload)) // 20000))
+        body, slow_ms = time_encode(before, payload, rounds)
+        fast_body, fast_ms = time_encode(after, payload, rounds)
+        assert fast_body == body or after.json.encoder == 'msgspec', f"{name}: fast encoder output differs"
+
+        gzip_size = len(responses.compress_body(body, 'gzip'))
+        br_size = len(responses.compress_body(body, 'br')) if responses.brotli else None
+        print(f"{name:<28}{slow_ms:>10.3f}{fast_ms:>10.3f}{len(body):>10}{gzip_size:>10}"
+              f"{br_size if br_size is not None else '-':>10}")
+
+
+if __name__ == "__main__":
+    main()
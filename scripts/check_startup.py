@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# scripts/check_startup.py - Time a cold import of web_server against a budget and make sure it never touches the database
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Worker boot on a Render free instance should stay well under a second
+DEFAULT_BUDGET_MS = 800
+
+# Runs in a fresh interpreter so nothing is already imported
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+from sqlalchemy import event
+from app.database import engine
+connections = []
+event.listen(engine, "connect", lambda *args: connections.append(1))
+import web_server
+elapsed = (time.perf_counter() - start) * 1000
+print("STARTUP " + json.dumps({"ms": elapsed, "connections": len(connections)}))
+"""
+
+
+def parse_importtime(stderr, top):
+    """Slowest modules pulled in by the app, by cumulative ms, from -X importtime output"""
+    app_roots = {"web_server", "app.database", "sqlalchemy"}
+    modules, children = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entry = (int(cumulative) / 1000, name.strip())
+        # Children are printed before their parent, so hold them until it shows up
+        if depth == 1:
+            children.append(entry)
+        elif depth == 0:
+            if entry[1] in app_roots:
+                modules.append(entry)
+                modules.extend(children)
+            children = []
+    return sorted(modules, reverse=True)[:top]
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("❌ Importing web_server failed")
+
+    marker = next(line for line in result.stdout.splitlines() if line.startswith("STARTUP "))
+    return json.loads(marker[len("STARTUP "):]), result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check web_server import time against a budget')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.getenv('STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    parser.add_argument('--runs', type=int, default=3, help='best of N cold imports')
+    parser.add_argument('--top', type=int, default=8, help='slowest top-level imports to list')
+    args = parser.parse_args()
+
+    # First run warms the filesystem and .pyc caches, like any worker after the first
+    run_probe()
+    results = [run_probe() for _ in range(args.runs)]
+    best, stderr = min(results, key=lambda r: r[0]["ms"])
+
+    print(f"⏱️  web_server import: {best['ms']:.0f}ms (best of {args.runs}, budget {args.budget_ms:.0f}ms)")
+    for ms, name in parse_importtime(stderr, args.top):
+        print(f"   {ms:8.1f}ms  {name}")
+
+    ok = True
+    if best["connections"]:
+        print(f"❌ Import opened {best['connections']} database connection(s) - "
+              f"schema work belongs in python -m app.bootstrap")
+        ok = False
+    if best["ms"] > args.budget_ms:
+        print(f"❌ Over budget by {best['ms'] - args.budget_ms:.0f}ms")
+        ok = False
+    if ok:
+        print("✅ Startup within budget, no database access at import")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
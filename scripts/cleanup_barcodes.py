@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# scripts/cleanup_barcodes.py - Delete barcode images no product uses (run from cron)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    """Run the orphaned barcode cleanup once and print the report"""
+    from app.maintenance import cleanup_orphaned_barcodes
+
+    print("🧹 Cleaning up orphaned barcode images...")
+    report = cleanup_orphaned_barcodes()
+    print(f"✅ Scanned {report['scanned']} files, deleted {report['deleted']} "
+          f"({report['reclaimed_bytes'] / 1024:.1f} KB reclaimed) in {report['elapsed_ms']}ms")
+    if report['errors']:
+        print(f"⚠️  {report['errors']} files could not be deleted")
+    return report
+
+
+if __name__ == "__main__":
+    result = main()
+    sys.exit(1 if result['errors'] else 0)
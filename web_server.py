@@ -1,80 +1,31 @@
 ﻿# web_server.py - CORRECTED VERSION
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, render_template, jsonify, request, redirect, url_for, session, send_file
 from app.database import SessionLocal
-from app import crud, schemas, models
+from app import crud, models, responses, fragments, sessions, transactions
 from app.models import Sale, SaleItem, Product, Customer, User, StockMovement
 from datetime import datetime, timedelta
+from functools import partial
 import secrets
 from app.auth import authenticate_user, get_password_hash
+from app.conditional import conditional, get_stats as conditional_stats
 import json
+import csv
+import io
+import time
+import uuid
 from markupsafe import Markup
-import sqlite3
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 import os
 
 app = Flask(__name__, template_folder="templates")
-app.secret_key = secrets.token_hex(32)
+# One signing key for every worker, and optionally server-side session data
+sessions.init_app(app)
 
-
-# AUTO-SETUP DATABASE ON STARTUP
-def setup_database():
-    """Auto-setup database on first run"""
-    try:
-        from app.database import Base, engine, SessionLocal
-        from app.auth import get_password_hash
-        from sqlalchemy import inspect
-
-        # Check if tables exist
-        inspector = inspect(engine)
-        existing_tables = inspector.get_table_names()
-
-        if not existing_tables:
-            print("🔄 First run: Creating database tables...")
-            Base.metadata.create_all(bind=engine)
-
-            # Create default users
-            db = SessionLocal()
-
-            default_users = [
-                ("admin", "admin123", "admin", "System Administrator"),
-                ("cashier", "cashier123", "cashier", "Cashier User"),
-                ("inventory", "inventory123", "inventory", "Inventory Manager")
-            ]
-
-            for username, password, role, full_name in default_users:
-                user = models.User(
-                    username=username,
-                    email=f"{username}@pos.com",
-                    hashed_password=get_password_hash(password),
-                    role=role,
-                    full_name=full_name,
-                    is_active=True
-                )
-                db.add(user)
-                print(f"✅ Created user: {username}")
-
-            db.commit()
-            db.close()
-
-            print("🎉 First-time setup complete!")
-            print("🔑 Default credentials:")
-            print("   • admin / admin123")
-            print("   • cashier / cashier123")
-            print("   • inventory / inventory123")
-            print("⚠️ Change passwords immediately after login!")
-
-            return True  # First time setup
-        else:
-            print(f"✅ Database ready with {len(existing_tables)} tables")
-            return False  # Already set up
-
-    except Exception as e:
-        print(f"❌ Database setup error: {e}")
-        return False
-
-
-# Run setup when app starts
-with app.app_context():
-    setup_database()
+# Fast JSON encoding and gzip/brotli compression for every response
+responses.init_app(app)
+# Template bytecode on disk and version-keyed fragment caching
+fragments.init_app(app)
 
 
 def escapejs(value):
@@ -171,6 +122,12 @@ def format_number(num):
         return "0"
 
 
+# Available to every template, as filters ({{ x|format_naira }}) and as functions
+for _formatter in (format_naira, format_number):
+    app.add_template_filter(_formatter)
+    app.add_template_global(_formatter)
+
+
 # Default company settings
 COMPANY_SETTINGS = {
     "name": "Your Business POS",
@@ -230,13 +187,15 @@ def get_top_selling_products(db, limit=5):
     """Get top selling products by quantity sold"""
     try:
         from sqlalchemy import func
+        # Net of returns and voids
+        kept = models.SaleItem.quantity - func.coalesce(models.SaleItem.returned_quantity, 0)
         result = db.query(
             models.Product.id,
             models.Product.name,
             models.Product.sku,
             models.Product.category,
-            func.sum(models.SaleItem.quantity).label('total_sold'),
-            func.sum(models.SaleItem.subtotal).label('total_revenue')
+            func.sum(kept).label('total_sold'),
+            func.sum(kept * models.SaleItem.unit_price).label('total_revenue')
         ).join(
             models.SaleItem, models.SaleItem.product_id == models.Product.id
         ).join(
@@ -246,8 +205,10 @@ def get_top_selling_products(db, limit=5):
             models.Product.name,
             models.Product.sku,
             models.Product.category
+        ).having(
+            func.sum(kept) > 0
         ).order_by(
-            func.sum(models.SaleItem.quantity).desc()
+            func.sum(kept).desc()
         ).limit(limit).all()
 
         # Format the result
@@ -268,18 +229,37 @@ def get_top_selling_products(db, limit=5):
         return []
 
 
+# Periodic housekeeping
+# Seconds between sweeps of abandoned carts' stock holds, per worker
+RESERVATION_SWEEP_INTERVAL = 300
+# Seconds between checks that next months' sales partitions exist (PostgreSQL)
+PARTITION_CHECK_INTERVAL = 24 * 60 * 60
+
+
+@app.before_request
+def start_maintenance():
+    """Start this worker's periodic jobs with its first request (never at import)"""
+    from app import maintenance
+    maintenance.start_periodic('stock_reservation_sweep', RESERVATION_SWEEP_INTERVAL,
+                               maintenance.expire_stock_reservations)
+    maintenance.start_periodic('sales_partitions', PARTITION_CHECK_INTERVAL,
+                               maintenance.ensure_partitions)
+
+
 # Check if user is logged in
 @app.before_request
 def require_login():
     # Routes that don't require login
     public_routes = [
         'login',
+        'api_auth_token',
         'setup_admin',
         'static',
         'health',
         'force_init_db',
         'init_now',
-        'ping'
+        'ping',
+        'barcode_image'
     ]
 
     # Also allow any route that starts with /force- or /init-
@@ -291,6 +271,9 @@ def require_login():
 
     # Check for login
     if 'user_id' not in session:
+        if isinstance(session._get_current_object(), sessions.TokenSession):
+            # Token clients get an answer they can act on rather than the login page
+            return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
         return redirect('/login')
 
 
@@ -309,6 +292,7 @@ def login():
             user = authenticate_user(db, username, password)
 
             if user:
+                sessions.regenerate(session)
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['role'] = user.role
@@ -374,10 +358,47 @@ def create_inventory_test_user():
 # Logout
 @app.route('/logout')
 def logout():
+    _release_cart()
     session.clear()
     return redirect('/login')
 
 
+@app.route('/api/auth/token', methods=['POST'])
+def api_auth_token():
+    """
+    Issue a bearer token for a till device or integration
+
+    Body: {"username", "password"}. Send the token as
+    "Authorization: Bearer <token>" instead of a session cookie; it expires
+    after ACCESS_TOKEN_EXPIRE_MINUTES and stops working when the user's
+    password changes.
+    """
+    from app.auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_user_token
+
+    data = request.get_json(silent=True) or {}
+    username = data.get('username')
+    password = data.get('password')
+    if not username or not password:
+        return jsonify({'success': False, 'message': 'Username and password are required'}), 400
+
+    db = SessionLocal()
+    try:
+        user = authenticate_user(db, username, password)
+        if not user or user.is_active is False:
+            return jsonify({'success': False, 'message': 'Invalid username or password'}), 401
+
+        print(f"🔑 API token issued for {user.username}")
+        return jsonify({
+            'success': True,
+            'token': create_user_token(user),
+            'token_type': 'Bearer',
+            'expires_in': ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            'user': {'id': user.id, 'username': user.username, 'role': user.role}
+        })
+    finally:
+        db.close()
+
+
 # Create first admin user (run once)
 @app.route('/setup-admin')
 def setup_admin():
@@ -442,33 +463,31 @@ def dashboard():
 
     db = SessionLocal()
     try:
-        products = crud.get_products(db)
         customers = crud.get_customers(db)
         sales = crud.get_sales(db)
 
         # Calculate stats
-        today = datetime.now().date()
-        today_sales = sum(sale.total_amount for sale in sales if sale.created_at.date() == today)
-        inventory_value = sum(p.stock_quantity * p.price for p in products)
-        low_stock = crud.get_low_stock_products(db)
+        today_sales = crud.get_takings(db, *crud.day_range(datetime.now().date()))
+        inventory = crud.get_inventory_summary(db)
         recent_sales = sorted(sales, key=lambda x: x.created_at, reverse=True)[:5]
 
-        # Get top selling products
-        top_products = get_top_selling_products(db)
+        # Low stock and top sellers are cached fragments; their queries
+        # only run when the product or sales data has changed
+        product_version = crud.get_products_version(db)
 
         return render_template('dashboard.html',
-                               total_products=len(products),
+                               total_products=inventory['total_products'],
                                total_customers=len(customers),
                                today_sales=today_sales,
-                               inventory_value=inventory_value,
-                               low_stock_products=low_stock,
-                               low_stock_count=len(low_stock),
+                               inventory_value=inventory['total_value'],
+                               low_stock_count=inventory['low_stock'],
+                               load_low_stock=partial(crud.get_low_stock_products, db, limit=3),
+                               product_version=product_version,
+                               sales_version=(product_version, crud.get_sale_items_version(db)),
+                               load_top_products=partial(get_top_selling_products, db),
                                recent_sales=recent_sales,
-                               top_products=top_products,
                                company=COMPANY_SETTINGS,
-                               payment_methods=PAYMENT_METHODS,
-                               format_naira=format_naira,
-                               format_number=format_number
+                               payment_methods=PAYMENT_METHODS
                                )
     finally:
         db.close()
@@ -482,21 +501,24 @@ def pos():
 
     db = SessionLocal()
     try:
-        products = crud.get_products(db)
-        categories = list(set(p.category for p in products if p.category))
-
+        # Products are paged in by the grid from /api/catalog; the category
+        # bar is a cached fragment
         return render_template('pos.html',
-                               products=products,
-                               categories=categories,
+                               load_categories=partial(crud.get_product_categories, db),
+                               product_version=crud.get_products_version(db),
+                               catalog_page_size=crud.CATALOG_PAGE_SIZE,
+                               sale_sync_batch=crud.SALE_SYNC_BATCH,
                                company=COMPANY_SETTINGS,
-                               payment_methods=PAYMENT_METHODS,
-                               format_naira=format_naira,
-                               format_number=format_number
+                               payment_methods=PAYMENT_METHODS
                                )
     finally:
         db.close()
 
 
+# Rows in the products page table; the paged inventory grid lists the rest
+PRODUCTS_TABLE_LIMIT = 100
+
+
 # Products Page - Only inventory and admin
 @app.route('/products')
 def products():
@@ -505,15 +527,13 @@ def products():
 
     db = SessionLocal()
     try:
-        products = crud.get_products(db)
-        categories = list(set(p.category for p in products if p.category))
-
+        # The product table is a cached fragment, loaded only on a miss
         return render_template('products.html',
-                               products=products,
-                               categories=categories,
-                               company=COMPANY_SETTINGS,
-                               format_naira=format_naira,
-                               format_number=format_number
+                               product_count=crud.count_active_products(db),
+                               product_limit=PRODUCTS_TABLE_LIMIT,
+                               load_products=partial(crud.get_products, db, limit=PRODUCTS_TABLE_LIMIT),
+                               product_version=crud.get_products_version(db),
+                               company=COMPANY_SETTINGS
                                )
     finally:
         db.close()
@@ -527,21 +547,60 @@ def inventory():
 
     db = SessionLocal()
     try:
-        products = crud.get_products(db)
-        report = crud.get_inventory_report(db)
-        low_stock = crud.get_low_stock_products(db)
+        filters = _inventory_filters()
+        report = crud.get_inventory_report(db, **filters)
+        summary = crud.get_inventory_summary(db)
+        low_stock = crud.get_low_stock_products(db, limit=5)
+        categories = crud.get_product_categories(db)
 
         return render_template('inventory.html',
                                inventory_report=report,
+                               inventory_summary=summary,
                                low_stock_products=low_stock,
-                               products=products,
-                               format_naira=format_naira,
-                               format_number=format_number
+                               categories=categories,
+                               filters=filters
                                )
     finally:
         db.close()
 
 
+def _inventory_filters():
+    """Search, filter, sort and page parameters for the inventory grid"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+    try:
+        per_page = int(request.args.get('per_page', crud.INVENTORY_PAGE_SIZE))
+    except ValueError:
+        per_page = crud.INVENTORY_PAGE_SIZE
+
+    return {
+        'search': request.args.get('q', '').strip() or None,
+        'category': request.args.get('category') or None,
+        'status': request.args.get('status') or None,
+        'sort': request.args.get('sort', 'name'),
+        'direction': 'desc' if request.args.get('dir') == 'desc' else 'asc',
+        'page': page,
+        'per_page': per_page
+    }
+
+
+@app.route('/api/inventory')
+def api_inventory_report():
+    if not check_permission('inventory'):
+        return jsonify({'error': 'Access denied'}), 403
+
+    db = SessionLocal()
+    try:
+        report = crud.get_inventory_report(db, **_inventory_filters())
+        for item in report['items']:
+            item['last_movement'] = item['last_movement'].isoformat() if item['last_movement'] else None
+        return jsonify(report)
+    finally:
+        db.close()
+
+
 # Sales Page - Only cashiers and admin
 @app.route('/sales')
 def sales_page():
@@ -553,12 +612,8 @@ def sales_page():
         sales_list = crud.get_sales(db)
 
         # Calculate statistics
-        today = datetime.now().date()
-        today_sales = sum(
-            sale.total_amount for sale in sales_list
-            if sale.created_at.date() == today
-        )
-        total_sales = sum(sale.total_amount for sale in sales_list)
+        today_sales = crud.get_takings(db, *crud.day_range(datetime.now().date()))
+        total_sales = sum(sale.net_amount for sale in sales_list)
         total_transactions = len(sales_list)
         average_sale = total_sales / total_transactions if total_transactions > 0 else 0
 
@@ -568,9 +623,7 @@ def sales_page():
                                total_sales=total_sales,
                                total_transactions=total_transactions,
                                average_sale=average_sale,
-                               company=COMPANY_SETTINGS,
-                               format_naira=format_naira,
-                               format_number=format_number
+                               company=COMPANY_SETTINGS
                                )
     finally:
         db.close()
@@ -578,23 +631,55 @@ def sales_page():
 
 # API Endpoints
 @app.route('/api/products')
+@conditional(lambda db: crud.get_products_version(db))
 def api_products():
     db = SessionLocal()
     try:
-        products = crud.get_products(db)
-        result = []
-        for p in products:
-            result.append({
-                'id': p.id,
-                'name': p.name,
-                'price': float(p.price),
-                'stock_quantity': p.stock_quantity,
-                'category': p.category,
-                'sku': p.sku,
-                'description': p.description,
-                'barcode': p.barcode if hasattr(p, 'barcode') else None
-            })
-        return jsonify(result)
+        return jsonify(crud.get_product_list(db))
+    finally:
+        db.close()
+
+
+@app.route('/api/catalog')
+def api_catalog():
+    """Paged product catalog for the POS grid: ?category=&q=&cursor=&limit="""
+    if not check_permission('cashier'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    db = SessionLocal()
+    try:
+        page = crud.get_catalog_page(
+            db,
+            category=request.args.get('category') or None,
+            query=request.args.get('q', '').strip() or None,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', crud.CATALOG_PAGE_SIZE, type=int)
+        )
+        return jsonify({'success': True, **page})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    finally:
+        db.close()
+
+
+@app.route('/api/products/changes')
+def api_product_changes():
+    """
+    Catalog delta sync: ?since=<token>&limit=
+
+    Returns products changed and deactivated since the token, plus the token
+    for the next call. Omit since for a full sync; keep calling while has_more.
+    """
+    db = SessionLocal()
+    try:
+        changes = crud.get_product_changes(
+            db,
+            since=request.args.get('since') or None,
+            limit=request.args.get('limit', crud.CHANGES_PAGE_SIZE, type=int)
+        )
+        return jsonify({'success': True, **changes})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     finally:
         db.close()
 
@@ -613,6 +698,7 @@ def api_create_product():
             return jsonify({'error': 'Name, SKU, and price are required'}), 400
 
         # Create product
+        from app import schemas
         product_data = schemas.ProductCreate(
             name=data['name'],
             sku=data['sku'],
@@ -643,6 +729,93 @@ def api_create_product():
         db.close()
 
 
+def _parse_bulk_number(value, cast=float):
+    """Parse an optional number from JSON or form input"""
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+
+@app.route('/api/products/bulk-update', methods=['POST'])
+def api_bulk_update_products():
+    """Bulk price/stock update by filter (category, supplier, SKU list) or uploaded CSV"""
+    if not check_permission('inventory'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        upload = request.files.get('file')
+        rows = []
+
+        if upload:
+            # CSV with a 'sku' column and optional 'price' / 'stock_quantity' columns
+            data = request.form.to_dict()
+            reader = csv.DictReader(io.StringIO(upload.read().decode('utf-8-sig')))
+            for row in reader:
+                row = {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+                if row.get('sku'):
+                    rows.append(row)
+            if not rows:
+                return jsonify({'success': False, 'message': 'Uploaded file has no SKU rows'}), 400
+        else:
+            data = request.get_json() or {}
+
+        created_by = session.get('username', 'system')
+        reference = data.get('reference')
+
+        if rows and any(row.get('price') or row.get('stock_quantity') for row in rows):
+            # Per-row values from the file
+            summary = crud.bulk_set_products_by_sku(db, [{
+                'sku': row['sku'],
+                'price': _parse_bulk_number(row.get('price')),
+                'stock_quantity': _parse_bulk_number(row.get('stock_quantity'), int)
+            } for row in rows], created_by=created_by, reference=reference)
+        else:
+            skus = data.get('skus') or []
+            if isinstance(skus, str):
+                skus = [s.strip() for s in skus.split(',') if s.strip()]
+            if rows:
+                # File only lists SKUs - use it as the filter
+                skus = [row['sku'] for row in rows]
+
+            filters = {
+                'category': data.get('category'),
+                'supplier': data.get('supplier'),
+                'skus': skus,
+                'all': str(data.get('all', '')).lower() in ('1', 'true', 'yes')
+            }
+            summary = crud.bulk_update_products(
+                db, filters,
+                price_mode=data.get('price_mode') or None,
+                price_change=_parse_bulk_number(data.get('price_change')),
+                stock_quantity=_parse_bulk_number(data.get('stock_quantity'), int),
+                created_by=created_by,
+                reference=reference
+            )
+
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"✅ Bulk update {summary['reference']}: {summary['matched']} products "
+              f"({summary['movements_created']} stock movements) in {summary['elapsed_ms']}ms")
+
+        return jsonify({'success': True, **summary})
+    except ValueError as e:
+        db.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except StaleDataError:
+        db.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Some products changed while the update ran; nothing was saved. Please try again.'
+        }), 409
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Bulk update error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        db.close()
+
+
 # PRODUCT CREATE PAGE - COMBINED GET & POST - ONLY ONE FUNCTION!
 @app.route('/products/create', methods=['GET', 'POST'])
 def web_create_product():
@@ -660,8 +833,7 @@ def web_create_product():
             # Display the form
             return render_template('create_product.html',
                                    categories=categories,
-                                   company=COMPANY_SETTINGS,
-                                   format_naira=format_naira)
+                                   company=COMPANY_SETTINGS)
 
         else:  # POST method - Create product
             # Get form data
@@ -675,7 +847,6 @@ def web_create_product():
                 return render_template('create_product.html',
                                        categories=categories,
                                        company=COMPANY_SETTINGS,
-                                       format_naira=format_naira,
                                        error='Missing required fields')
 
             # Check if barcode already exists
@@ -687,10 +858,10 @@ def web_create_product():
                     return render_template('create_product.html',
                                            categories=categories,
                                            company=COMPANY_SETTINGS,
-                                           format_naira=format_naira,
                                            error=f'Barcode {barcode} already exists')
 
             # Create product
+            from app import schemas
             product_data = schemas.ProductCreate(
                 name=name,
                 sku=sku,
@@ -710,13 +881,11 @@ def web_create_product():
         return render_template('create_product.html',
                                categories=categories,
                                company=COMPANY_SETTINGS,
-                               format_naira=format_naira,
                                error=str(e))
     except Exception as e:
         return render_template('create_product.html',
                                categories=categories,
                                company=COMPANY_SETTINGS,
-                               format_naira=format_naira,
                                error=f'Error: {str(e)}')
     finally:
         db.close()
@@ -737,8 +906,7 @@ def edit_product(product_id):
                 return redirect('/products?error=Product+not+found')
 
             return render_template('edit_product.html',
-                                   product=product,
-                                   format_naira=format_naira)
+                                   product=product)
         else:  # POST - Update product
             # Get form data
             name = request.form.get('name')
@@ -754,6 +922,12 @@ def edit_product(product_id):
             if not product:
                 return redirect('/products?error=Product+not+found')
 
+            # The version the form was rendered from; the flush below also
+            # checks it in its WHERE clause, so a save racing this one loses
+            expected_version = request.form.get('version', type=int)
+            if expected_version is not None and expected_version != product.version:
+                raise crud.VersionConflict(crud.get_product_state(db, product_id))
+
             # Check if SKU is being changed and already exists
             if sku != product.sku:
                 existing = db.query(models.Product).filter(
@@ -785,6 +959,15 @@ def edit_product(product_id):
 
             db.commit()
             return redirect('/products?success=Product+updated')
+    except (crud.VersionConflict, StaleDataError) as e:
+        db.rollback()
+        current = getattr(e, 'current', None) or crud.get_product_state(db, product_id)
+        print(f"⚠️ Edit conflict on product {product_id}: now at version {current and current['version']}")
+        message = 'Someone else changed this product while you were editing. ' \
+                  'The form shows the current values; re-apply your changes and save again.'
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': message, 'product': current}), 409
+        return render_template('edit_product.html', product=current, error=message), 409
     except Exception as e:
         db.rollback()
         return redirect(f'/products?error={str(e).replace(" ", "+")}')
@@ -819,6 +1002,33 @@ def delete_product(product_id):
 
 
 # Cart Management Endpoints
+def _cart_holder():
+    """Id of this session's cart, which owns its stock reservations"""
+    if 'cart_id' not in session:
+        session['cart_id'] = uuid.uuid4().hex
+    return session['cart_id']
+
+
+def _release_cart():
+    """Give back everything this session's cart holds"""
+    if 'cart_id' not in session:
+        return
+    db = SessionLocal()
+    try:
+        crud.release_stock(db, session['cart_id'])
+    finally:
+        db.close()
+
+
+def _reserve_cart_line(db, product, quantity):
+    """Hold quantity units of product for this cart (0 releases); an error response if stock can't cover it"""
+    try:
+        crud.reserve_stock(db, _cart_holder(), product.id, quantity, name=product.name)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return None
+
+
 @app.route('/api/cart/add', methods=['POST'])
 def api_add_to_cart():
     """Add item to cart by product_id OR barcode"""
@@ -839,38 +1049,22 @@ def api_add_to_cart():
 
         # First try to find product by ID if provided
         if product_id:
-            product = crud.get_product(db, product_id)
+            product = crud.get_cart_product(db, product_id)
         elif barcode:
-            # Try to find product by barcode
-            product = db.query(models.Product).filter(models.Product.barcode == barcode).first()
+            # Exact barcode, then name or SKU containing it (fallback)
+            product = crud.find_cart_product(db, barcode)
 
             if not product:
-                # Search for product with barcode in name or SKU (fallback)
-                products = db.query(models.Product).filter(
-                    (models.Product.name.ilike(f'%{barcode}%')) |
-                    (models.Product.sku.ilike(f'%{barcode}%'))
-                ).first()
-
-                if not products:
-                    db.close()
-                    return jsonify({
-                        'success': False,
-                        'message': f'Product with barcode "{barcode}" not found'
-                    }), 404
-                product = products
+                db.close()
+                return jsonify({
+                    'success': False,
+                    'message': f'Product with barcode "{barcode}" not found'
+                }), 404
 
         if not product:
             db.close()
             return jsonify({'success': False, 'message': 'Product not found'}), 404
 
-        # Check stock availability
-        if product.stock_quantity < quantity:
-            db.close()
-            return jsonify({
-                'success': False,
-                'message': f'Only {product.stock_quantity} in stock'
-            }), 400
-
         # Initialize cart in session if not exists
         if 'cart' not in session:
             session['cart'] = []
@@ -883,21 +1077,29 @@ def api_add_to_cart():
         if item_index >= 0:
             # Update quantity
             new_quantity = cart[item_index]['quantity'] + quantity
+
+            # Hold the new total for this cart (releases it at 0)
+            error = _reserve_cart_line(db, product, max(0, new_quantity))
+            if error:
+                db.close()
+                return error
+
             if new_quantity < 1:
                 # Remove item if quantity would be 0 or negative
                 cart.pop(item_index)
             else:
-                # Check stock for new total quantity
-                if new_quantity > product.stock_quantity:
-                    db.close()
-                    return jsonify({
-                        'success': False,
-                        'message': f'Only {product.stock_quantity} in stock'
-                    }), 400
-
                 cart[item_index]['quantity'] = new_quantity
                 cart[item_index]['subtotal'] = new_quantity * float(product.price)
         else:
+            if quantity < 1:
+                db.close()
+                return jsonify({'success': False, 'message': 'Quantity must be positive'}), 400
+
+            error = _reserve_cart_line(db, product, quantity)
+            if error:
+                db.close()
+                return error
+
             # Add new item
             cart.append({
                 'product_id': product.id,
@@ -906,7 +1108,7 @@ def api_add_to_cart():
                 'quantity': quantity,
                 'subtotal': quantity * float(product.price),
                 'sku': product.sku,
-                'barcode': product.barcode if hasattr(product, 'barcode') else None
+                'barcode': product.barcode
             })
 
         session['cart'] = cart
@@ -960,7 +1162,7 @@ def api_update_cart():
             return jsonify({'success': False, 'message': 'product_id is required'}), 400
 
         db = SessionLocal()
-        product = crud.get_product(db, product_id)
+        product = crud.get_cart_product(db, product_id)
 
         if not product:
             db.close()
@@ -979,18 +1181,15 @@ def api_update_cart():
             # Calculate new quantity
             new_quantity = cart[item_index]['quantity'] + quantity_change
 
+            error = _reserve_cart_line(db, product, max(0, new_quantity))
+            if error:
+                db.close()
+                return error
+
             if new_quantity < 1:
                 # Remove item if quantity would be 0 or negative
                 cart.pop(item_index)
             else:
-                # Check stock
-                if new_quantity > product.stock_quantity:
-                    db.close()
-                    return jsonify({
-                        'success': False,
-                        'message': f'Only {product.stock_quantity} in stock'
-                    }), 400
-
                 cart[item_index]['quantity'] = new_quantity
                 cart[item_index]['subtotal'] = new_quantity * float(product.price)
         else:
@@ -999,12 +1198,10 @@ def api_update_cart():
                 db.close()
                 return jsonify({'success': False, 'message': 'Quantity must be positive'}), 400
 
-            if quantity_change > product.stock_quantity:
+            error = _reserve_cart_line(db, product, quantity_change)
+            if error:
                 db.close()
-                return jsonify({
-                    'success': False,
-                    'message': f'Only {product.stock_quantity} in stock'
-                }), 400
+                return error
 
             cart.append({
                 'product_id': product_id,
@@ -1013,7 +1210,7 @@ def api_update_cart():
                 'quantity': quantity_change,
                 'subtotal': quantity_change * float(product.price),
                 'sku': product.sku,
-                'barcode': product.barcode if hasattr(product, 'barcode') else None
+                'barcode': product.barcode
             })
 
         session['cart'] = cart
@@ -1051,6 +1248,13 @@ def api_remove_from_cart(product_id):
         if len(cart) == initial_length:
             return jsonify({'success': False, 'message': 'Item not found in cart'}), 404
 
+        if 'cart_id' in session:
+            db = SessionLocal()
+            try:
+                crud.release_stock(db, session['cart_id'], [product_id])
+            finally:
+                db.close()
+
         session['cart'] = cart
         session.modified = True
 
@@ -1065,6 +1269,50 @@ def api_remove_from_cart(product_id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/cart/hold', methods=['POST'])
+def api_hold_stock():
+    """
+    Hold stock for a line of the till's own cart (pos.html keeps its cart locally)
+
+    Body: {"product_id", "quantity"} with the line's new total (0 lets it go),
+    or {"clear": true} to let every line go. Syncing a sale drops the holds
+    on the products it sold.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    data = request.get_json(silent=True) or {}
+    if data.get('clear'):
+        _release_cart()
+        return jsonify({'success': True, 'message': 'Holds released'})
+
+    try:
+        product_id = int(data.get('product_id'))
+        quantity = max(0, int(data.get('quantity', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'product_id and quantity are required'}), 400
+
+    db = SessionLocal()
+    try:
+        product = crud.get_cart_product(db, product_id)
+        if not product:
+            return jsonify({'success': False, 'message': 'Product not found'}), 404
+
+        holder = _cart_holder()
+        try:
+            available = crud.reserve_stock(db, holder, product.id, quantity, name=product.name)
+        except ValueError as e:
+            stock, reserved = crud.get_available_stock(db, [product.id], exclude_holder=holder)[product.id]
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'available': max(0, stock - reserved)
+            }), 400
+        return jsonify({'success': True, 'quantity': quantity, 'available': available})
+    finally:
+        db.close()
+
+
 @app.route('/api/cart/clear', methods=['POST'])
 def api_clear_cart():
     """Clear all items from cart"""
@@ -1072,6 +1320,7 @@ def api_clear_cart():
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
+        _release_cart()
         session['cart'] = []
         session.modified = True
 
@@ -1088,6 +1337,7 @@ def api_clear_cart():
 
 # Barcode Search Endpoint
 @app.route('/api/products/barcode/<barcode>', methods=['GET'])
+@conditional(lambda db, barcode: crud.get_products_version(db))
 def api_get_product_by_barcode(barcode):
     """Get product by barcode"""
     if 'user_id' not in session:
@@ -1095,43 +1345,17 @@ def api_get_product_by_barcode(barcode):
 
     try:
         db = SessionLocal()
-
-        # First try exact barcode match
-        product = db.query(models.Product).filter(models.Product.barcode == barcode).first()
-
-        if not product:
-            # Try partial matches
-            product = db.query(models.Product).filter(
-                (models.Product.barcode.ilike(f'%{barcode}%')) |
-                (models.Product.sku.ilike(f'%{barcode}%')) |
-                (models.Product.name.ilike(f'%{barcode}%'))
-            ).first()
+        try:
+            product = crud.get_product_lookup(db, barcode)
+        finally:
+            db.close()
 
         if product:
-            result = {
-                'success': True,
-                'product': {
-                    'id': product.id,
-                    'name': product.name,
-                    'sku': product.sku,
-                    'barcode': product.barcode if hasattr(product, 'barcode') else None,
-                    'price': float(product.price),
-                    'cost_price': float(product.cost_price) if hasattr(product,
-                                                                       'cost_price') and product.cost_price else None,
-                    'stock_quantity': product.stock_quantity,
-                    'reorder_level': product.reorder_level if hasattr(product, 'reorder_level') else 10,
-                    'category': product.category,
-                    'description': product.description
-                }
-            }
-            db.close()
-            return jsonify(result)
-        else:
-            db.close()
-            return jsonify({
-                'success': False,
-                'message': f'Product with barcode "{barcode}" not found'
-            }), 404
+            return jsonify({'success': True, 'product': product})
+        return jsonify({
+            'success': False,
+            'message': f'Product with barcode "{barcode}" not found'
+        }), 404
 
     except Exception as e:
         import traceback
@@ -1139,6 +1363,141 @@ def api_get_product_by_barcode(barcode):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# Barcode images rendered on demand (no files on disk)
+BARCODE_IMAGE_MAX_AGE = 365 * 24 * 3600
+
+
+@app.route('/barcodes/<barcode_value>.<any(png, svg):image_format>')
+def barcode_image(barcode_value, image_format):
+    """Render a barcode image from its value, cached in memory and by the browser"""
+    from barcode_utils import barcode_generator, BARCODE_TYPES, IMAGE_FORMATS
+
+    barcode_type = (request.args.get('type') or '').lower() or barcode_generator.choose_barcode_type(barcode_value)
+    # Only known types reach the ETag and the image cache key
+    if barcode_type not in BARCODE_TYPES:
+        return jsonify({
+            'success': False,
+            'message': f"type must be one of {', '.join(BARCODE_TYPES)}"
+        }), 400
+    etag = barcode_generator.barcode_etag(barcode_value, barcode_type, image_format)
+
+    # The image only depends on the URL, so a matching ETag never needs a render
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        try:
+            data = barcode_generator.render_barcode(barcode_value, barcode_type, image_format)
+        except Exception as e:
+            print(f"Error rendering barcode {barcode_value}: {e}")
+            return jsonify({'success': False, 'message': f'Cannot render barcode: {e}'}), 400
+        response = app.response_class(data, mimetype=IMAGE_FORMATS[image_format])
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = BARCODE_IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+# Shelf label sheets
+@app.route('/labels/sheet', methods=['GET', 'POST'])
+def label_sheet():
+    """Printable label sheet (name, price, barcode) for products or a stock movement reference"""
+    if not check_permission('inventory'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    import label_sheets
+
+    params = request.get_json(silent=True) or request.values
+    image_format = (params.get('format') or 'pdf').lower()
+    if image_format not in ('pdf', 'png'):
+        return jsonify({'success': False, 'message': 'format must be pdf or png'}), 400
+
+    product_ids = params.get('product_ids') or []
+    if isinstance(product_ids, str):
+        product_ids = [p for p in product_ids.split(',') if p.strip()]
+    reference = params.get('reference')
+
+    try:
+        product_ids = [int(p) for p in product_ids]
+        copies = int(params.get('copies') or 1)
+        page = int(params.get('page') or 1)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'product_ids, copies and page must be numbers'}), 400
+
+    if not 1 <= copies <= label_sheets.MAX_LABELS:
+        return jsonify({
+            'success': False,
+            'message': f'copies must be between 1 and {label_sheets.MAX_LABELS}'
+        }), 400
+
+    if not product_ids and not reference:
+        return jsonify({'success': False, 'message': 'product_ids or reference is required'}), 400
+
+    # With a delivery reference, optionally print one label per unit received
+    per_unit = str(params.get('per_unit', '')).lower() in ('1', 'true', 'yes')
+
+    db = SessionLocal()
+    try:
+        rows = crud.get_label_products(db, product_ids=product_ids, reference=reference)
+    finally:
+        db.close()
+
+    if not rows:
+        return jsonify({'success': False, 'message': 'No products found for labels'}), 404
+
+    # Counted before any label is built, so a huge request costs nothing
+    counts = [copies * (int(row.quantity) if per_unit else 1) for row in rows]
+    if sum(counts) > label_sheets.MAX_LABELS:
+        return jsonify({
+            'success': False,
+            'message': f'Too many labels ({sum(counts)}); the limit is {label_sheets.MAX_LABELS} per sheet'
+        }), 400
+
+    from barcode_utils import BarcodeGenerator
+    labels = []
+    for row, count in zip(rows, counts):
+        label = {
+            'name': row.name,
+            'price': row.price,
+            'barcode_value': BarcodeGenerator.barcode_value_for(row.barcode, row.sku, row.id)
+        }
+        labels.extend([label] * count)
+
+    output, total_pages = label_sheets.build_label_sheet(labels, image_format, page)
+    response = send_file(
+        output,
+        mimetype='application/pdf' if image_format == 'pdf' else 'image/png',
+        download_name=f"labels-{reference or 'products'}.{image_format}"
+    )
+    response.headers['X-Label-Count'] = str(len(labels))
+    response.headers['X-Label-Pages'] = str(total_pages)
+    return response
+
+
+# Background maintenance
+@app.route('/api/maintenance/barcodes/cleanup', methods=['GET', 'POST'])
+def api_cleanup_barcodes():
+    """Start (POST) or check (GET) the orphaned barcode image cleanup job"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    from app import maintenance
+
+    if request.method == 'GET':
+        job = maintenance.get_job('barcode_cleanup')
+        if not job:
+            return jsonify({'success': False, 'message': 'Cleanup has not run yet'}), 404
+        return jsonify({'success': True, 'job': job})
+
+    job, started = maintenance.start_job('barcode_cleanup', maintenance.cleanup_orphaned_barcodes)
+    return jsonify({
+        'success': True,
+        'message': 'Cleanup started' if started else 'Cleanup already running',
+        'job': job
+    }), 202
+
+
 # Settings Page - Only admin
 @app.route('/settings')
 def settings():
@@ -1146,13 +1505,17 @@ def settings():
         return "Access Denied: Only admin can access settings", 403
 
     return render_template('settings.html',
-                           company=COMPANY_SETTINGS,
-                           format_naira=format_naira
+                           company=COMPANY_SETTINGS
                            )
 
 
 # Settings API endpoints
+def _settings_version(db):
+    return json.dumps(COMPANY_SETTINGS, sort_keys=True, default=str)
+
+
 @app.route('/api/settings', methods=['GET'])
+@conditional(_settings_version, allowed=lambda: check_permission('admin'))
 def api_get_settings():
     """Get company settings"""
     if not check_permission('admin'):
@@ -1200,6 +1563,33 @@ def api_save_settings():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/metrics/conditional')
+def api_conditional_metrics():
+    """ETag hit rates for the conditional JSON endpoints"""
+    if not check_permission('admin'):
+        return jsonify({'error': 'Access denied'}), 403
+
+    return jsonify({'success': True, 'endpoints': conditional_stats()})
+
+
+@app.route('/api/metrics/fragments')
+def api_fragment_metrics():
+    """Template fragment cache hit rate for this worker"""
+    if not check_permission('admin'):
+        return jsonify({'error': 'Access denied'}), 403
+
+    return jsonify({'success': True, 'fragments': fragments.get_stats()})
+
+
+@app.route('/api/metrics/retries')
+def api_retry_metrics():
+    """Transaction retries per unit of work for this worker"""
+    if not check_permission('admin'):
+        return jsonify({'error': 'Access denied'}), 403
+
+    return jsonify({'success': True, 'retries': transactions.get_stats()})
+
+
 # Health check
 @app.route('/health')
 def health():
@@ -1210,72 +1600,143 @@ def health():
 
 
 # Sales data management
-@app.route('/api/sales/clear-all', methods=['POST'])
-def clear_all_sales():
-    """Clear all sales data from database"""
-    try:
-        data = request.get_json()
+def _start_sales_archive(before, purge):
+    from app import archive, maintenance
 
-        if not data or not data.get('confirmed'):
-            return jsonify({
-                'success': False,
-                'message': 'Confirmation required. Please confirm this action.'
-            }), 400
+    job, started = maintenance.start_job('sales_archive', archive.archive_sales, before, purge=purge)
+    print(f"[{datetime.now()}] {'Purge' if purge else 'Archive'} of sales before {before:%Y-%m-%d %H:%M} "
+          f"{'started' if started else 'already running'} by {session.get('username', 'admin')}")
+    return jsonify({
+        'success': True,
+        'message': 'Started' if started else 'Already running',
+        'job': job
+    }), 202
+
+
+@app.route('/api/maintenance/sales/archive', methods=['GET', 'POST'])
+def api_archive_sales():
+    """
+    Start (POST) or check (GET) moving old sales and stock movements out of
+    the hot tables
 
-        # Connect to database
-        conn = sqlite3.connect('pos.db')
-        cursor = conn.cursor()
+    POST {"before": "2024-01-01"} or {"older_than_days": 365}, plus
+    "purge": true to delete instead of archiving
+    """
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
 
-        print(f"[{datetime.now()}] Starting to clear sales data...")
+    from app import archive, maintenance
 
-        # Get sales-related tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [table[0] for table in cursor.fetchall()]
+    if request.method == 'GET':
+        job = maintenance.get_job('sales_archive')
+        if not job:
+            return jsonify({'success': False, 'message': 'Archiving has not run yet'}), 404
+        return jsonify({'success': True, 'job': job})
 
-        sales_tables = []
-        sales_keywords = ['sale', 'transaction', 'receipt', 'order']
+    data = request.get_json(silent=True) or {}
+    try:
+        if data.get('before'):
+            before = datetime.fromisoformat(data['before'])
+        else:
+            before = datetime.now() - timedelta(
+                days=int(data.get('older_than_days', archive.ARCHIVE_AFTER_DAYS)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'before must be an ISO date'
+                                                    ' and older_than_days a number'}), 400
 
-        for table in tables:
-            table_lower = table.lower()
-            if any(keyword in table_lower for keyword in sales_keywords):
-                sales_tables.append(table)
+    return _start_sales_archive(before, purge=bool(data.get('purge')))
 
-        # Clear each sales table
-        cleared_tables = []
-        for table in sales_tables:
-            try:
-                cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
-                count_before = cursor.fetchone()[0]
 
-                cursor.execute(f'DELETE FROM "{table}"')
-                cleared_tables.append({
-                    'name': table,
-                    'rows_cleared': count_before
-                })
-                print(f"Cleared table: {table} ({count_before} rows)")
-            except Exception as e:
-                print(f"Error clearing table {table}: {e}")
+# Analytics exports
+def _export_dates():
+    """start and end (exclusive) dates from the query string"""
+    return tuple(
+        datetime.strptime(request.args[name], '%Y-%m-%d').date() if request.args.get(name) else None
+        for name in ('start', 'end')
+    )
 
-        conn.commit()
-        conn.close()
 
-        # Calculate total rows cleared
-        total_rows = sum(t['rows_cleared'] for t in cleared_tables)
+@app.route('/api/exports/sales', methods=['GET', 'POST'])
+def api_export_sales():
+    """Append new sale lines to the Parquet export (POST) or show its status (GET)"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
 
+    from app import exports, maintenance
+
+    if request.method == 'GET':
         return jsonify({
             'success': True,
-            'message': f'✅ Successfully cleared {total_rows} sales records!',
-            'cleared_tables': [t['name'] for t in cleared_tables],
-            'rows_cleared': total_rows,
-            'timestamp': datetime.now().isoformat(),
-            'cleared_by': session.get('username', 'admin')
+            'state': exports.load_state(),
+            'job': maintenance.get_job('sales_export')
         })
-    except Exception as e:
-        print(f"Error clearing sales data: {str(e)}")
+
+    job, started = maintenance.start_job('sales_export', exports.export_sales)
+    return jsonify({
+        'success': True,
+        'message': 'Export started' if started else 'Export already running',
+        'job': job
+    }), 202
+
+
+@app.route('/api/exports/sales.parquet')
+def api_export_sales_file():
+    """Exported sale lines for ?start=YYYY-MM-DD&end=YYYY-MM-DD (end exclusive) as one Parquet file"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    from app import exports
+
+    try:
+        start, end = _export_dates()
+        table = exports.read_sales(start, end)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'start and end must be YYYY-MM-DD'}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='zstd')
+    buffer.seek(0)
+    return send_file(buffer, mimetype='application/vnd.apache.parquet', as_attachment=True,
+                     download_name=f"sales-{start or 'all'}-{end or 'now'}.parquet")
+
+
+@app.route('/api/exports/sales/daily')
+def api_export_sales_daily():
+    """Per-day totals computed from the Parquet export, not the live database"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    from app import exports
+
+    try:
+        start, end = _export_dates()
+        days = exports.daily_totals(start, end)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'start and end must be YYYY-MM-DD'}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+    return jsonify({'success': True, 'days': days})
+
+
+@app.route('/api/sales/clear-all', methods=['POST'])
+def clear_all_sales():
+    """Permanently delete all sales, their items and returns, and stock movements"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    data = request.get_json(silent=True)
+    if not data or not data.get('confirmed'):
         return jsonify({
             'success': False,
-            'message': f'Error: {str(e)}'
-        }), 500
+            'message': 'Confirmation required. Please confirm this action.'
+        }), 400
+
+    return _start_sales_archive(datetime.now(), purge=True)
 
 
 # Receipt printing
@@ -1327,8 +1788,7 @@ def print_receipt(sale_id):
 
         return render_template('receipt_print.html',
                                receipt=receipt_data,
-                               company=COMPANY_SETTINGS,
-                               format_naira=format_naira)
+                               company=COMPANY_SETTINGS)
     except Exception as e:
         error_msg = f"Error: {str(e)}\n\nTraceback:\n{traceback.format_exc()}"
         print(error_msg)
@@ -1338,6 +1798,8 @@ def print_receipt(sale_id):
 
 
 @app.route('/api/sales/<int:sale_id>')
+@conditional(lambda db, sale_id: crud.get_sale_version(db, sale_id),
+             allowed=lambda: check_permission('cashier'))
 def get_sale_details(sale_id):
     """Get detailed sale information for modal"""
     if not check_permission('cashier'):
@@ -1366,8 +1828,11 @@ def get_sale_details(sale_id):
             } if sale.customer else None,
             'items': [
                 {
+                    'id': item.id,
+                    'product_id': item.product_id,
                     'product_name': item.product.name if item.product else 'Unknown Product',
                     'quantity': item.quantity,
+                    'returned_quantity': item.returned_quantity or 0,
                     'price': float(item.unit_price),
                     'total': float(item.quantity * item.unit_price)
                 }
@@ -1381,7 +1846,9 @@ def get_sale_details(sale_id):
             'change_amount': 0.0,
             'payment_method': sale.payment_method or 'cash',
             'notes': sale.notes if hasattr(sale, 'notes') else None,
-            'status': sale.status if hasattr(sale, 'status') else 'completed'
+            'status': sale.payment_status or 'completed',
+            'refunded_amount': float(sale.refunded_amount or 0),
+            'void_reason': sale.void_reason
         }
 
         return jsonify(sale_data)
@@ -1392,21 +1859,111 @@ def get_sale_details(sale_id):
         db.close()
 
 
+@app.route('/api/sales/<int:sale_id>/void', methods=['POST'])
+def api_void_sale(sale_id):
+    """Void a sale: restock everything not yet returned and refund the balance"""
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Only admin can void sales'}), 403
+
+    data = request.get_json(silent=True) or {}
+    db = SessionLocal()
+    try:
+        result = crud.void_sale(db, sale_id, void_reason=data.get('reason') or None,
+                                created_by=session.get('username', 'system'))
+        if result is None:
+            return jsonify({'success': False, 'message': 'Sale not found'}), 404
+
+        print(f"🚫 Sale {sale_id} voided: {len(result['items'])} lines, refund ₦{result['refund_amount']:,.2f}")
+        return jsonify({'success': True, 'message': 'Sale voided', **result})
+    except ValueError as e:
+        db.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    finally:
+        db.close()
+
+
+@app.route('/api/sales/<int:sale_id>/returns', methods=['POST'])
+def api_return_sale_items(sale_id):
+    """
+    Partial return: {"items": [{"sale_item_id" or "product_id": ..., "quantity": n}], "reason": ...}
+    """
+    if not check_permission('admin'):
+        return jsonify({'success': False, 'message': 'Only admin can process returns'}), 403
+
+    data = request.get_json(silent=True) or {}
+    lines = data.get('items')
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'success': False, 'message': 'items must be a non-empty list'}), 400
+
+    db = SessionLocal()
+    try:
+        result = crud.return_sale_items(db, sale_id, lines, reason=data.get('reason') or None,
+                                        created_by=session.get('username', 'system'))
+        if result is None:
+            return jsonify({'success': False, 'message': 'Sale not found'}), 404
+
+        print(f"↩️ Return {result['return_number']} on sale {sale_id}: refund ₦{result['refund_amount']:,.2f}")
+        return jsonify({'success': True, 'message': 'Return recorded', **result})
+    except ValueError as e:
+        db.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    finally:
+        db.close()
+
+
+def _replay_idempotent(db, key, request_hash):
+    """The stored response for a retried Idempotency-Key, or None if it is new"""
+    record = crud.get_idempotency_key(db, session['user_id'], key)
+    if record is None:
+        return None
+    if record.request_hash != request_hash:
+        return jsonify({
+            'success': False,
+            'message': 'Idempotency-Key was already used for a different request'
+        }), 422
+
+    # The first response may never have reached the till, cookie included
+    session.pop('cart', None)
+    session.modified = True
+
+    print(f"🔁 Replayed {record.endpoint} for Idempotency-Key {key}")
+    response = app.response_class(record.response_body, status=record.status_code,
+                                  mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
 @app.route('/sales/complete', methods=['POST'])
 def complete_sale():
-    """Complete the sale"""
+    """
+    Complete the sale
+
+    Send an Idempotency-Key header (e.g. a UUID per checkout) to make retries
+    safe: a repeat of a completed request gets the original response back
+    instead of a second sale.
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     if not check_permission('cashier'):
         return jsonify({'success': False, 'message': 'Access denied'}), 403
 
+    idempotency_key = (request.headers.get('Idempotency-Key') or '').strip()
+    if len(idempotency_key) > 100:
+        return jsonify({'success': False, 'message': 'Idempotency-Key is too long'}), 400
+
     db = SessionLocal()
     try:
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'message': 'No data provided'}), 400
 
+        if idempotency_key:
+            request_hash = crud.request_fingerprint(data)
+            replay = _replay_idempotent(db, idempotency_key, request_hash)
+            if replay is not None:
+                return replay
+
         cart = session.get('cart', [])
         if not cart:
             return jsonify({'success': False, 'message': 'Cart is empty'}), 400
@@ -1427,65 +1984,112 @@ def complete_sale():
             }), 400
 
         change_given = amount_paid - total if amount_paid > total else 0
-        receipt_number = f'REC-{datetime.now().strftime("%Y%m%d%H%M%S")}'
-
-        # Create sale - check if status field exists
-        sale_kwargs = {
-            'receipt_number': receipt_number,
-            'total_amount': total,
-            'tax_amount': tax,
-            'discount_amount': discount_amount,
-            'amount_paid': amount_paid,
-            'change_amount': change_given,
-            'payment_method': payment_method,
-            'payment_status': "completed",
-            'customer_id': data.get('customer_id'),
-            'user_id': session.get('user_id'),
-            'created_at': datetime.now()
-        }
+        user_id = session.get('user_id')
+        cart_id = session.get('cart_id', '')
 
-        # Add status field if it exists in the model
-        if hasattr(models.Sale, 'status'):
-            sale_kwargs['status'] = 'completed'
+        quantities = {}
+        for item in cart:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+
+        def record_sale(db):
+            # Replayed from the top if the database aborts it for a lock conflict
+            idempotency = None
+            if idempotency_key:
+                try:
+                    idempotency = crud.claim_idempotency_key(
+                        db, user_id, idempotency_key, '/sales/complete', request_hash)
+                except IntegrityError:
+                    db.rollback()
+                    return None  # a twin request holds the key
+
+            # Same shape as the till's offline receipts; a per-second number collided
+            # whenever two checkouts landed in the same second
+            receipt_number = f'REC-{datetime.now():%Y%m%d}-{uuid.uuid4().hex[:12].upper()}'
+
+            # Create sale - check if status field exists
+            sale_kwargs = {
+                'receipt_number': receipt_number,
+                'total_amount': total,
+                'tax_amount': tax,
+                'discount_amount': discount_amount,
+                'amount_paid': amount_paid,
+                'change_amount': change_given,
+                'payment_method': payment_method,
+                'payment_status': "completed",
+                'customer_id': data.get('customer_id'),
+                'user_id': user_id,
+                'created_at': datetime.now()
+            }
 
-        sale = models.Sale(**sale_kwargs)
+            # Add status field if it exists in the model
+            if hasattr(models.Sale, 'status'):
+                sale_kwargs['status'] = 'completed'
 
-        db.add(sale)
-        db.flush()
+            # Turn this cart's holds into the sale, refusing units other carts hold
+            crud.take_reserved_stock(db, cart_id, quantities,
+                                     names={item['product_id']: item['name'] for item in cart})
 
-        # Add sale items and update stock
-        for item in cart:
-            sale_item = models.SaleItem(
-                sale_id=sale.id,
-                product_id=item['product_id'],
-                quantity=item['quantity'],
-                unit_price=item['price'],
-                subtotal=item['subtotal']
-            )
-            db.add(sale_item)
+            sale = models.Sale(**sale_kwargs)
 
-            product = db.query(models.Product).filter(models.Product.id == item['product_id']).first()
-            if product:
-                product.stock_quantity = max(0, product.stock_quantity - item['quantity'])
+            db.add(sale)
+            db.flush()
 
-        db.commit()
+            # Add sale items and update stock
+            for item in cart:
+                sale_item = models.SaleItem(
+                    sale_id=sale.id,
+                    product_id=item['product_id'],
+                    quantity=item['quantity'],
+                    unit_price=item['price'],
+                    subtotal=item['subtotal'],
+                    created_at=sale.created_at
+                )
+                db.add(sale_item)
+
+            crud.increment_stock(db, {product_id: -quantity for product_id, quantity in quantities.items()},
+                                 floor_zero=True)
+
+            result = {
+                'success': True,
+                'message': 'Sale completed successfully!',
+                'sale_id': sale.id,
+                'receipt_number': receipt_number,
+                'total': total,
+                'change': change_given,
+                'amount_paid': amount_paid,
+                'items_count': len(cart)
+            }
+
+            # Stored in the same transaction as the sale, so a retry either finds
+            # both or neither
+            if idempotency is not None:
+                idempotency.sale_id = sale.id
+                idempotency.status_code = 200
+                idempotency.response_body = app.json.dumps(result)
+            return result
+
+        result = transactions.run_in_transaction(record_sale, 'complete_sale')
+
+        if result is None:
+            # The twin has committed by now
+            replay = _replay_idempotent(db, idempotency_key, request_hash)
+            if replay is not None:
+                return replay
+            return jsonify({
+                'success': False,
+                'message': 'A request with this Idempotency-Key is still in progress'
+            }), 409
 
         # Clear the cart from session
         if 'cart' in session:
             session.pop('cart', None)
             session.modified = True
 
-        return jsonify({
-            'success': True,
-            'message': 'Sale completed successfully!',
-            'sale_id': sale.id,
-            'receipt_number': receipt_number,
-            'total': total,
-            'change': change_given,
-            'amount_paid': amount_paid,
-            'items_count': len(cart)
-        })
+        return jsonify(result)
 
+    except ValueError as e:
+        db.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         db.rollback()
         import traceback
@@ -1496,6 +2100,67 @@ def complete_sale():
         db.close()
 
 
+@app.route('/api/sales/sync', methods=['POST'])
+def api_sync_sales():
+    """
+    Ingest a batch of sales queued by a POS till
+
+    Body: {"sales": [{"receipt_number", "created_at", "items": [{"product_id",
+    "quantity", "price", "price_override"}], "payment_method", "amount_paid",
+    "discount_amount", "customer_id"}]}. Items are priced from the catalog;
+    "price" only counts with "price_override": true. Resending a batch is
+    safe - already recorded receipt numbers come back as duplicates.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    if not check_permission('cashier'):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    data = request.get_json(silent=True) or {}
+    sales = data.get('sales')
+    if not isinstance(sales, list) or not sales:
+        return jsonify({'success': False, 'message': 'No sales provided'}), 400
+    if len(sales) > crud.SALE_SYNC_BATCH:
+        return jsonify({
+            'success': False,
+            'message': f'At most {crud.SALE_SYNC_BATCH} sales per batch'
+        }), 400
+
+    db = SessionLocal()
+    try:
+        user_id = session['user_id']
+        created_by = session.get('username', 'system')
+        holder = session.get('cart_id')
+        results = transactions.run_in_transaction(
+            lambda db: crud.ingest_sales(
+                db, sales,
+                user_id=user_id,
+                created_by=created_by,
+                tax_rate=COMPANY_SETTINGS.get('tax_rate', 0.075),
+                holder=holder
+            ),
+            'sales_sync', db=db
+        )
+        counts = {status: sum(1 for r in results if r['status'] == status)
+                  for status in ('created', 'duplicate', 'rejected')}
+        print(f"🔄 Sale sync: {counts['created']} created, {counts['duplicate']} duplicate, "
+              f"{counts['rejected']} rejected")
+        return jsonify({'success': True, 'results': results, **counts})
+    except IntegrityError:
+        # Another request recorded one of these receipts first - a retry will see it as a duplicate
+        db.rollback()
+        return jsonify({'success': False, 'message': 'Sync conflict, retry'}), 409
+    except Exception as e:
+        db.rollback()
+        import traceback
+        print(f"Error syncing sales: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        db.close()
+
+
 # Database initialization route - SMART VERSION (Preserves existing users/passwords)
 @app.route('/init-now')
 def init_now():
@@ -1708,47 +2373,32 @@ def adjust_stock():
         from app.database import SessionLocal
         db = SessionLocal()
 
-        # Get product
-        product = db.query(models.Product).filter(models.Product.id == product_id).first()
-
-        if not product:
-            db.close()
-            return jsonify({"success": False, "error": "Product not found"}), 404
-
-        # Store product name BEFORE any updates
-        product_name = product.name
-        current_stock = product.stock_quantity
-        new_stock = current_stock + quantity
-
-        if new_stock < 0:
+        # One conditional increment: concurrent adjustments and sales all land,
+        # and a deadlock or busy database just replays it
+        try:
+            result = transactions.run_in_transaction(
+                lambda db: crud.adjust_product_stock(
+                    db, product_id, int(quantity),
+                    movement_type=data.get('adjustment_type', 'adjustment'),
+                    reference=data.get('reference', 'Stock adjustment'),
+                    created_by=session.get('username', 'Anonymous')
+                ),
+                'adjust_stock', db=db
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        finally:
             db.close()
-            return jsonify({"success": False, "error": "Stock cannot go below zero"}), 400
-
-        # Update product
-        product.stock_quantity = new_stock
-
-        # Create movement
-        movement = models.StockMovement(
-            product_id=product_id,
-            quantity=quantity,
-            movement_type=data.get('adjustment_type', 'adjustment'),
-            reference=data.get('reference', 'Stock adjustment'),
-            created_at=datetime.now(),
-            created_by=session.get('username', 'Anonymous')
-        )
-        db.add(movement)
 
-        db.commit()
-        db.close()
+        if result is None:
+            return jsonify({"success": False, "error": "Product not found"}), 404
 
-        # Log using stored variables
-        print(f"✅ Stock updated: {product_name} ({quantity:+d}) = {new_stock}")
+        print(f"✅ Stock updated: {result['product_name']} ({int(quantity):+d}) = {result['new_stock']}")
 
         return jsonify({
             "success": True,
-            "message": f"Updated {product_name}",
-            "new_stock": new_stock,
-            "product_name": product_name
+            "message": f"Updated {result['product_name']}",
+            **result
         })
 
     except Exception as e:
@@ -1808,6 +2458,10 @@ if __name__ == '__main__':
     print(f"   http://localhost:{port}/force-init-db")
     print(f"   http://localhost:{port}/health")
 
+    # Local runs set the database up themselves; deploys run `python -m app.bootstrap` first
+    from app.bootstrap import setup_database
+    setup_database()
+
     # Check database status
     with app.app_context():
         check_database_status()